@@ -0,0 +1,207 @@
+#**********************************************************
+# Benchmarks for the N-puzzle solvers in solver.py
+# Runs without a Pygame window
+#**********************************************************
+
+
+import os
+import sys
+import random
+import time
+import argparse
+import tempfile
+import shutil
+
+from solver import solve_astar, solve_idastar, ManhattanDistance, LinearConflict, manhattan_distance, blank_moves, target_state, solvable
+import patterndb
+
+
+# shuffled tiles that can still be solved
+def random_puzzle(grid_size, rng):
+    tiles = target_state(grid_size * grid_size)
+    while True:
+        rng.shuffle(tiles)
+        if solvable(tiles, grid_size):
+            return list(tiles)
+
+
+# the goal after count random moves of the blank, never straight back, so at most count moves from solved
+def scrambled_puzzle(grid_size, count, rng):
+    tiles = target_state(grid_size * grid_size)
+    moves = blank_moves(grid_size)
+    zero_pos = 0
+    prev_pos = -1
+    for i in range(count):
+        pos = rng.choice([p for p in moves[zero_pos] if p != prev_pos])
+        tiles[zero_pos] = tiles[pos]
+        tiles[pos] = 0
+        prev_pos = zero_pos
+        zero_pos = pos
+    return tiles
+
+
+# manhattan_distance worked out again from the whole board after every move, the way the solvers used to
+class FullRecompute:
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+
+    def value(self, board):
+        return manhattan_distance(board, self.grid_size)
+
+    def moved(self, board, where, tile, old_pos, new_pos, h):
+        return manhattan_distance(board, self.grid_size)
+
+
+# random walks from random boards, after every move the values kept up to date one move at a time
+# have to be the same as working them out again from the whole board, exits with 1 if any is not
+def check_heuristics(sizes, walks, steps, rng):
+    wrong = 0
+    for grid_size in sizes:
+        manhattan = ManhattanDistance(grid_size)
+        conflict = LinearConflict(grid_size)
+        moves = blank_moves(grid_size)
+        checked = 0
+        for walk in range(walks):
+            board = random_puzzle(grid_size, rng)
+            where = [0] * len(board)
+            for pos in range(len(board)):
+                where[board[pos]] = pos
+            manhattan_h = manhattan.value(board)
+            conflict_h = conflict.value(board)
+            if conflict_h != manhattan_distance(board, grid_size):
+                wrong += 1
+            for step in range(steps):
+                zero_pos = where[0]
+                pos = rng.choice(moves[zero_pos])
+                tile = board[pos]
+                board[zero_pos] = tile
+                board[pos] = 0
+                where[tile] = zero_pos
+                where[0] = pos
+                manhattan_h = manhattan.moved(board, where, tile, pos, zero_pos, manhattan_h)
+                conflict_h = conflict.moved(board, where, tile, pos, zero_pos, conflict_h)
+                if manhattan_h != manhattan.value(board) or conflict_h != manhattan_distance(board, grid_size) or conflict_h != conflict.value(board):
+                    wrong += 1
+                    print("mismatch on %dx%d after moving %d: %s" % (grid_size, grid_size, tile, board))
+                checked += 1
+        print("%dx%d: %d moves checked" % (grid_size, grid_size, checked))
+    if wrong > 0:
+        print("%d mismatches" % wrong)
+        sys.exit(1)
+    print("every value matched")
+
+
+# states expanded per second with manhattan_distance worked out from the whole board for every neighbour,
+# against LinearConflict updated from the move, for IDA* and A*, after checking the two give the same values
+# 3x3 puzzles are fully shuffled, bigger ones are --walk random moves from the goal
+def bench_heuristics(args):
+    rng = random.Random(args.seed)
+    check_heuristics(args.sizes, args.walks, args.steps, rng)
+    print("")
+    print("size   solver   instances   full expanded   full (s)   full states/s   delta expanded   delta (s)   delta states/s   speedup   same moves")
+    for grid_size in args.sizes:
+        instances = []
+        for i in range(args.instances):
+            if grid_size == 3:
+                instances.append(random_puzzle(grid_size, rng))
+            else:
+                instances.append(scrambled_puzzle(grid_size, args.walk, rng))
+        for name, solve in (("ida*", solve_idastar), ("a*", solve_astar)):
+            totals = [0, 0, 0.0, 0.0]
+            same = True
+            for tiles in instances:
+                full_solution, full_stats = solve(tiles, grid_size, FullRecompute(grid_size))
+                solution, stats = solve(tiles, grid_size, LinearConflict(grid_size))
+                totals[0] += full_stats["expanded"]
+                totals[1] += stats["expanded"]
+                totals[2] += full_stats["time"]
+                totals[3] += stats["time"]
+                if full_stats["moves"] != stats["moves"]:
+                    same = False
+            full_rate = totals[0] / max(totals[2], 1e-9)
+            delta_rate = totals[1] / max(totals[3], 1e-9)
+            print("%-6s %-8s %-11d %-15d %-10.3f %-15.0f %-16d %-11.3f %-16.0f %-9.1f %s" % (str(grid_size) + "x" + str(grid_size), name, len(instances),
+                  totals[0], totals[2], full_rate, totals[1], totals[3], delta_rate, delta_rate / full_rate, same))
+
+
+# pattern database build time, size and load time, then IDA* with it against IDA* with the manhattan distance
+# --walk scrambles the puzzles by that many random moves, so the manhattan distance can still solve them,
+# --walk 0 shuffles them fully and only runs the pattern database
+def bench_pdb(args):
+    folder = args.folder
+    if folder == None:
+        folder = tempfile.mkdtemp()
+    try:
+        name = args.partition
+        if name == None:
+            name = patterndb.DEFAULT_PARTITION[args.size]
+        path = os.path.join(folder, "patterns-%dx%d-%s.pdb" % (args.size, args.size, name))
+        if not os.path.isfile(path):
+            t0 = time.perf_counter()
+            patterndb.build(args.size, patterndb.PARTITIONS[args.size][name], args.processes).save(path)
+            print("%s built in %.1f s" % (name, time.perf_counter() - t0))
+        t0 = time.perf_counter()
+        database = patterndb.load(path)
+        t_load = time.perf_counter() - t0
+        print("%dx%d %s: %.1f MB, loaded in %.4f s" % (args.size, args.size, name, os.path.getsize(path) / 1e6, t_load))
+
+        rng = random.Random(args.seed)
+        manhattan = ManhattanDistance(args.size)
+        print("instance   moves   manhattan h   pdb h   manhattan expanded   pdb expanded   manhattan (s)   pdb (s)   same moves")
+        totals = [0, 0, 0.0, 0.0]
+        for i in range(args.instances):
+            if args.walk > 0:
+                tiles = scrambled_puzzle(args.size, args.walk, rng)
+            else:
+                tiles = random_puzzle(args.size, rng)
+            solution, stats = solve_idastar(tiles, args.size, database)
+            totals[1] += stats["expanded"]
+            totals[3] += stats["time"]
+            if args.walk > 0:
+                plain_solution, plain_stats = solve_idastar(tiles, args.size, manhattan)
+                totals[0] += plain_stats["expanded"]
+                totals[2] += plain_stats["time"]
+                print("%-10d %-7d %-13d %-7d %-20d %-14d %-15.3f %-9.3f %s" % (i, stats["moves"], manhattan.value(tiles), database.value(tiles),
+                      plain_stats["expanded"], stats["expanded"], plain_stats["time"], stats["time"], plain_stats["moves"] == stats["moves"]))
+            else:
+                print("%-10d %-7d %-13d %-7d %-20s %-14d %-15s %-9.3f" % (i, stats["moves"], manhattan.value(tiles), database.value(tiles),
+                      "-", stats["expanded"], "-", stats["time"]))
+        if args.walk > 0:
+            print("total: manhattan %d expanded in %.2f s, pdb %d expanded in %.2f s" % (totals[0], totals[2], totals[1], totals[3]))
+        else:
+            print("total: pdb %d expanded in %.2f s, %.2f s per puzzle" % (totals[1], totals[3], totals[3] / max(1, args.instances)))
+        del database
+    finally:
+        if args.folder == None:
+            shutil.rmtree(folder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the N-puzzle solvers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("heuristics", help="checks the move by move heuristics against the full ones, then states per second of both")
+    p.add_argument("--sizes", type=int, nargs="+", default=[3, 4, 5])
+    p.add_argument("--walks", type=int, default=200, help="random walks checked per size")
+    p.add_argument("--steps", type=int, default=100, help="moves per walk")
+    p.add_argument("--instances", type=int, default=10)
+    p.add_argument("--walk", type=int, default=30, help="random moves from the goal for 4x4 and 5x5 puzzles")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_heuristics)
+
+    p = sub.add_parser("pdb", help="pattern database build and load time, and IDA* with it against the manhattan distance")
+    p.add_argument("--size", type=int, default=4, choices=sorted(patterndb.PARTITIONS))
+    p.add_argument("--partition", help="see patterndb.PARTITIONS, the default for the size if left out")
+    p.add_argument("--processes", type=int, help="processes building the tables, every core that fits in memory if left out")
+    p.add_argument("--folder", help="keep the .pdb file in this folder and use it again next time")
+    p.add_argument("--instances", type=int, default=10)
+    p.add_argument("--walk", type=int, default=50, help="random moves from the goal, 0 for fully shuffled puzzles")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_pdb)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
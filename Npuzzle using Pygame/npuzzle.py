@@ -8,10 +8,14 @@
 import pygame
 import random
 import math
+import sys
 from enum import Enum
 from enum import IntEnum
 import os.path
 
+import patterndb
+from solver import solve_astar, solve_idastar, manhattan_distance, solvable, blank_moves, apply_moves
+
 # colours for drawing
 c_red = (255, 0, 0)
 c_green = (0, 255, 0)
@@ -33,43 +37,17 @@ class MoveDirection(Enum):
 # for fps purposes
 clock = pygame.time.Clock()
 
-# class Node used for graphs and A Star search
-# kept as simple as possible
-# heuristic used should be changeable
-class Node:
-    move_speed = 500
-
-    def __init__(self, state, heuristic):
-        self.state = state          # for eg [0,1,2,3,4,5,6,7,8]
-        self.visited = False        # for A star search
-        self.global_goal = math.inf
-        self.local_goal = math.inf
-        self.parent_node = None
-        self.parent_move = None     # for the solution steps
-        self.heuristic = heuristic
-
-    # less than, for sorting <
-    def __lt__(self, other):
-        return self.global_goal < other.global_goal
-
-    # as long as state is the same, node1 == node2
-    def __eq__(self, other):
-        if (other != None):
-            return self.state == other.state
-        return False
-
-
-
-
-
-
 # NPuzzle class for playing the sliding puzzle game
+# the board itself, which tiles can move and moving them, is done with solver.py
 class NPuzzle:
+    move_speed = 500
+
     def __init__(self, gs, ts, bs):
-        self.grid_size = gs     # grid_size works for 2 and 3, 4 will take too long (need IDA*, A* not enough)
+        self.grid_size = gs     # grid_size works for 2 and 3 with A*, 4 needs IDA* (Z)
         self.tile_size = ts     # how big tiles should be on screen
         self.border = bs        # margin
         self.tile_len = gs * gs # includes the blank
+        self.moves = blank_moves(gs)    # for every position of the blank, the positions next to it
         self.tiles = []         # most important part, shows arrangement of tiles
         for i in range(self.grid_size):
             for j in range(self.grid_size):
@@ -145,76 +123,25 @@ class NPuzzle:
             random.shuffle(self.tiles)
             self.update_tile_positions()
 
-    # for checking legal placement of tiles
+    # for checking legal placement of tiles, see solvable
     def check_legal_tiles(self):
-        solution = 0
-        for i in range(self.tile_len):
-            check = self.tiles[i]
-
-            for j in range(self.tile_len):
-                if j <= i:
-                    continue
-                if self.tiles[j] < check and self.tiles[j] != 0:
-                    solution += 1
-
-        return not (solution%2)
+        return solvable(self.tiles, self.grid_size)
 
 
     # returns an array containing neighbouring tiles of the blank tile
     def find_neighbours_of_zero(self, state):
-        # first, find position of zero
-        zero_pos = -1
-        for i in state:
-            if state[i] == 0:
-                zero_pos = i;
+        return [state[pos] for pos in self.moves[state.index(0)]]
 
-        grid_size = self.grid_size
-        # ok establish zero_pos, depending on zero_pos, neighbors will be different
-
-        neighbours = []
-        # left neighbour is i - 1
-        if (zero_pos - 1 < len(state) and (zero_pos - 1) % grid_size < (zero_pos) % grid_size ):
-            neighbours.append(state[zero_pos - 1])
-        # right neighbour is i + 1
-        if (zero_pos + 1 < len(state) and (zero_pos + 1) % grid_size != 0):
-            neighbours.append(state[zero_pos + 1])
-        # top neighbor is i - grid_size
-        if (zero_pos - grid_size >= 0):
-            neighbours.append(state[zero_pos - grid_size])
-        # bottom neighbour is i + grid_size
-        if (zero_pos + grid_size < len(state)):
-            neighbours.append(state[zero_pos + grid_size])
-
-        return neighbours
-
-    # always move to 0 position
-    def move_tile(self, state, pos):
-        moved_state = state.copy()
-        grid_size = self.grid_size
-
-        if pos == -1:
-            return moved_state
-
-        neighbours = self.find_neighbours_of_zero(moved_state)
-
-        # now, if pos is in neighbours, then move is valid, otherwise move is invalid
-        if pos not in neighbours:
-            return moved_state
-
-        # ok so here pos is possible
-        # do the no animation switch
-        # instantaneous, so only do this AFTER animation
-        index_pos = moved_state.index(pos)
-        index_zero = moved_state.index(0)
-
-        moved_state[index_pos] = 0
-        moved_state[index_zero] = pos
-
-        return moved_state
+    # always move to 0 position, a tile that is not next to the blank stays where it is
+    # instantaneous, so only do this AFTER animation
+    def move_tile(self, state, tile):
+        if tile not in self.find_neighbours_of_zero(state):
+            return state.copy()
+        return apply_moves(state, self.grid_size, [tile])
 
     # updates position (where to draw) to move towards POSITION (where it should be)
     def update(self, dt):
-        s = Node.move_speed*dt
+        s = self.move_speed*dt
         self.moving = False
 
         for t in self.tiles:
@@ -261,34 +188,15 @@ class NPuzzle:
     # for moving with arrow buttons, if cannot go UP, try DOWN
     # for smoother UX
     def try_to_move_in_dir(self, dir):
-        zero_pos = -1
-        for i in range(self.tile_len):
-            if self.tiles[i] == 0:
-                zero_pos = i;
-                break
+        zero_pos = self.tiles.index(0)
         grid_size = self.grid_size
-
-        if dir == MoveDirection.UP:
-            if zero_pos - grid_size >= 0:
-                self.move_with_animation(self.tiles[zero_pos - self.grid_size])
-            elif zero_pos + grid_size < self.tile_len:
-                self.move_with_animation(self.tiles[zero_pos + self.grid_size])
-        elif dir == MoveDirection.DOWN:
-            if zero_pos + grid_size < self.tile_len:
-                self.move_with_animation(self.tiles[zero_pos + self.grid_size])
-            elif zero_pos - grid_size >= 0:
-                self.move_with_animation(self.tiles[zero_pos - self.grid_size])
-
-        elif dir == MoveDirection.LEFT:
-            if (zero_pos - 1 < self.tile_len and (zero_pos - 1) % grid_size < (zero_pos) % grid_size ):
-                self.move_with_animation(self.tiles[zero_pos - 1])
-            elif (zero_pos + 1 < self.tile_len and (zero_pos + 1) % grid_size != 0):
-                    self.move_with_animation(self.tiles[zero_pos + 1])
-        elif dir == MoveDirection.RIGHT:
-            if (zero_pos + 1 < self.tile_len and (zero_pos + 1) % grid_size != 0):
-                self.move_with_animation(self.tiles[zero_pos + 1])
-            elif (zero_pos - 1 < self.tile_len and (zero_pos - 1) % grid_size < (zero_pos) % grid_size ):
-                self.move_with_animation(self.tiles[zero_pos - 1])
+        # the tile to move is the one at zero_pos + step, the second step is the other way
+        steps = {MoveDirection.UP: (-grid_size, grid_size), MoveDirection.DOWN: (grid_size, -grid_size),
+                 MoveDirection.LEFT: (-1, 1), MoveDirection.RIGHT: (1, -1)}
+        for step in steps.get(dir, ()):
+            if zero_pos + step in self.moves[zero_pos]:
+                self.move_with_animation(self.tiles[zero_pos + step])
+                return
 
     # moving with animation, sliding, by updating POSITION
     def move_with_animation(self, t):
@@ -329,7 +237,7 @@ class NPuzzle:
 
 
 
-def main():
+def main(grid_size=3):
 
     # show UI, does not appear for 4x4 and above
     def show_ui(x,y):
@@ -339,226 +247,44 @@ def main():
         instructions = []
 
         instructions.append("Use mouse or arrow buttons to move tile.")
-        instructions.append("Press A for Solution. Press H for hints!")
+        instructions.append("Press A (A*) or Z (IDA*) for Solution. H for hints!")
         instructions.append("Mouse right-click to reshuffle tiles!")
 
         for i in range(len(instructions)):
             words = font.render(str(instructions[i]), True, (255, 255, 255))
             screen.blit(words, (x, y + i * font_size) )
 
-    # set target state to be default [0,1,2,3,4 ....]
-    def set_target_state():
-        target_list = []
-        for i in range(npuzzle.tile_len):
-            target_list.append(i)
-        return target_list
-
-    # for heuristic
-    def manhattan_distance(state, grid_size):
-
-        accumulated_cost = 0
-        curr_x = 0
-        curr_y = 0
-        fixed_x = 0
-        fixed_y = 0
-
-        for i in range(len(state)):
-            curr_x = state[i] % grid_size
-            fixed_x = i % grid_size
-
-            curr_y = math.floor(state[i] / grid_size)
-            fixed_y = math.floor(i / grid_size)
-
-            current_step_cost = abs(curr_x - fixed_x) + abs(curr_y - fixed_y)
-            accumulated_cost += current_step_cost
-
-        # now, need to resolve horizontal linear conflicts
-        for i in range(len(state) - 1):
-            if state[i] > state[i+1]:
-                correct_row = math.floor(i / grid_size)
-
-                row_i = math.floor((state[i]) / grid_size)
-                row_i_plus_1 = math.floor((state[i+1]) / grid_size)
-
-                current_i_plus_1_row = (i+1) / grid_size
-
-                if row_i == row_i_plus_1 and row_i == correct_row and current_i_plus_1_row == correct_row:
-                    if state[i] != 0 and state[i+1] != 0:
-                        accumulated_cost += 2
-
-        # vertical linear conflicts
-        for i in range(grid_size):
-            for j in range(grid_size):
-                if state[i] > state[i+grid_size*j]:
-                    correct_col = (i + 1) % grid_size
-                    col_i = (state[i] + 1) % grid_size
-                    col_i_plus_1 = (state[i+grid_size*j] + 1) % grid_size
-
-                    correct_col_plus_1 = (i+grid_size*j + 1) % grid_size
-
-                    if col_i == col_i_plus_1 and col_i == correct_col and correct_col == correct_col_plus_1:
-                        if state[i] != 0 and state[i+1] != 0:
-                            accumulated_cost += 2
-
-        return round(accumulated_cost)
-
-    # should be able to change type of heuristic used via Node init function
-    def heuristic(node):
-        return node.heuristic
-
-    # A* implementation
-    def solve_astar():
-        node_start = Node(npuzzle.tiles, manhattan_distance(npuzzle.tiles, npuzzle.grid_size))
-
-        # assumed to be in order
-        target_state = set_target_state()
-        node_start.local_goal = 0
-        node_start.global_goal = heuristic(node_start)
-
-        list_not_tested = []
-        list_not_tested.append(node_start)
-        checked_state_list = []
-
-        #print("start_state: " + str(node_start.state))
-        while (len(list_not_tested) > 0):
-
-            # sort by global goal
-            list_not_tested.sort()
-
-            while (len(list_not_tested) > 0 and list_not_tested[0].visited):
-                list_not_tested.pop(0)
-
-            # cannot move_tile
-            if len(list_not_tested) == 0:
-                break
-
-            node_current = list_not_tested[0]
-            node_current.visited = True
-            checked_state_list.append(node_current.state);
-            o_state = node_current.state
-
-            if node_current.state == target_state:
-                #print("path found")
-                solution_list = []
-                while(node_current.parent_node):
-                    solution_list.insert(0, node_current.parent_move)
-                    node_current = node_current.parent_node
-                #print("solution is: " + str(solution_list))
-                return solution_list
-
-            #for nb in node
-            neighbour_list = npuzzle.find_neighbours_of_zero(node_current.state)
-
-            for nb in neighbour_list:
-                o_state = node_current.state
-                nb_state = npuzzle.move_tile(o_state, nb)
-                #print("nb_state created: " + str(nb_state))
-
-                nb_node = Node(nb_state, manhattan_distance(nb_state, npuzzle.grid_size))
-
-                if nb_state in checked_state_list:
-                    nb_node.visited = True
-                else:
-                    list_not_tested.append(nb_node)
-
-                possibly_lower_goal = node_current.local_goal + 1
-
-                if possibly_lower_goal < nb_node.local_goal:
-                    nb_node.parent_node = node_current
-                    nb_node.parent_move = nb
-                    nb_node.local_goal = possibly_lower_goal
-                    nb_node.global_goal = nb_node.local_goal + heuristic(nb_node)
-
-        # should never happen with legal tile placement
-        # if it happens, should output this as a form of error message
-        print("path not found")
-        return []
-        #print("checked_state_list len : " + str(len(checked_state_list)))
-
-    # IDA* implementation
-    def solve_idastar():
-        node_start = Node(npuzzle.tiles, manhattan_distance(npuzzle.tiles, npuzzle.grid_size))
-        node_start.local_goal = 0
-        node_start.global_goal = heuristic(node_start)
-
-        f_bound = node_start.global_goal
-
-        r = 0
-        # while limited_dfs returns the next minimum bound instead of a path
-        while (str(r).isdigit() == True):
-            r = limited_dfs(node_start, f_bound, manhattan_distance(npuzzle.tiles, npuzzle.grid_size))
-            if str(r).isdigit():
-                f_bound = r
-        return r
-
-
-    def limited_dfs(node, f_bound, heuristic):
-
-        #print("new dfs round: ")
-        done = False
-        minimum = math.inf
-        target_state = set_target_state()
-        list_to_check = []
-
-        list_to_check.append(node)
-        f = node.global_goal
-
-        while done == False:
-            #print("Node tile:" +str(node.state))
-            if len(list_to_check) > 0:
-                list_to_check.sort()
-                node = list_to_check[0]
-                f = node.global_goal
-            else:
-                #print("minimum: " + str(minimum))
-                return minimum
-
-            if f <= f_bound:
-                #print("examining state: " + str(node.state))
-                if node.state == target_state:
-                    print("path found")
-                    solution_list = []
-                    while(node.parent_node):
-                        solution_list.insert(0, node.parent_move)
-                        node = node.parent_node
-                    print("solution size: " + str(solution_list))
-                    return solution_list
-                else:
-                    neighbour_list = npuzzle.find_neighbours_of_zero(node.state)
-
-                    for nb in neighbour_list:
-                        o_state = node.state
-                        nb_state = npuzzle.move_tile(o_state, nb)
-                        #print("nb_state created: " + str(nb_state))
-                        nb_node = Node(nb_state, manhattan_distance(nb_state, npuzzle.grid_size))
-                        nb_node.parent_node = node
-                        nb_node.parent_move = nb
-                        nb_node.local_goal = node.local_goal + 1
-                        nb_node.global_goal = nb_node.local_goal + nb_node.heuristic
-
-                        if (nb_node not in list_to_check):
-                            list_to_check.append(nb_node)
-                            #print("appended nb state: " + str(nb_state))
-
-            else:
-                if f < minimum or minimum == None:
-                    minimum = f
-                    #print("new f_bound: " + str(minimum))
+    # prints how much work the search did, like the manhattan distance after a shuffle
+    # A* keeps every state it sees, fully shuffled 4x4 and bigger boards need more than fits in memory,
+    # so those are solved with IDA* and the pattern database like Z
+    def solve_astar_and_report(npuzzle):
+        if npuzzle.grid_size > 3:
+            print("A* needs too much memory for %dx%d, using IDA*" % (npuzzle.grid_size, npuzzle.grid_size))
+            return solve_idastar_and_report(npuzzle)
+        solution, stats = solve_astar(npuzzle.tiles, npuzzle.grid_size)
+        if not stats["found"]:
+            # should never happen with legal tile placement
+            print("path not found")
+        print("A*: %d moves, %d states expanded, %d states seen, %.3f s" % (stats["moves"], stats["expanded"], stats["states"], stats["time"]))
+        return solution
+
+    # 4x4 and up use the pattern database, built the first time and loaded from its file after that
+    def solve_idastar_and_report(npuzzle):
+        nonlocal pattern_database
+        if pattern_database == None and npuzzle.grid_size in patterndb.DEFAULT_PARTITION and npuzzle.grid_size > 3:
             try:
-                list_to_check.pop(0)
-            except:
-                done = True
-
-            #print("list_to_check size: " + str(len(list_to_check)))
-
-        #print("minimum: " + str(minimum))
-        return minimum
-
-
-
-
-
-
+                pattern_database = patterndb.open_database(npuzzle.grid_size)
+            except ValueError as error:
+                print(str(error) + ", using the manhattan distance")
+                pattern_database = False
+        heuristic = pattern_database if pattern_database else None
+        solution, stats = solve_idastar(npuzzle.tiles, npuzzle.grid_size, heuristic)
+        for iteration in stats["iterations"]:
+            print("IDA* bound %d: %d states expanded, %.3f s, %.0f states/s" % (iteration["bound"], iteration["expanded"], iteration["time"], iteration["rate"]))
+        if not stats["found"]:
+            print("path not found")
+        print("IDA*: %d moves, %d states expanded, %.3f s" % (stats["moves"], stats["expanded"], stats["time"]))
+        return solution
 
     # handling of mouse and keyboard input in game loop
     def handle_input(npuzzle):
@@ -586,14 +312,14 @@ def main():
         if event.type == pygame.KEYDOWN:
             keys = pygame.key.get_pressed()
             if keys[pygame.K_a] and not npuzzle.animating:
-                npuzzle.solution = solve_astar()
+                npuzzle.solution = solve_astar_and_report(npuzzle)
                 npuzzle.animating = True
             if keys[pygame.K_z] and not npuzzle.animating:
-                npuzzle.solution = solve_idastar()
+                npuzzle.solution = solve_idastar_and_report(npuzzle)
                 npuzzle.animating = True
 
             if keys[pygame.K_h]:
-                npuzzle.solution = solve_astar()
+                npuzzle.solution = solve_astar_and_report(npuzzle)
 
                 if (len(npuzzle.solution) / 4 > 0):
                     limit = math.ceil(len(npuzzle.solution) / 4)
@@ -620,8 +346,9 @@ def main():
     pygame.display.set_caption("N-Puzzle using Pygame")
     font = pygame.font.Font('freesansbold.ttf', 10)
 
-    # create N puzzle, only N=2 or N=3 practical for now
-    npuzzle = NPuzzle(3, 100, 5)
+    # create N puzzle, N=3 by default, python npuzzle.py 4 for the 15-puzzle
+    npuzzle = NPuzzle(grid_size, 100 if grid_size <= 4 else 400 // grid_size, 5)
+    pattern_database = None
 
     # shuffle at the start
     npuzzle.shuffle_tiles()
@@ -652,4 +379,7 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
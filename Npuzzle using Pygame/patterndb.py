@@ -0,0 +1,281 @@
+#**********************************************************
+# Additive pattern databases for the N-puzzle solvers
+# Exact move counts for a few tiles at a time, worked out once
+# by a backward breadth first search and kept in a file on disk
+#**********************************************************
+
+
+import os
+import sys
+import mmap
+import time
+import struct
+import multiprocessing
+
+# NumPy is only needed to build the tables, not to load or use them
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# .pdb files start with this, then the grid size and the number of patterns,
+# then for every pattern its number of tiles and the tiles, 1 byte each, then the tables one after the other
+MAGIC = b"NPUZPDB1"
+HEADER = struct.Struct("<8sII")
+
+# the tiles are split into patterns that share no tile, by grid size and name
+# the patterns are blocks of tiles that sit next to each other in the goal, the blank goes top left
+PARTITIONS = {
+    3: {"4-4": [[1, 2, 4, 5], [3, 6, 7, 8]]},
+    4: {"6-6-3": [[1, 4, 5, 8, 9, 12], [2, 3, 6, 7, 10, 11], [13, 14, 15]],
+        "5-5-5": [[1, 2, 3, 5, 6], [4, 7, 8, 11, 12], [9, 10, 13, 14, 15]]},
+    5: {"6-6-6-6": [[1, 2, 5, 6, 7, 12], [3, 4, 8, 9, 13, 14], [10, 11, 15, 16, 20, 21], [17, 18, 19, 22, 23, 24]],
+        "5-5-5-5-4": [[1, 2, 5, 6, 7], [3, 4, 8, 9, 14], [10, 11, 15, 16, 20], [12, 13, 17, 18, 19], [21, 22, 23, 24]]},
+}
+DEFAULT_PARTITION = {3: "4-4", 4: "6-6-3", 5: "6-6-6-6"}
+
+# placements handed to NumPy at a time while building, to keep the arrays in memory small
+BUILD_CHUNK = 1 << 21
+
+# memory build lets its processes use together when the physical memory cannot be found out
+BUILD_MEMORY = 2 << 30
+
+
+# heuristic for solve_idastar, the sum over the patterns of the moves their tiles need
+# each table holds, for every placement of its tiles, the fewest moves of those tiles alone that bring them home,
+# moves of the other tiles are free, so no move is counted twice and the sum never overestimates
+# the index of a placement is sum(position of tile i * tile_len ** i), worked out straight from where[tile] without unpacking the board
+# the tables can be in memory or views into a memory mapped file, see load
+class PatternDatabase:
+
+    def __init__(self, grid_size, patterns, tables):
+        self.grid_size = grid_size
+        self.patterns = patterns
+        self.tables = tables
+        self.data = None
+        tile_len = grid_size * grid_size
+
+        # for every tile, the pattern it is in and its weight in that pattern's index
+        self.pattern_of = [-1] * tile_len
+        self.weight_of = [0] * tile_len
+        self.weights = []
+        for p in range(len(patterns)):
+            weights = []
+            for i in range(len(patterns[p])):
+                tile = patterns[p][i]
+                self.pattern_of[tile] = p
+                self.weight_of[tile] = tile_len ** i
+                weights.append((tile, tile_len ** i))
+            self.weights.append(weights)
+
+    def index(self, p, where):
+        index = 0
+        for tile, weight in self.weights[p]:
+            index += where[tile] * weight
+        return index
+
+    def value(self, board):
+        where = [0] * len(board)
+        for pos in range(len(board)):
+            where[board[pos]] = pos
+        total = 0
+        for p in range(len(self.patterns)):
+            total += self.tables[p][self.index(p, where)]
+        return total
+
+    # only the table of the pattern the tile is in changes, its old index is the new one with the tile moved back
+    def moved(self, board, where, tile, old_pos, new_pos, h):
+        p = self.pattern_of[tile]
+        table = self.tables[p]
+        index = 0
+        for t, weight in self.weights[p]:
+            index += where[t] * weight
+        return h + table[index] - table[index - (new_pos - old_pos) * self.weight_of[tile]]
+
+    # bytes of all the tables together
+    def size(self):
+        return sum(len(table) for table in self.tables)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.grid_size, len(self.patterns)))
+            for tiles in self.patterns:
+                f.write(bytes([len(tiles)] + tiles))
+            for table in self.tables:
+                f.write(table)
+
+
+# works out the tables, one pattern per process
+# processes=None uses every core, but only as many processes as fit in memory together, see build_memory,
+# so the 5x5 six tile tables are built one at a time unless asked otherwise
+def build(grid_size, patterns, processes=None):
+    if np is None:
+        raise ValueError("building pattern databases needs numpy installed")
+    check_patterns(grid_size, patterns)
+    jobs = [(grid_size, tiles) for tiles in patterns]
+    if processes == None:
+        largest = max(build_memory(grid_size, len(tiles)) for tiles in patterns)
+        processes = min(len(jobs), os.cpu_count() or 1, max(1, memory_budget() // largest))
+    if processes <= 1:
+        tables = [build_table(grid_size, tiles) for grid_size, tiles in jobs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            tables = pool.starmap(build_table, jobs)
+    return PatternDatabase(grid_size, [list(tiles) for tiles in patterns], tables)
+
+
+# rough peak memory of build_table for a pattern of count tiles, 9 bytes per placement for the table and
+# the two arrays of blank cells, the same again for the rounds of placements, and the arrays of one chunk
+# about 780 MB for a 4x4 six tile pattern and 4.4 GB for a 5x5 one
+def build_memory(grid_size, count):
+    return (grid_size * grid_size) ** count * 16 + (1 << 29)
+
+
+# memory the build processes may use together, 3/4 of the physical memory, or BUILD_MEMORY if it is not known
+def memory_budget():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 3 // 4
+    except (AttributeError, ValueError, OSError):
+        return BUILD_MEMORY
+
+
+# PatternDatabase from a file written by PatternDatabase.save
+# the file is memory mapped and the tables are views into it, so loading takes no time whatever the size
+def load(path):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < HEADER.size:
+        raise ValueError(path + " is not a .pdb file")
+    magic, grid_size, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(path + " is not a .pdb file")
+    tile_len = grid_size * grid_size
+    offset = HEADER.size
+    patterns = []
+    for p in range(count):
+        length = data[offset]
+        patterns.append(list(data[offset + 1:offset + 1 + length]))
+        offset += 1 + length
+    if offset + sum(tile_len ** len(tiles) for tiles in patterns) != len(data):
+        raise ValueError(path + " is not a .pdb file")
+
+    view = memoryview(data)
+    tables = []
+    for tiles in patterns:
+        size = tile_len ** len(tiles)
+        tables.append(view[offset:offset + size])
+        offset += size
+    database = PatternDatabase(grid_size, patterns, tables)
+    database.data = data
+    return database
+
+
+# the named partition for grid_size from folder, built and saved there first if the file is not there yet
+# building is reported on stderr, so it does not get mixed into the output of solve.py
+def open_database(grid_size, name=None, folder=None, processes=None):
+    if name == None:
+        name = DEFAULT_PARTITION[grid_size]
+    if folder == None:
+        folder = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(folder, "patterns-%dx%d-%s.pdb" % (grid_size, grid_size, name))
+    if not os.path.isfile(path):
+        t0 = time.perf_counter()
+        print("building pattern database " + path, file=sys.stderr)
+        build(grid_size, PARTITIONS[grid_size][name], processes).save(path)
+        print("built in %.1f s" % (time.perf_counter() - t0), file=sys.stderr)
+    return load(path)
+
+
+def check_patterns(grid_size, patterns):
+    tiles = [tile for pattern in patterns for tile in pattern]
+    if len(tiles) != len(set(tiles)) or min(tiles) < 1 or max(tiles) >= grid_size * grid_size:
+        raise ValueError("patterns must be tiles from 1 to " + str(grid_size * grid_size - 1) + " with none in two patterns")
+
+
+# one table by a breadth first search backwards from the goal, 1 byte per placement of the tiles, 255 if never reached
+# a state is where the tiles are and where the blank is, a move of the blank onto another cell costs nothing,
+# a move of one of the tiles into the blank costs 1, the table keeps the fewest moves over every blank position
+# each round has the placements reached with depth moves and for each one a bit mask of the blank cells reached,
+# the blank spreads over the free cells it can get to first, then every tile next to it is moved into it
+def build_table(grid_size, tiles):
+    tile_len = grid_size * grid_size
+    count = len(tiles)
+    weights = [tile_len ** i for i in range(count)]
+    table = np.full(tile_len ** count, 255, dtype=np.uint8)
+    # blank cells reached so far for every placement, and reached by the round being worked out for the next round
+    visited = np.zeros(tile_len ** count, dtype=np.uint32)
+    pending = np.zeros(tile_len ** count, dtype=np.uint32)
+
+    # for every cell, the cell next to it in each direction and if there is one
+    steps = []
+    for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+        can = np.array([0 <= pos % grid_size + dx < grid_size and 0 <= pos // grid_size + dy < grid_size for pos in range(tile_len)])
+        steps.append((dx + dy * grid_size, can))
+
+    placements = np.array([sum(tiles[i] * weights[i] for i in range(count))], dtype=np.int64)
+    masks = np.array([1], dtype=np.uint32)
+    depth = 0
+    while len(placements) > 0:
+        if depth > 254:
+            raise ValueError("pattern needs more than 254 moves")
+        for first in range(0, len(placements), BUILD_CHUNK):
+            chunk = placements[first:first + BUILD_CHUNK]
+            positions = [(chunk // weights[i]) % tile_len for i in range(count)]
+            occupied = np.zeros(len(chunk), dtype=np.uint32)
+            for pos in positions:
+                occupied |= np.left_shift(np.uint32(1), pos.astype(np.uint32))
+
+            chunk_masks = spread(masks[first:first + BUILD_CHUNK], occupied, grid_size)
+            chunk_masks &= ~visited[chunk]
+            visited[chunk] |= chunk_masks
+            table[chunk] = np.minimum(table[chunk], depth)
+
+            # a tile next to a blank cell moves into it, the blank ends up where the tile was
+            next_placements = []
+            next_masks = []
+            for i in range(count):
+                pos = positions[i]
+                for step, can in steps:
+                    cell = np.where(can[pos], pos + step, 0)
+                    moves = can[pos] & (((chunk_masks >> cell.astype(np.uint32)) & 1) == 1)
+                    next_placements.append(chunk[moves] + (cell[moves] - pos[moves]) * weights[i])
+                    next_masks.append(np.left_shift(np.uint32(1), pos[moves].astype(np.uint32)))
+            next_placements, next_masks = merge(np.concatenate(next_placements), np.concatenate(next_masks))
+            pending[next_placements] |= next_masks
+
+        placements = np.flatnonzero(pending)
+        masks = pending[placements] & ~visited[placements]
+        pending[placements] = 0
+        keep = masks != 0
+        placements = placements[keep]
+        masks = masks[keep]
+        depth += 1
+    del visited, pending
+    return table.tobytes()
+
+
+# every free cell the blank can get to from the cells in masks without moving a tile, one bit per cell
+def spread(masks, occupied, grid_size):
+    tile_len = grid_size * grid_size
+    free = ~occupied & np.uint32((1 << tile_len) - 1)
+    first_column = np.uint32(sum(1 << (y * grid_size) for y in range(grid_size)))
+    last_column = np.uint32(sum(1 << (y * grid_size + grid_size - 1) for y in range(grid_size)))
+    masks = masks & free
+    while True:
+        grown = masks | ((masks & ~last_column) << 1) | ((masks & ~first_column) >> 1) | (masks << grid_size) | (masks >> grid_size)
+        grown &= free
+        if np.array_equal(grown, masks):
+            return masks
+        masks = grown
+
+
+# one entry per placement, the masks of the same placement or'ed together
+def merge(placements, masks):
+    if len(placements) == 0:
+        return placements, masks
+    order = np.argsort(placements, kind="stable")
+    placements = placements[order]
+    masks = masks[order]
+    starts = np.flatnonzero(np.concatenate(([True], placements[1:] != placements[:-1])))
+    return placements[starts], np.bitwise_or.reduceat(masks, starts)
@@ -0,0 +1,192 @@
+#**********************************************************
+# Batch N-puzzle solver, no Pygame or display needed
+# Reads puzzles from files or stdin and writes one JSON line
+# per puzzle with its solution and stats, as they are solved
+#**********************************************************
+
+
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+
+import patterndb
+from solver import solve_astar, solve_idastar, ManhattanDistance, LinearConflict, board_size, solvable, apply_moves, target_state
+
+
+ALGORITHMS = {"idastar": solve_idastar, "astar": solve_astar}
+HEURISTICS = ("auto", "conflict", "manhattan", "pdb")
+
+# settings of this process, the same in every worker, see init_worker
+settings = {}
+# heuristics of this process by name and grid size, made the first time a puzzle of that size needs one
+heuristics = {}
+
+
+def init_worker(worker_settings):
+    settings.update(worker_settings)
+
+
+# auto is what the Z key uses, the pattern database from 4x4 up and linear conflicts below that
+# a pattern database is memory mapped, so worker processes loading the same file share its pages
+def get_heuristic(name, grid_size):
+    if name == "auto":
+        name = "pdb" if grid_size > 3 and grid_size in patterndb.DEFAULT_PARTITION else "conflict"
+    key = (name, grid_size)
+    if key not in heuristics:
+        if name == "manhattan":
+            heuristics[key] = ManhattanDistance(grid_size)
+        elif name == "conflict":
+            heuristics[key] = LinearConflict(grid_size)
+        else:
+            if grid_size not in patterndb.PARTITIONS:
+                raise ValueError("no pattern database for %dx%d" % (grid_size, grid_size))
+            partition = settings.get("partition")
+            if partition not in patterndb.PARTITIONS[grid_size]:
+                partition = None
+            heuristics[key] = patterndb.open_database(grid_size, partition, settings.get("folder"))
+    return name, heuristics[key]
+
+
+# one line of input is the tiles row by row with 0 for the blank, separated by spaces or commas,
+# or a JSON list of them, or a JSON object with "tiles" and an optional "id"
+# empty lines and lines starting with # are skipped
+# yields (id, tiles, error) with the id "file:line" if the line has none, tiles is None if the line could not be read
+def read_puzzles(files):
+    for path in files:
+        f = sys.stdin if path == "-" else open(path)
+        try:
+            number = 0
+            for line in f:
+                number += 1
+                line = line.strip()
+                if line == "" or line.startswith("#"):
+                    continue
+                id = "%s:%d" % (path, number)
+                try:
+                    if line.startswith("[") or line.startswith("{"):
+                        puzzle = json.loads(line)
+                        if isinstance(puzzle, dict):
+                            id = puzzle.get("id", id)
+                            puzzle = puzzle["tiles"]
+                        tiles = [int(tile) for tile in puzzle]
+                    else:
+                        tiles = [int(tile) for tile in line.replace(",", " ").split()]
+                except (ValueError, KeyError, TypeError) as error:
+                    yield id, None, "could not read the puzzle: " + str(error)
+                    continue
+                yield id, tiles, None
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+# the result of one puzzle as a dict for its JSON line, errors go in "error" instead of stopping the batch
+def solve_puzzle(job):
+    id, tiles, error = job
+    result = {"id": id}
+    if error != None:
+        result["error"] = error
+        return result
+    try:
+        grid_size = board_size(tiles)
+        result["size"] = grid_size
+        result["tiles"] = tiles
+        result["solvable"] = solvable(tiles, grid_size)
+        if not result["solvable"]:
+            return result
+        name, heuristic = get_heuristic(settings["heuristic"], grid_size)
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+
+    solution, stats = ALGORITHMS[settings["algorithm"]](tiles, grid_size, heuristic)
+    if not stats["found"]:
+        result["error"] = "no solution found"
+        return result
+    if apply_moves(tiles, grid_size, solution) != target_state(len(tiles)):
+        result["error"] = "the solution does not reach the goal"
+        return result
+    result["algorithm"] = settings["algorithm"]
+    result["heuristic"] = name
+    result["h"] = heuristic.value(tiles)
+    result["moves"] = stats["moves"]
+    result["solution"] = solution
+    result["expanded"] = stats["expanded"]
+    result["time"] = round(stats["time"], 6)
+    if "states" in stats:
+        result["states"] = stats["states"]
+    if "iterations" in stats:
+        result["bounds"] = len(stats["iterations"])
+        if settings["iterations"]:
+            result["iterations"] = stats["iterations"]
+    return result
+
+
+# the puzzles handed to the workers, read as they are needed so stdin can be streamed
+# a pattern database is opened here first, for the first puzzle of each size, so a missing file is built
+# once by this process before any worker needs it instead of by every worker at the same time
+def jobs_for(files):
+    for id, tiles, error in read_puzzles(files):
+        if tiles != None:
+            try:
+                get_heuristic(settings["heuristic"], board_size(tiles))
+            except ValueError:
+                # the worker gives the error for the puzzle
+                pass
+        yield id, tiles, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solves N-puzzles from files or stdin, one JSON line per puzzle on stdout")
+    parser.add_argument("files", nargs="*", default=["-"], help="files with one puzzle per line, - or left out for stdin")
+    parser.add_argument("--algorithm", choices=sorted(ALGORITHMS), default="idastar",
+                        help="idastar keeps only the current path in memory, astar keeps every state seen")
+    parser.add_argument("--heuristic", choices=HEURISTICS, default="auto",
+                        help="auto uses the pattern database for 4x4 and 5x5 and linear conflicts below that")
+    parser.add_argument("--partition", help="pattern database partition, see patterndb.PARTITIONS, the default for the size if left out")
+    parser.add_argument("--folder", help="folder of the .pdb files, next to patterndb.py if left out")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes, 0 for every core")
+    parser.add_argument("--unordered", action="store_true", help="write results as they finish instead of in input order")
+    parser.add_argument("--iterations", action="store_true", help="add the bound, states and time of every IDA* iteration")
+    args = parser.parse_args()
+
+    settings.update({"algorithm": args.algorithm, "heuristic": args.heuristic, "partition": args.partition,
+                     "folder": args.folder, "iterations": args.iterations})
+    processes = args.processes
+    if processes <= 0:
+        processes = multiprocessing.cpu_count()
+
+    t0 = time.perf_counter()
+    counts = {"solved": 0, "unsolvable": 0, "errors": 0}
+    pool = None
+    if processes == 1:
+        results = map(solve_puzzle, jobs_for(args.files))
+    else:
+        pool = multiprocessing.Pool(processes, init_worker, (dict(settings),))
+        if args.unordered:
+            results = pool.imap_unordered(solve_puzzle, jobs_for(args.files))
+        else:
+            results = pool.imap(solve_puzzle, jobs_for(args.files))
+    try:
+        for result in results:
+            if "error" in result:
+                counts["errors"] += 1
+            elif result["solvable"]:
+                counts["solved"] += 1
+            else:
+                counts["unsolvable"] += 1
+            sys.stdout.write(json.dumps(result) + "\n")
+            sys.stdout.flush()
+    finally:
+        if pool != None:
+            pool.terminate()
+
+    print("%d solved, %d unsolvable, %d errors in %.2f s" % (counts["solved"], counts["unsolvable"], counts["errors"], time.perf_counter() - t0), file=sys.stderr)
+    if counts["errors"] > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,419 @@
+#**********************************************************
+# Headless N-puzzle solvers used by npuzzle.py
+# Board helpers, heuristics, A* and IDA*, no Pygame or display needed
+# solve.py runs them on puzzles from files or stdin
+#**********************************************************
+
+
+import math
+import heapq
+import time
+
+
+# for heuristic
+# manhattan distance of every tile except the blank, plus linear conflicts:
+# the tiles of a row that belong in that row have to end up in goal order, the ones that are not part of
+# the longest run already in order have to leave the row and come back, 2 more moves each, the same for columns
+# row moves out are up or down and column moves out are left or right, so both can be added, it never overestimates
+# this works it out from the whole board, LinearConflict gives the same value one move at a time
+def manhattan_distance(state, grid_size):
+    accumulated_cost = 0
+    for i in range(len(state)):
+        if state[i] != 0:
+            accumulated_cost += abs(state[i] % grid_size - i % grid_size) + abs(state[i] // grid_size - i // grid_size)
+
+    for line in range(grid_size):
+        # goal columns of the tiles in row line that belong in row line, left to right
+        row = []
+        # goal rows of the tiles in column line that belong in column line, top to bottom
+        column = []
+        for k in range(grid_size):
+            tile = state[line * grid_size + k]
+            if tile != 0 and tile // grid_size == line:
+                row.append(tile % grid_size)
+            tile = state[k * grid_size + line]
+            if tile != 0 and tile % grid_size == line:
+                column.append(tile // grid_size)
+        accumulated_cost += 2 * (len(row) - longest_increasing(row))
+        accumulated_cost += 2 * (len(column) - longest_increasing(column))
+
+    return accumulated_cost
+
+
+# length of the longest increasing run in values, not necessarily next to each other
+def longest_increasing(values):
+    longest = []
+    for i in range(len(values)):
+        length = 1
+        for j in range(i):
+            if values[j] < values[i] and longest[j] + 1 > length:
+                length = longest[j] + 1
+        longest.append(length)
+    return max(longest, default=0)
+
+
+# goal state, blank first and then the tiles in order, [0,1,2,3,4 ....]
+def target_state(tile_len):
+    return list(range(tile_len))
+
+
+# grid size of a board given as its tiles row by row, blank as 0
+# raises ValueError if the tiles are not 0 to n*n-1 each once
+def board_size(tiles):
+    grid_size = math.isqrt(len(tiles))
+    if grid_size < 2 or grid_size * grid_size != len(tiles):
+        raise ValueError("a board needs n*n tiles with n at least 2, not " + str(len(tiles)))
+    if sorted(tiles) != target_state(len(tiles)):
+        raise ValueError("a board needs the tiles 0 to " + str(len(tiles) - 1) + " each once")
+    return grid_size
+
+
+# a move left or right keeps the number of inversions, a move up or down changes it by grid_size - 1
+# so for odd grid sizes it has to stay even, for even grid sizes inversions + blank row has to stay even
+def solvable(tiles, grid_size):
+    inversions = 0
+    for i in range(len(tiles)):
+        for j in range(i + 1, len(tiles)):
+            if tiles[j] != 0 and tiles[j] < tiles[i]:
+                inversions += 1
+    if grid_size % 2 == 0:
+        inversions += tiles.index(0) // grid_size
+    return inversions % 2 == 0
+
+
+# the board after playing solution, a list of tiles to move like the solvers return
+# raises ValueError on a tile that is not next to the blank
+def apply_moves(tiles, grid_size, solution):
+    board = list(tiles)
+    zero_pos = board.index(0)
+    moves = blank_moves(grid_size)
+    for tile in solution:
+        pos = board.index(tile) if 0 < tile < len(board) else -1
+        if pos not in moves[zero_pos]:
+            raise ValueError("tile " + str(tile) + " is not next to the blank")
+        board[zero_pos] = tile
+        board[pos] = 0
+        zero_pos = pos
+    return board
+
+
+# a state packed into one int, tile_bits bits per position with position 0 in the lowest bits
+# ints hash fast and take far less memory than lists, so states can go straight into dicts and sets
+# 4 bits per tile is enough up to 4x4, 5x5 needs 5
+def tile_bits(tile_len):
+    return max(4, (tile_len - 1).bit_length())
+
+def pack_state(state, bits):
+    key = 0
+    for i in range(len(state) - 1, -1, -1):
+        key = (key << bits) | state[i]
+    return key
+
+def unpack_state(key, tile_len, bits):
+    mask = (1 << bits) - 1
+    return [(key >> (bits * i)) & mask for i in range(tile_len)]
+
+
+# for every position of the blank, the positions it can swap with, left, right, up and down
+def blank_moves(grid_size):
+    moves = []
+    for i in range(grid_size * grid_size):
+        x = i % grid_size
+        y = i // grid_size
+        neighbours = []
+        if x > 0:
+            neighbours.append(i - 1)
+        if x < grid_size - 1:
+            neighbours.append(i + 1)
+        if y > 0:
+            neighbours.append(i - grid_size)
+        if y < grid_size - 1:
+            neighbours.append(i + grid_size)
+        moves.append(neighbours)
+    return moves
+
+
+# A* implementation
+# returns (solution, stats), solution is the tiles to move in order, [] if there is none and stats["found"] is False
+# heuristic is one of the heuristics for solve_idastar, the heuristic of a neighbour is worked out from the move
+# the open list is a heap of (global goal, push order, state, blank position, local goal)
+# seen has every state reached so far, with its local goal and the tile that was moved to reach it,
+# packed as local_goal << bits | tile, the start has tile 0
+# a state is only pushed again when it is reached in fewer moves, older heap entries are skipped when popped
+def solve_astar(tiles, grid_size, heuristic=None):
+    t0 = time.perf_counter()
+    if heuristic == None:
+        heuristic = LinearConflict(grid_size)
+    moved = heuristic.moved
+    tile_len = len(tiles)
+    bits = tile_bits(tile_len)
+    moves = blank_moves(grid_size)
+    heappush = heapq.heappush
+    heappop = heapq.heappop
+    stats = {"expanded": 0, "pushed": 1, "states": 0, "moves": 0, "found": False, "time": 0.0}
+    # half of all boards can never reach the goal, no need to search through every state to find that out
+    if not solvable(tiles, grid_size):
+        stats["time"] = time.perf_counter() - t0
+        return [], stats
+
+    start = pack_state(tiles, bits)
+    target = pack_state(target_state(tile_len), bits)
+    seen = {start: 0}
+    push_count = 0
+    list_not_tested = [(heuristic.value(tiles), push_count, start, tiles.index(0), 0)]
+    solution = []
+    expanded = 0
+
+    while len(list_not_tested) > 0:
+        global_goal, order, state, zero_pos, local_goal = heappop(list_not_tested)
+        if seen[state] >> bits != local_goal:
+            continue
+        expanded += 1
+
+        if state == target:
+            solution = trace_solution(seen, start, state, tile_len, bits)
+            break
+
+        board = unpack_state(state, tile_len, bits)
+        where = [0] * tile_len
+        for pos in range(tile_len):
+            where[board[pos]] = pos
+        h = global_goal - local_goal
+        nb_goal = local_goal + 1
+        for pos in moves[zero_pos]:
+            tile = board[pos]
+            # the tile goes to where the blank was, the blank to where the tile was
+            nb_state = state + (tile << (bits * zero_pos)) - (tile << (bits * pos))
+            old = seen.get(nb_state)
+            if old != None and old >> bits <= nb_goal:
+                continue
+            seen[nb_state] = (nb_goal << bits) | tile
+
+            board[zero_pos] = tile
+            board[pos] = 0
+            where[tile] = zero_pos
+            where[0] = pos
+            nb_h = moved(board, where, tile, pos, zero_pos, h)
+            board[pos] = tile
+            board[zero_pos] = 0
+            where[tile] = pos
+            where[0] = zero_pos
+
+            push_count += 1
+            heappush(list_not_tested, (nb_goal + nb_h, push_count, nb_state, pos, nb_goal))
+
+    stats["expanded"] = expanded
+    stats["pushed"] += push_count
+    stats["states"] = len(seen)
+    stats["moves"] = len(solution)
+    # False should never happen with legal tile placement, the caller reports it
+    stats["found"] = len(solution) > 0 or start == target
+    stats["time"] = time.perf_counter() - t0
+    return solution, stats
+
+
+# follows the moved tiles back from state to start, returns them in the order they are played
+# the parent of a state has the moved tile where the blank is now, and the blank where the tile is now
+def trace_solution(seen, start, state, tile_len, bits):
+    mask = (1 << bits) - 1
+    solution = []
+    while state != start:
+        tile = seen[state] & mask
+        solution.append(tile)
+        current = unpack_state(state, tile_len, bits)
+        tile_pos = current.index(tile)
+        zero_pos = current.index(0)
+        state = state - (tile << (bits * tile_pos)) + (tile << (bits * zero_pos))
+    solution.reverse()
+    return solution
+
+
+# manhattan distance of every tile except the blank, the number of moves each tile needs on its own
+# it never overestimates, so IDA* with it finds the fewest moves
+# moved gives the new value after one move from the old one, only the tile that moved changes
+# table[tile][pos] is the distance of tile from its goal position when it is at pos
+class ManhattanDistance:
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        tile_len = grid_size * grid_size
+        self.table = []
+        for tile in range(tile_len):
+            row = []
+            for pos in range(tile_len):
+                if tile == 0:
+                    row.append(0)
+                else:
+                    row.append(abs(tile % grid_size - pos % grid_size) + abs(tile // grid_size - pos // grid_size))
+            self.table.append(row)
+
+    def value(self, board):
+        table = self.table
+        total = 0
+        for pos in range(len(board)):
+            total += table[board[pos]][pos]
+        return total
+
+    # board and where are already updated, where[tile] is the position of tile
+    def moved(self, board, where, tile, old_pos, new_pos, h):
+        row = self.table[tile]
+        return h + row[new_pos] - row[old_pos]
+
+
+# manhattan_distance one move at a time, the manhattan part is ManhattanDistance
+# a tile moving left or right stays in its row and keeps its order there, so only the two columns it leaves and
+# enters can change their conflicts, and moving up or down only the two rows
+# every line has a code, the sum over its cells of (goal position in the line + 1) * (grid_size + 1) ** cell,
+# counting only the tiles that belong in that line, and conflicts[code] is the extra moves of that line
+# the code of a line before the move is the code after it with the moved tile put back
+class LinearConflict:
+    def __init__(self, grid_size):
+        self.grid_size = grid_size
+        tile_len = grid_size * grid_size
+        self.manhattan = ManhattanDistance(grid_size).table
+        base = grid_size + 1
+
+        # what tile adds to the code of the row or column of pos, 0 unless that line is where it belongs
+        self.row_code = []
+        self.column_code = []
+        for tile in range(tile_len):
+            row_code = []
+            column_code = []
+            for pos in range(tile_len):
+                if tile != 0 and tile // grid_size == pos // grid_size:
+                    row_code.append((tile % grid_size + 1) * base ** (pos % grid_size))
+                else:
+                    row_code.append(0)
+                if tile != 0 and tile % grid_size == pos % grid_size:
+                    column_code.append((tile // grid_size + 1) * base ** (pos // grid_size))
+                else:
+                    column_code.append(0)
+            self.row_code.append(row_code)
+            self.column_code.append(column_code)
+        self.rows = [[line * grid_size + k for k in range(grid_size)] for line in range(grid_size)]
+        self.columns = [[k * grid_size + line for k in range(grid_size)] for line in range(grid_size)]
+
+        self.conflicts = []
+        for code in range(base ** grid_size):
+            values = []
+            while code > 0:
+                if code % base != 0:
+                    values.append(code % base)
+                code //= base
+            self.conflicts.append(2 * (len(values) - longest_increasing(values)))
+
+    def value(self, board):
+        manhattan = self.manhattan
+        total = 0
+        for pos in range(len(board)):
+            total += manhattan[board[pos]][pos]
+        for line in range(self.grid_size):
+            total += self.conflicts[line_code(board, self.rows[line], self.row_code)]
+            total += self.conflicts[line_code(board, self.columns[line], self.column_code)]
+        return total
+
+    def moved(self, board, where, tile, old_pos, new_pos, h):
+        manhattan = self.manhattan[tile]
+        h += manhattan[new_pos] - manhattan[old_pos]
+        grid_size = self.grid_size
+        if old_pos // grid_size == new_pos // grid_size:
+            codes = self.column_code
+            old_line = self.columns[old_pos % grid_size]
+            new_line = self.columns[new_pos % grid_size]
+        else:
+            codes = self.row_code
+            old_line = self.rows[old_pos // grid_size]
+            new_line = self.rows[new_pos // grid_size]
+        conflicts = self.conflicts
+        old_after = line_code(board, old_line, codes)
+        new_after = line_code(board, new_line, codes)
+        return (h + conflicts[old_after] - conflicts[old_after + codes[tile][old_pos]]
+                + conflicts[new_after] - conflicts[new_after - codes[tile][new_pos]])
+
+
+def line_code(board, cells, codes):
+    code = 0
+    for pos in cells:
+        code += codes[board[pos]][pos]
+    return code
+
+
+# IDA* implementation
+# a depth first search that gives up on a branch once moves so far + heuristic goes over the bound,
+# then starts again with the bound raised to the lowest value that went over, memory is only the current path
+# there is one board for the whole search, every move is made on it and undone on the way back,
+# the heuristic is updated from the one move instead of worked out again, and the blank never moves straight back
+# heuristic needs value(board) and moved(board, where, tile, old_pos, new_pos, h), and must only be 0 at the goal
+# returns (solution, stats) like solve_astar, stats["iterations"] has the work done for every bound
+def solve_idastar(tiles, grid_size, heuristic=None):
+    t0 = time.perf_counter()
+    if heuristic == None:
+        heuristic = LinearConflict(grid_size)
+    tile_len = len(tiles)
+    board = list(tiles)
+    where = [0] * tile_len
+    for pos in range(tile_len):
+        where[board[pos]] = pos
+    target = target_state(tile_len)
+    moves = blank_moves(grid_size)
+    moved = heuristic.moved
+    path = []
+    expanded = 0
+    bound = 0
+
+    # returns -1 once the goal is found, otherwise the lowest f that went over the bound
+    def search(g, h, zero_pos, prev_pos):
+        nonlocal expanded
+        f = g + h
+        if f > bound:
+            return f
+        if h == 0 and board == target:
+            return -1
+        expanded += 1
+        minimum = math.inf
+        for pos in moves[zero_pos]:
+            if pos == prev_pos:
+                continue
+            tile = board[pos]
+            board[zero_pos] = tile
+            board[pos] = 0
+            where[tile] = zero_pos
+            where[0] = pos
+            path.append(tile)
+
+            r = search(g + 1, moved(board, where, tile, pos, zero_pos, h), pos, zero_pos)
+            if r == -1:
+                return -1
+
+            path.pop()
+            board[pos] = tile
+            board[zero_pos] = 0
+            where[tile] = pos
+            where[0] = zero_pos
+            if r < minimum:
+                minimum = r
+        return minimum
+
+    h = heuristic.value(board)
+    bound = h
+    stats = {"expanded": 0, "moves": 0, "heuristic": h, "iterations": [], "found": False, "time": 0.0}
+    # IDA* would raise the bound for ever on a board that can never reach the goal
+    if not solvable(tiles, grid_size):
+        stats["time"] = time.perf_counter() - t0
+        return path, stats
+    while True:
+        t1 = time.perf_counter()
+        before = expanded
+        r = search(0, h, where[0], -1)
+        t_iteration = time.perf_counter() - t1
+        stats["iterations"].append({"bound": bound, "expanded": expanded - before, "time": t_iteration,
+                                    "rate": (expanded - before) / max(t_iteration, 1e-9)})
+        if r == -1 or r == math.inf:
+            break
+        bound = r
+
+    stats["expanded"] = expanded
+    stats["moves"] = len(path)
+    # False should never happen with legal tile placement, the caller reports it
+    stats["found"] = r != math.inf
+    stats["time"] = time.perf_counter() - t0
+    return path, stats
@@ -0,0 +1,270 @@
+#**********************************************************
+# Any-angle pathfinding (Theta* and Lazy Theta*)
+# Paths go straight from corner to corner at any angle
+# instead of zigzagging along the 8 neighbour directions
+#**********************************************************
+
+
+import math
+import heapq
+import time
+
+from pathfinder import OCTILE_OFFSETS, SearchTask, run_to_end, line_cells
+
+
+# "0" for free cells and "1" for the rest, see pack
+BIT_TABLE = b"0" + b"1" * 255
+
+
+# bytes of 0s and 1s as one int, byte i is bit i
+def pack(cells):
+    return int(bytes(cells)[::-1].translate(BIT_TABLE) or b"0", 2)
+
+
+# line of sight on the obstacles of a GridGraph, true when every cell line_cells gives for the line is free
+# every row and every column is kept as one int with a bit per cell, a line is a run of cells in each row
+# it crosses (each column for steep lines), so a check is one shift and mask per row instead of one test per cell
+# obstacle changes through set_obstacle or toggle_obstacle are picked up on the next check
+class LineOfSight:
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.checks = 0
+        self.build()
+
+    def build(self):
+        graph = self.graph
+        map_width = graph.map_width
+        cells = bytes(graph.obstacles)
+        self.rows = [pack(cells[y * map_width:(y + 1) * map_width]) for y in range(graph.map_height)]
+        self.columns = [pack(cells[x::map_width]) for x in range(map_width)]
+        self.version = graph.version
+
+    def catch_up(self):
+        graph = self.graph
+        if self.version == graph.version:
+            return
+        changes = graph.changes_since(self.version)
+        self.version = graph.version
+        if changes == None:
+            self.build()
+            return
+        for id in set(changes):
+            x = id % graph.map_width
+            y = id // graph.map_width
+            if graph.obstacles[id]:
+                self.rows[y] |= 1 << x
+                self.columns[x] |= 1 << y
+            else:
+                self.rows[y] &= ~(1 << x)
+                self.columns[x] &= ~(1 << y)
+
+    # line from (x0, y0) to (x1, y1), both ends have to be free too
+    def clear(self, x0, y0, x1, y1):
+        self.checks += 1
+        # a along the longer axis, b along the other, lines holds the bits along a for every b
+        if abs(x1 - x0) >= abs(y1 - y0):
+            lines, a0, b0, a1, b1 = self.rows, x0, y0, x1, y1
+        else:
+            lines, a0, b0, a1, b1 = self.columns, y0, x0, y1, x1
+        n = abs(a1 - a0)
+        m = abs(b1 - b0)
+        step_b = 1 if b1 >= b0 else -1
+        if m == 0:
+            return (lines[b0] >> min(a0, a1)) & ((2 << n) - 1) == 0
+
+        # step i is on line j = (2*i*m + n) // (2*n), so line j has the steps from
+        # ceil((2*j*n - n) / (2*m)) up to ceil((2*j*n + n) / (2*m)) - 1
+        for j in range(m + 1):
+            low = max(0, -((n - 2 * j * n) // (2 * m)))
+            high = min(n, -(-(2 * j * n + n) // (2 * m)) - 1)
+            start = a0 + low if a1 >= a0 else a0 - high
+            if (lines[b0 + step_b * j] >> start) & ((2 << (high - low)) - 1):
+                return False
+        return True
+
+    # same as clear, one cell at a time, to check clear against
+    def clear_cells(self, x0, y0, x1, y1):
+        obstacles = self.graph.obstacles
+        map_width = self.graph.map_width
+        for x, y in line_cells(x0, y0, x1, y1):
+            if obstacles[y * map_width + x]:
+                return False
+        return True
+
+
+# Theta* searches like A Star, but a neighbour takes the parent of the cell being expanded as its own parent
+# whenever there is line of sight between them, so paths are straight lines between the corners they bend around
+# Lazy Theta* (lazy=True) assumes the line of sight and only checks it when the cell is expanded,
+# that is one check per expanded cell instead of one per neighbour
+# paths are not always the shortest any-angle path but come close, Theta* paths are in practice never longer
+# than the 8 neighbour path, Lazy Theta* can now and then come out a few percent longer, see benchmark.py anyangle
+# costs are the straight line lengths, so the heuristic is euclidean, maps with terrain costs are not supported
+# the result is left in the graph arrays like Pathfinder, parent links the corners of the path
+class AnyAnglePathfinder:
+
+    def __init__(self, graph, lazy=True, weight=1.0, los=None):
+        if graph.costs is not None:
+            raise ValueError("any-angle search needs a map without terrain costs")
+        if weight < 1:
+            raise ValueError("weight must be at least 1")
+        if los == None:
+            los = LineOfSight(graph)
+        self.graph = graph
+        self.lazy = lazy
+        self.weight = weight
+        self.los = los
+        self.algorithm = "lazytheta" if lazy else "theta"
+
+    def solve(self, start, goal):
+        return run_to_end(self.steps(start, goal))
+
+    # returns a SearchTask, so the search can be run a slice at a time like Pathfinder
+    def start_search(self, start, goal):
+        return SearchTask(self, start, goal)
+
+    def steps(self, start, goal):
+        graph = self.graph
+        stats = {"expanded": 0, "pushed": 1, "reset": 0, "touched": 0, "los": 0, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        stats["reset"] = yield from graph.reset_steps()
+        los = self.los
+        los.catch_up()
+        checks = los.checks
+
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        visited = graph.visited
+        local_goal = graph.local_goal
+        parent = graph.parent
+        touched = graph.touched
+        clear = los.clear
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+        sqrt = math.sqrt
+        weight = self.weight
+        lazy = self.lazy
+        goal_x = goal % map_width
+        goal_y = goal // map_width
+
+        local_goal[start] = 0
+        touched.append(start)
+        start_x = start % map_width
+        start_y = start // map_width
+        push_count = 0
+        list_not_tested = [(weight * sqrt((start_x - goal_x) ** 2 + (start_y - goal_y) ** 2), push_count, start)]
+        # the start is popped and visited like any other cell, so start == goal ends with the goal visited at cost 0
+        current = -1
+        expanded = 0
+
+        while(len(list_not_tested) > 0 and current != goal):
+
+            while(len(list_not_tested) > 0 and visited[list_not_tested[0][2]]):
+                heappop(list_not_tested)
+
+            if len(list_not_tested) == 0:
+                break
+
+            current = heappop(list_not_tested)[2]
+            visited[current] = 1
+            expanded += 1
+            current_x = current % map_width
+            current_y = current // map_width
+
+            # the line of sight was only assumed, if it is blocked take the best expanded neighbour instead
+            # the neighbour whose expansion pushed this cell is always one of them
+            if lazy and parent[current] != -1:
+                p = parent[current]
+                if not clear(p % map_width, p // map_width, current_x, current_y):
+                    best_goal = math.inf
+                    for dx, dy, step in OCTILE_OFFSETS:
+                        nx = current_x + dx
+                        ny = current_y + dy
+                        if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                            continue
+                        nb = ny * map_width + nx
+                        if visited[nb] and local_goal[nb] + step < best_goal:
+                            best_goal = local_goal[nb] + step
+                            parent[current] = nb
+                    local_goal[current] = best_goal
+            yield current
+
+            current_goal = local_goal[current]
+            p = parent[current]
+            if p != -1:
+                p_x = p % map_width
+                p_y = p // map_width
+                p_goal = local_goal[p]
+
+            for dx, dy, step in OCTILE_OFFSETS:
+                nx = current_x + dx
+                ny = current_y + dy
+                if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                    continue
+                nb = ny * map_width + nx
+                if obstacles[nb] or visited[nb]:
+                    continue
+
+                # straight from the parent of current if it can see the neighbour, lazy just assumes it can
+                if p != -1 and (lazy or clear(p_x, p_y, nx, ny)):
+                    possibly_lower_goal = p_goal + sqrt((nx - p_x) ** 2 + (ny - p_y) ** 2)
+                    nb_parent = p
+                else:
+                    possibly_lower_goal = current_goal + step
+                    nb_parent = current
+
+                nb_goal = local_goal[nb]
+                if possibly_lower_goal < nb_goal:
+                    if nb_goal == math.inf:
+                        touched.append(nb)
+                    parent[nb] = nb_parent
+                    local_goal[nb] = possibly_lower_goal
+                    global_goal = possibly_lower_goal + weight * sqrt((nx - goal_x) ** 2 + (ny - goal_y) ** 2)
+                    push_count += 1
+                    heappush(list_not_tested, (global_goal, push_count, nb))
+
+        stats["expanded"] = expanded
+        stats["pushed"] += push_count
+        stats["touched"] = len(touched)
+        stats["los"] = los.checks - checks
+        stats["cost"] = local_goal[goal] if visited[goal] else math.inf
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # returns (path, cost, stats), path is the corners from start to goal as (x, y), [] and math.inf if there is none
+    def find_path(self, start, goal):
+        graph = self.graph
+        start_id = graph.index(start[0], start[1])
+        goal_id = graph.index(goal[0], goal[1])
+        stats = self.solve(start_id, goal_id)
+        path = graph.trace_path(start_id, goal_id)
+        if len(path) == 0 or stats["cost"] == math.inf:
+            return [], math.inf, stats
+        return [graph.coords(id) for id in path], stats["cost"], stats
+
+
+# string pulling after the search, the usual way to straighten an 8 neighbour path
+# path is every cell of the path as (x, y), eg. from Pathfinder.find_path, returns the corners that are left
+# each corner is followed for as long as the last corner can still see the cell after it
+def smooth_path(los, path):
+    los.catch_up()
+    if len(path) < 3:
+        return list(path)
+    corners = [path[0]]
+    for i in range(2, len(path)):
+        x0, y0 = corners[-1]
+        x1, y1 = path[i]
+        if not los.clear(x0, y0, x1, y1):
+            corners.append(path[i - 1])
+    corners.append(path[-1])
+    return corners
+
+
+# length of a path of (x, y) points, straight lines between them
+def path_length(path):
+    length = 0.0
+    for i in range(1, len(path)):
+        length += math.sqrt((path[i][0] - path[i - 1][0]) ** 2 + (path[i][1] - path[i - 1][1]) ** 2)
+    return length
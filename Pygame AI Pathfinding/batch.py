@@ -0,0 +1,129 @@
+#**********************************************************
+# Batch path queries for many agents on one map
+# The map is put in shared memory once, worker processes
+# each keep their own search arrays, so queries never mix
+#**********************************************************
+
+
+import os
+import multiprocessing
+import multiprocessing.util
+from multiprocessing import shared_memory
+
+from pathfinder import GridGraph, Pathfinder
+
+
+# state of a worker process, set up once by init_worker
+worker = {}
+
+
+# the shared memory holds the obstacles, followed by the terrain costs if the map has them
+def init_worker(shm_name, map_width, map_height, weighted, settings, backend):
+    size = map_width * map_height
+    shm = shared_memory.SharedMemory(name=shm_name)
+    views = [shm.buf[:size]]
+    if weighted:
+        views.append(shm.buf[size:2 * size])
+    worker["shm"] = shm
+    worker["views"] = views
+    worker["pathfinder"] = Pathfinder(GridGraph(map_width, map_height, *views), *settings, backend=backend)
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+
+# the views into shared memory have to be released before the shared memory can be closed
+def close_worker():
+    shm = worker["shm"]
+    views = worker["views"]
+    worker.clear()
+    for view in views:
+        view.release()
+    shm.close()
+
+
+def solve_chunk_with(pathfinder, chunk):
+    results = []
+    for start, goal in chunk:
+        results.append(pathfinder.find_path(start, goal))
+    return results
+
+
+# only the (start, goal) pairs are sent to the worker, never the map
+def solve_chunk(chunk):
+    return solve_chunk_with(worker["pathfinder"], chunk)
+
+
+# keeps a process pool and the shared map alive between batches, eg. one batch per game tick
+# if the map changes, call update_map before the next batch
+# backend is the same as for Pathfinder, every worker makes its own
+class BatchPathfinder:
+
+    def __init__(self, graph, algorithm="astar", heuristic=None, weight=1.0, cost_model="octile", processes=None, backend="auto"):
+        self.graph = graph
+        self.settings = (algorithm, heuristic, weight, cost_model)
+        if processes == None:
+            processes = os.cpu_count()
+        self.processes = processes
+        self.shm = None
+        self.pool = None
+
+        if processes == 1:
+            # no pool, a private graph on the same map so the caller's search arrays are left alone
+            self.pathfinder = Pathfinder(GridGraph(graph.map_width, graph.map_height, graph.obstacles, graph.costs), *self.settings, backend=backend)
+            return
+
+        # checks the settings here instead of failing inside every worker
+        Pathfinder(graph, *self.settings, backend=backend)
+
+        # the workers are told once whether there are terrain costs, a map cannot gain them later
+        self.weighted = graph.costs is not None
+        planes = 2 if self.weighted else 1
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, planes * graph.size))
+        self.update_map()
+        self.pool = multiprocessing.Pool(processes, init_worker, (self.shm.name, graph.map_width, graph.map_height, self.weighted, self.settings, backend))
+
+    # copy the obstacles and terrain costs into shared memory, workers see the change straight away
+    def update_map(self):
+        if self.shm != None:
+            size = self.graph.size
+            self.shm.buf[:size] = self.graph.obstacles
+            if self.weighted:
+                self.shm.buf[size:2 * size] = self.graph.costs
+
+    # queries is a list of ((start x, start y), (goal x, goal y))
+    # returns a (path, cost, stats) for each query, in the same order
+    def find_paths(self, queries, chunk_size=None):
+        if self.pool == None:
+            return solve_chunk_with(self.pathfinder, queries)
+
+        if chunk_size == None:
+            chunk_size = max(1, len(queries) // (self.processes * 4))
+        chunks = []
+        for i in range(0, len(queries), chunk_size):
+            chunks.append(queries[i:i + chunk_size])
+
+        results = []
+        for chunk_results in self.pool.map(solve_chunk, chunks, 1):
+            results.extend(chunk_results)
+        return results
+
+    def close(self):
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.shm != None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# one-off batch, starts and stops a pool, use BatchPathfinder to keep it between batches
+def find_paths(grid, queries, algorithm="astar", heuristic=None, weight=1.0, cost_model="octile", processes=None, backend="auto"):
+    with BatchPathfinder(grid, algorithm, heuristic, weight, cost_model, processes, backend) as batch:
+        return batch.find_paths(queries)
@@ -0,0 +1,1301 @@
+#**********************************************************
+# Benchmarks for the pathfinding engine in pathfinder.py
+# Runs without a Pygame window
+#**********************************************************
+
+
+import os
+import sys
+import json
+import random
+import math
+import time
+import platform
+import subprocess
+import argparse
+import tempfile
+import shutil
+import tracemalloc
+from array import array
+
+from pathfinder import GridGraph, Pathfinder, ALGORITHMS, BACKENDS, calc_distance
+from incremental import DStarLite
+from batch import BatchPathfinder
+from flowfield import FlowField, FlowFieldCache
+from hierarchical import HierarchicalPathfinder
+import flowfield
+import terrain
+import movingai
+from instrument import SearchProbe
+from pathcache import PathCache
+from landmarks import Landmarks
+from anyangle import AnyAnglePathfinder, LineOfSight, smooth_path, path_length
+import landmarks
+import kernels
+
+
+# build a map_width x map_height grid with random obstacles
+# returns the graph and the start and goal ids, in the same spots as pathfinding.py
+def build_grid(map_width, map_height, density, seed):
+    rng = random.Random(seed)
+    graph = GridGraph(map_width, map_height)
+    for id in range(graph.size):
+        if rng.random() < density:
+            graph.obstacles[id] = 1
+
+    start = graph.index(1, int(map_height/2))
+    goal = graph.index(map_width - 2, int(map_height/2))
+    graph.obstacles[start] = 0
+    graph.obstacles[goal] = 0
+    return graph, start, goal
+
+
+# perfect maze with 1 cell wide corridors, carved with a depth first search
+# corridor cells sit on odd coordinates, so start and goal are (1, 1) and the far corner
+def build_maze(map_width, map_height, seed):
+    rng = random.Random(seed)
+    map_width = map_width | 1
+    map_height = map_height | 1
+    graph = GridGraph(map_width, map_height)
+    for id in range(graph.size):
+        graph.obstacles[id] = 1
+
+    graph.set_obstacle(1, 1, False)
+    stack = [(1, 1)]
+    while len(stack) > 0:
+        x, y = stack[-1]
+        options = []
+        for dx, dy in ((0, -2), (0, 2), (-2, 0), (2, 0)):
+            nx = x + dx
+            ny = y + dy
+            if nx > 0 and nx < map_width - 1 and ny > 0 and ny < map_height - 1 and graph.is_obstacle(nx, ny):
+                options.append((nx, ny))
+        if len(options) == 0:
+            stack.pop()
+            continue
+        nx, ny = rng.choice(options)
+        graph.set_obstacle((x + nx) // 2, (y + ny) // 2, False)
+        graph.set_obstacle(nx, ny, False)
+        stack.append((nx, ny))
+
+    return graph, graph.index(1, 1), graph.index(map_width - 2, map_height - 2)
+
+
+# open field, random obstacles or maze
+def build_map(kind, size, seed):
+    if kind == "open":
+        return build_grid(size, size, 0, seed)
+    if kind == "maze":
+        return build_maze(size, size, seed)
+    return build_grid(size, size, 0.2, seed)
+
+
+# the Node class pathfinding.py used before the array-backed GridGraph, kept for comparisons
+class Node:
+
+    def __init__(self, x, y, map_width):
+        self.x = x
+        self.y = y
+        self.id = y*map_width + x
+        self.obstacle = False
+        self.visited = False
+        self.global_goal = math.inf
+        self.local_goal = math.inf
+        self.neighbours_list = []
+        self.parent_node = None
+
+    # less than, for sorting <
+    def __lt__(self, other):
+        return self.global_goal < other.global_goal
+
+
+# one Node per cell with stored neighbour lists, wired the same way pathfinding.py used to
+def build_node_list(graph):
+    map_width = graph.map_width
+    map_height = graph.map_height
+    node_list = []
+    for j in range(map_height):
+        for i in range(map_width):
+            node = Node(i, j, map_width)
+            node.obstacle = graph.obstacles[node.id] == 1
+            node_list.append(node)
+
+    for n in node_list:
+        for nb in graph.neighbours(n.id):
+            n.neighbours_list.append(node_list[nb])
+    return node_list
+
+
+def reset_nodes(node_list):
+    for n in node_list:
+        n.visited = False
+        n.global_goal = math.inf
+        n.local_goal = math.inf
+        n.parent_node = None
+
+
+# SQUARED distance, same as the old solve_astar
+def distance(a, b):
+    return (a.x - b.x) * (a.x - b.x) + (a.y - b.y) * (a.y - b.y)
+
+
+# the original solver, sorts the whole list on every expansion
+# uses the squared distance for both edge costs and the heuristic, so compare it with cost_model="squared"
+def solve_astar_sorted(node_list, node_start, node_end, dijkstra):
+    reset_nodes(node_list)
+
+    def heuristic(a, b):
+        if dijkstra:
+            return 1
+        return distance(a, b)
+
+    node_current = node_start
+    node_current.local_goal = 0
+    node_current.global_goal = heuristic(node_start, node_end)
+
+    list_not_tested = [node_start]
+
+    while(len(list_not_tested) > 0 and node_current != node_end):
+        list_not_tested.sort()
+
+        while(len(list_not_tested) > 0 and list_not_tested[0].visited):
+            list_not_tested.pop(0)
+
+        if len(list_not_tested) == 0:
+            break
+
+        node_current = list_not_tested[0]
+        node_current.visited = True
+
+        for nb in node_current.neighbours_list:
+            if nb.visited == False and nb.obstacle == False:
+                list_not_tested.append(nb)
+
+            possibly_lower_goal = node_current.local_goal + distance(node_current, nb)
+
+            if possibly_lower_goal < nb.local_goal:
+                nb.parent_node = node_current
+                nb.local_goal = possibly_lower_goal
+                nb.global_goal = nb.local_goal + heuristic(nb, node_end)
+
+
+# everything the renderer reads after a search, obstacles are never drawn as visited or on the path
+def node_list_result(node_list):
+    result = []
+    for n in node_list:
+        if n.obstacle:
+            continue
+        parent_id = -1
+        if n.parent_node != None:
+            parent_id = n.parent_node.id
+        result.append((n.visited, n.local_goal, parent_id))
+    return result
+
+
+def graph_result(graph):
+    result = []
+    for id in range(graph.size):
+        if graph.obstacles[id]:
+            continue
+        result.append((graph.visited[id] == 1, graph.local_goal[id], graph.parent[id]))
+    return result
+
+
+def bench_heap(args):
+    print("size        algorithm   sorted (s)   heap (s)   speedup   identical")
+    for size in args.sizes:
+        graph, start, goal = build_grid(size, size, args.density, args.seed)
+        node_list = build_node_list(graph)
+        for dijkstra in (False, True):
+            t0 = time.perf_counter()
+            solve_astar_sorted(node_list, node_list[start], node_list[goal], dijkstra)
+            t_sorted = time.perf_counter() - t0
+            before = node_list_result(node_list)
+
+            # the plain Python heapq search, made before timing so only the search is timed
+            name = "dijkstra" if dijkstra else "astar"
+            pathfinder = Pathfinder(graph, name, cost_model="squared", backend="python")
+            t0 = time.perf_counter()
+            pathfinder.solve(start, goal)
+            t_heap = time.perf_counter() - t0
+            after = graph_result(graph)
+
+            print("%-11s %-11s %-12.4f %-10.4f %-9.1f %s" % (str(size) + "x" + str(size), name, t_sorted, t_heap, t_sorted / t_heap, before == after))
+
+
+# build time and memory of the old Node objects against the flat arrays of GridGraph
+def bench_memory(args):
+    print("size          nodes (s)   nodes (bytes/cell)   arrays (s)   arrays (bytes/cell)")
+    for size in args.sizes:
+        graph = GridGraph(size, size)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        node_list = build_node_list(graph)
+        t_nodes = time.perf_counter() - t0
+        node_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del node_list
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        graph = GridGraph(size, size)
+        t_arrays = time.perf_counter() - t0
+        array_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        cells = size * size
+        print("%-13s %-11.3f %-20.1f %-12.4f %.1f" % (str(size) + "x" + str(size), t_nodes, node_bytes / cells, t_arrays, array_bytes / cells))
+
+
+# the reset used before the touched list, refills every search array
+def reset_all_nodes(graph):
+    graph.visited = bytearray(graph.size)
+    graph.local_goal = array('d', [math.inf]) * graph.size
+    graph.parent = array('i', [-1]) * graph.size
+    graph.touched = array('i')
+
+
+# short queries on big maps, where the reset used to cost more than the search
+def bench_reset(args):
+    print("size          full reset (ms)   touched reset (ms)   query (ms)   reset   touched")
+    for size in args.sizes:
+        graph = GridGraph(size, size)
+        pathfinder = Pathfinder(graph, backend="python")
+        start = graph.index(size // 2, size // 2)
+        goal = graph.index(size // 2 + args.distance, size // 2 + args.distance // 2)
+
+        t_full = 0
+        t_touched = 0
+        t_query = 0
+        stats = None
+        for q in range(args.queries):
+            t0 = time.perf_counter()
+            reset_all_nodes(graph)
+            t_full += time.perf_counter() - t0
+
+            pathfinder.solve(start, goal)
+
+            t0 = time.perf_counter()
+            graph.reset_nodes()
+            t_touched += time.perf_counter() - t0
+
+            pathfinder.solve(start, goal)
+            t0 = time.perf_counter()
+            stats = pathfinder.solve(start, goal)
+            t_query += time.perf_counter() - t0
+
+        n = args.queries
+        print("%-13s %-17.3f %-20.3f %-12.3f %-7d %d" % (str(size) + "x" + str(size), 1000 * t_full / n, 1000 * t_touched / n, 1000 * t_query / n, stats["reset"], stats["touched"]))
+
+
+# A Star with octile costs against Jump Point Search, both should find the same cost
+def bench_jps(args):
+    print("map      size        astar expanded   jps expanded   jps scanned   ratio    astar (s)   jps (s)    same cost")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+
+            astar = Pathfinder(graph, "astar", backend="python")
+            t0 = time.perf_counter()
+            astar_stats = astar.solve(start, goal)
+            t_astar = time.perf_counter() - t0
+            astar_cost = graph.local_goal[goal]
+
+            jps = Pathfinder(graph, "jps")
+            t0 = time.perf_counter()
+            jps_stats = jps.solve(start, goal)
+            t_jps = time.perf_counter() - t0
+            jps_cost = graph.local_goal[goal]
+
+            same = abs(astar_cost - jps_cost) < 1e-9 or astar_cost == jps_cost
+            ratio = astar_stats["expanded"] / max(1, jps_stats["expanded"])
+            print("%-8s %-11s %-16d %-14d %-13d %-8.1f %-11.4f %-10.4f %s" % (kind, str(size) + "x" + str(size), astar_stats["expanded"], jps_stats["expanded"], jps_stats["jumped"], ratio, t_astar, t_jps, same))
+
+
+# one way against both ways on corner to corner queries, A Star against bidirectional A Star with the octile
+# heuristic, then dijkstra against bidirectional dijkstra with the zero heuristic
+def bench_bidir(args):
+    print("map      size        search     one way expanded   both ways expanded   ratio    one way (s)   both ways (s)   same cost")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            for name, algorithm, heuristic in (("astar", "astar", "octile"), ("dijkstra", "dijkstra", "zero")):
+                one_way = Pathfinder(graph, algorithm, backend="python").solve(start, goal)
+                both_ways = Pathfinder(graph, "bidirectional", heuristic).solve(start, goal)
+                same = abs(one_way["cost"] - both_ways["cost"]) < 1e-9 or one_way["cost"] == both_ways["cost"]
+                ratio = one_way["expanded"] / max(1, both_ways["expanded"])
+                print("%-8s %-11s %-10s %-18d %-20d %-8.2f %-13.4f %-15.4f %s" % (kind, str(size) + "x" + str(size), name, one_way["expanded"], both_ways["expanded"], ratio, one_way["time"], both_ways["time"], same))
+
+
+# the arrays a search leaves behind, byte for byte
+def graph_arrays(graph):
+    return bytes(graph.visited), bytes(graph.local_goal), bytes(graph.parent)
+
+
+# the same A Star and dijkstra searches with the Python loop and the compiled kernel
+# every query is checked to expand the same number of cells and end up with the same cost and graph arrays
+def bench_backend(args):
+    if not kernels.AVAILABLE:
+        print("numba or numpy is not installed, only the python backend is available")
+        return
+    print("map      size        search     queries   expanded    python (s)   numba (s)   python cells/s   numba cells/s   speedup   same results")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            queries = [(graph.index(*a), graph.index(*b)) for a, b in random_queries(graph, args.queries, args.seed)]
+            for algorithm in ("astar", "dijkstra"):
+                python = Pathfinder(graph, algorithm, backend="python")
+                numba = Pathfinder(graph, algorithm, backend="numba")
+                expanded = 0
+                times = [0.0, 0.0]
+                same = True
+                for a, b in queries:
+                    python_stats = python.solve(a, b)
+                    python_result = graph_arrays(graph)
+                    numba_stats = numba.solve(a, b)
+                    times[0] += python_stats["time"]
+                    times[1] += numba_stats["time"]
+                    expanded += python_stats["expanded"]
+                    if python_stats["expanded"] != numba_stats["expanded"] or python_stats["cost"] != numba_stats["cost"] or python_result != graph_arrays(graph):
+                        same = False
+                print("%-8s %-11s %-10s %-9d %-11d %-12.4f %-11.4f %-16.0f %-15.0f %-9.1f %s" % (kind, str(size) + "x" + str(size), algorithm, len(queries), expanded,
+                      times[0], times[1], expanded / times[0], expanded / times[1], times[0] / times[1], same))
+
+
+# landmark tables against the plain octile heuristic over random queries, for A Star and bidirectional A Star
+# build is the time to pick the landmarks and run their Dijkstras, then the tables are saved and loaded back,
+# the searches use the loaded tables so the memory mapped file is what gets read
+def bench_alt(args):
+    folder = tempfile.mkdtemp()
+    try:
+        for kind in args.maps:
+            for size in args.sizes:
+                graph, start, goal = build_map(kind, size, args.seed)
+                table = Landmarks(graph, args.count, args.active, args.method)
+                path = os.path.join(folder, "map.landmarks")
+                t0 = time.perf_counter()
+                table.save(path)
+                t_save = time.perf_counter() - t0
+                t0 = time.perf_counter()
+                loaded = landmarks.load(path, graph, args.active)
+                t_load = time.perf_counter() - t0
+                print("%s %dx%d: %d landmarks, build %.3f s (%s), save %.3f s, load %.4f s, %.1f MB" % (kind, size, size, len(table.ids), table.stats["time"],
+                      args.method, t_save, t_load, os.path.getsize(path) / 1e6))
+
+                queries = [(graph.index(*a), graph.index(*b)) for a, b in random_queries(graph, args.queries, args.seed)]
+                print("search          plain expanded   landmark expanded   ratio    plain (s)   landmark (s)   same cost")
+                for algorithm in ("astar", "bidirectional"):
+                    plain = Pathfinder(graph, algorithm, backend="python")
+                    alt = Pathfinder(graph, algorithm, landmarks=loaded)
+                    totals = [0, 0, 0.0, 0.0]
+                    same = True
+                    for start, goal in queries:
+                        plain_stats = plain.solve(start, goal)
+                        alt_stats = alt.solve(start, goal)
+                        totals[0] += plain_stats["expanded"]
+                        totals[1] += alt_stats["expanded"]
+                        totals[2] += plain_stats["time"]
+                        totals[3] += alt_stats["time"]
+                        if not (abs(plain_stats["cost"] - alt_stats["cost"]) < 1e-9 or plain_stats["cost"] == alt_stats["cost"]):
+                            same = False
+                    print("%-15s %-16d %-19d %-8.2f %-11.4f %-14.4f %s" % (algorithm, totals[0], totals[1], totals[0] / max(1, totals[1]), totals[2], totals[3], same))
+                print("")
+                del alt, loaded
+    finally:
+        shutil.rmtree(folder)
+
+
+# points of a cell path where it changes direction, plus both ends
+def corner_points(path):
+    corners = path[:1]
+    for i in range(1, len(path) - 1):
+        if (path[i][0] - path[i - 1][0], path[i][1] - path[i - 1][1]) != (path[i + 1][0] - path[i][0], path[i + 1][1] - path[i][1]):
+            corners.append(path[i])
+    return corners + path[-1:] if len(path) > 1 else corners
+
+
+# 8 neighbour A Star, A Star with string pulling afterwards, Theta* and Lazy Theta* on the same random queries
+# waypoints are the corners an agent has to turn at, length is the straight line length through them
+# the smoothing time is the extra pass after the search, the A Star + smoothing time is both together
+def bench_anyangle(args):
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            t0 = time.perf_counter()
+            los = LineOfSight(graph)
+            t_build = time.perf_counter() - t0
+            queries = random_queries(graph, args.queries, args.seed)
+            print("%s %dx%d, %d queries, line of sight grid built in %.4f s" % (kind, size, size, len(queries), t_build))
+            print("search             expanded   waypoints   length       los checks   time (s)   vs astar length")
+
+            rows = {}
+            for name in ("astar", "astar + smoothing", "theta", "lazy theta"):
+                rows[name] = [0, 0, 0.0, 0, 0.0]
+            astar = Pathfinder(graph, "astar", backend="python")
+            searches = (("theta", AnyAnglePathfinder(graph, False, los=los)), ("lazy theta", AnyAnglePathfinder(graph, True, los=los)))
+
+            # a query from a cell to itself is that cell at cost 0, the same as Pathfinder.find_path gives
+            a = queries[0][0]
+            for name, search in searches:
+                any_path, any_cost, any_stats = search.find_path(a, a)
+                if any_path != [a] or any_cost != 0:
+                    print("%s from %s to itself gave %s, cost %s" % (name, a, any_path, any_cost))
+                    sys.exit(1)
+
+            for a, b in queries:
+                path, cost, stats = astar.find_path(a, b)
+                if len(path) == 0:
+                    continue
+                row = rows["astar"]
+                row[0] += stats["expanded"]
+                corners = corner_points(path)
+                row[1] += len(corners)
+                row[2] += path_length(corners)
+                row[4] += stats["time"]
+
+                checks = los.checks
+                t0 = time.perf_counter()
+                smoothed = smooth_path(los, path)
+                t_smooth = time.perf_counter() - t0
+                row = rows["astar + smoothing"]
+                row[0] += stats["expanded"]
+                row[1] += len(smoothed)
+                row[2] += path_length(smoothed)
+                row[3] += los.checks - checks
+                row[4] += stats["time"] + t_smooth
+
+                for name, search in searches:
+                    t0 = time.perf_counter()
+                    any_path, any_cost, any_stats = search.find_path(a, b)
+                    row = rows[name]
+                    row[0] += any_stats["expanded"]
+                    row[1] += len(any_path)
+                    row[2] += any_cost
+                    row[3] += any_stats["los"]
+                    row[4] += time.perf_counter() - t0
+            for name in rows:
+                row = rows[name]
+                print("%-18s %-10d %-11d %-12.1f %-12d %-10.4f %.2f%%" % (name, row[0], row[1], row[2], row[3], row[4], 100 * (row[2] / max(1e-9, rows["astar"][2]) - 1)))
+            print("")
+
+
+# every heuristic and a few weights, shortest is the dijkstra cost
+def bench_heuristics(args):
+    print("map      heuristic   weight   cost       shortest   expanded   time (s)")
+    for kind in args.maps:
+        graph, start, goal = build_map(kind, args.size, args.seed)
+        shortest = Pathfinder(graph, "dijkstra", backend="python").solve(start, goal)["cost"]
+
+        for heuristic in args.heuristics:
+            for weight in args.weights:
+                stats = Pathfinder(graph, "astar", heuristic, weight, backend="python").solve(start, goal)
+                is_shortest = abs(stats["cost"] - shortest) < 1e-9
+                print("%-8s %-11s %-8.2f %-10.2f %-10s %-10d %.4f" % (kind, heuristic, weight, stats["cost"], is_shortest, stats["expanded"], stats["time"]))
+
+
+# single cell edits and start moves, D* Lite repair against a full A Star re-solve
+# edits block a cell on the current path, or clear an obstacle next to it, so the path really changes
+def bench_replan(args):
+    print("size        event    d* lite expanded   d* lite (ms)   astar expanded   astar (ms)   same cost")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        graph, start, goal = build_grid(size, size, args.density, args.seed)
+        planner = DStarLite(graph, start, goal)
+        stats = planner.compute()
+        print("%-11s %-8s %-18d %-14.2f" % (str(size) + "x" + str(size), "initial", stats["expanded"], 1000 * stats["time"]))
+
+        totals = {}
+        for q in range(args.edits):
+            path = planner.path()
+            if len(path) < 4:
+                break
+
+            if q % 4 == 3:
+                event = "move"
+                planner.move_start(path[2])
+            else:
+                event = "edit"
+                id = path[rng.randrange(1, len(path) - 1)]
+                if q % 2 == 1:
+                    # clear a nearby obstacle instead of adding one
+                    for nb in graph.neighbours(id):
+                        if graph.obstacles[nb]:
+                            id = nb
+                            break
+                x, y = graph.coords(id)
+                planner.toggle_obstacle(x, y)
+
+            d_stats = planner.compute()
+            a_stats = Pathfinder(graph, "astar", backend="python").solve(planner.start, goal)
+            same = abs(d_stats["cost"] - a_stats["cost"]) < 1e-6 or d_stats["cost"] == a_stats["cost"]
+
+            if event not in totals:
+                totals[event] = [0, 0, 0, 0, 0, True]
+            t = totals[event]
+            t[0] += 1
+            t[1] += d_stats["expanded"]
+            t[2] += d_stats["time"]
+            t[3] += a_stats["expanded"]
+            t[4] += a_stats["time"]
+            t[5] = t[5] and same
+
+        for event in totals:
+            n, d_expanded, d_time, a_expanded, a_time, same = totals[event]
+            print("%-11s %-8s %-18d %-14.2f %-16d %-12.2f %s" % ("", event, d_expanded / n, 1000 * d_time / n, a_expanded / n, 1000 * a_time / n, same))
+
+
+# random (start, goal) pairs on free cells
+def random_queries(graph, count, seed):
+    rng = random.Random(seed)
+    free = []
+    for id in range(graph.size):
+        if graph.obstacles[id] == 0:
+            free.append(id)
+    queries = []
+    for q in range(count):
+        queries.append((graph.coords(rng.choice(free)), graph.coords(rng.choice(free))))
+    return queries
+
+
+# writes one random terrain map as .npy, .png and .terrain, then loads each one and runs a short query on it
+# the .terrain file is memory mapped, so only the pages around the query are read
+def bench_terrain(args):
+    size = args.size
+    rng = random.Random(args.seed)
+    # a fifth obstacles, the rest cost 1 to 4
+    table = bytes(0 if v < 51 else 1 + v % 4 for v in range(256))
+    values = rng.randbytes(size * size).translate(table)
+    graph = terrain.graph_from_values(values, size, size)
+
+    folder = tempfile.mkdtemp()
+    try:
+        paths = []
+        t0 = time.perf_counter()
+        terrain.save_terrain(graph, os.path.join(folder, "map.terrain"))
+        paths.append(("terrain", os.path.join(folder, "map.terrain"), time.perf_counter() - t0))
+        if terrain.np != None:
+            t0 = time.perf_counter()
+            terrain.np.save(os.path.join(folder, "map.npy"), terrain.np.frombuffer(values, dtype=terrain.np.uint8).reshape(size, size))
+            paths.append(("npy", os.path.join(folder, "map.npy"), time.perf_counter() - t0))
+        try:
+            import pygame
+            t0 = time.perf_counter()
+            grey = bytes(values).translate(bytes([0] + [256 - v for v in range(1, 256)]))
+            rgb = bytearray(3 * len(grey))
+            rgb[0::3] = grey
+            rgb[1::3] = grey
+            rgb[2::3] = grey
+            pygame.image.save(pygame.image.frombuffer(bytes(rgb), (size, size), "RGB"), os.path.join(folder, "map.png"))
+            paths.append(("png", os.path.join(folder, "map.png"), time.perf_counter() - t0))
+        except ImportError:
+            pass
+
+        # a short query in the middle of the map
+        start = (size // 2, size // 2)
+        goal = (min(size - 1, size // 2 + args.distance), min(size - 1, size // 2 + args.distance))
+        for id in (graph.index(*start), graph.index(*goal)):
+            graph.obstacles[id] = 0
+
+        # every load makes a GridGraph, its search arrays are the same whatever the file
+        t0 = time.perf_counter()
+        GridGraph(size, size)
+        t_arrays = time.perf_counter() - t0
+        print("cells: " + str(size * size) + ", file sizes in MB, times in seconds")
+        print("load includes %.3f s for the search arrays of the graph, the same for every format" % t_arrays)
+        print("format    file (MB)   save      load      first query   cost      same cost")
+        for name, path, t_save in paths:
+            t0 = time.perf_counter()
+            loaded = terrain.load_terrain(path)
+            t_load = time.perf_counter() - t0
+            for id in (graph.index(*start), graph.index(*goal)):
+                loaded.obstacles[id] = 0
+            t0 = time.perf_counter()
+            result_path, cost, stats = Pathfinder(loaded, backend="python").find_path(start, goal)
+            t_query = time.perf_counter() - t0
+            same = cost == Pathfinder(graph, backend="python").find_path(start, goal)[1]
+            print("%-9s %-11.1f %-9.3f %-9.3f %-13.4f %-9.2f %s" % (name, os.path.getsize(path) / 1e6, t_save, t_load, t_query, cost, same))
+            del loaded
+    finally:
+        shutil.rmtree(folder)
+
+
+# the same batch of queries with more and more worker processes, results must match the serial run
+def bench_batch(args):
+    graph, start, goal = build_grid(args.size, args.size, args.density, args.seed)
+    queries = random_queries(graph, args.queries, args.seed)
+    print("cpus: " + str(os.cpu_count()) + ", map: " + str(args.size) + "x" + str(args.size) + ", queries: " + str(args.queries))
+    print("processes   time (s)   queries/s   speedup   same results")
+
+    serial = None
+    serial_time = 0
+    for processes in args.processes:
+        with BatchPathfinder(graph, processes=processes, backend="python") as batch:
+            # pool start up is left out, the pool is meant to be kept between batches
+            t0 = time.perf_counter()
+            results = batch.find_paths(queries)
+            t = time.perf_counter() - t0
+
+        paths = [(path, cost) for path, cost, stats in results]
+        if serial == None:
+            serial = paths
+            serial_time = t
+        print("%-11d %-10.3f %-11.0f %-9.2f %s" % (processes, t, len(queries) / t, serial_time / t, paths == serial))
+
+
+# one flow field for every agent vs one A Star per agent, all heading to the same goal
+def bench_flow(args):
+    methods = ["python"]
+    if flowfield.np != None:
+        methods.append("numpy")
+    print("map      size        agents   astar (s)   " + "".join("%-12s" % (m + " (s)") for m in methods) + "lookups (s)   same cost")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            goal_x, goal_y = graph.coords(goal)
+            agents = [start for start, goal in random_queries(graph, args.agents, args.seed)]
+
+            pathfinder = Pathfinder(graph, "astar", backend="python")
+            t0 = time.perf_counter()
+            astar_costs = []
+            for agent in agents:
+                path, cost, stats = pathfinder.find_path(agent, (goal_x, goal_y))
+                astar_costs.append(cost)
+            t_astar = time.perf_counter() - t0
+
+            times = []
+            fields = []
+            for method in methods:
+                field = FlowField(graph, goal, method)
+                times.append(field.stats["time"])
+                fields.append(field)
+
+            # every agent walks the field all the way to the goal
+            field = fields[-1]
+            t0 = time.perf_counter()
+            for x, y in agents:
+                field.path_from(x, y)
+            t_lookup = time.perf_counter() - t0
+
+            same = fields[0].cost == fields[-1].cost
+            for agent, cost in zip(agents, astar_costs):
+                field_cost = field.cost_at(agent[0], agent[1])
+                if abs(field_cost - cost) > 1e-6 and field_cost != cost:
+                    same = False
+            print("%-8s %-11s %-8d %-11.3f " % (kind, str(size) + "x" + str(size), len(agents), t_astar) + "".join("%-12.3f" % t for t in times) + "%-13.3f %s" % (t_lookup, same))
+
+    # toggles near and far from the goals, only fields that could see the change are dropped
+    graph, start, goal = build_map("random", args.sizes[0], args.seed)
+    cache = FlowFieldCache(graph, capacity=8)
+    rng = random.Random(args.seed)
+    goals = [goal for start, goal in random_queries(graph, 8, args.seed)]
+    for q in range(args.edits):
+        for x, y in goals:
+            cache.get(graph.index(x, y))
+        cache.toggle_obstacle(rng.randrange(graph.map_width), rng.randrange(graph.map_height))
+    print("cache: %d goals, %d edits, %d hits, %d misses" % (len(goals), args.edits, cache.hits, cache.misses))
+
+
+# query latency of flat A Star against HPA*, the abstract search alone and with the path refined
+def bench_hpa(args):
+    print("map      size        cluster   build (s)   nodes    astar (ms)   abstract (ms)   hpa (ms)   speedup   cost ratio   worst     rebuild (ms)")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            hierarchy = HierarchicalPathfinder(graph, args.cluster_size)
+            pathfinder = Pathfinder(graph, "astar", backend="python")
+
+            t_astar = 0
+            t_abstract = 0
+            t_hpa = 0
+            ratios = []
+            for start, goal in random_queries(graph, args.queries, args.seed):
+                t0 = time.perf_counter()
+                path, astar_cost, stats = pathfinder.find_path(start, goal)
+                t_astar += time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                hierarchy.abstract_path(graph.index(start[0], start[1]), graph.index(goal[0], goal[1]))
+                t_abstract += time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                path, hpa_cost, stats = hierarchy.find_path(start, goal)
+                t_hpa += time.perf_counter() - t0
+
+                if astar_cost != math.inf and astar_cost > 0:
+                    ratios.append(hpa_cost / astar_cost)
+
+            # toggles at random cells, only the clusters around each one are rebuilt
+            rng = random.Random(args.seed)
+            t0 = time.perf_counter()
+            for q in range(args.edits):
+                hierarchy.toggle_obstacle(rng.randrange(size), rng.randrange(size))
+            t_rebuild = (time.perf_counter() - t0) / args.edits
+
+            n = args.queries
+            mean_ratio = sum(ratios) / max(1, len(ratios))
+            print("%-8s %-11s %-9d %-11.2f %-8d %-12.1f %-15.1f %-10.1f %-9.1f %-12.3f %-9.3f %.1f" % (kind, str(size) + "x" + str(size), args.cluster_size,
+                  hierarchy.stats["build time"], hierarchy.stats["nodes"], t_astar / n * 1000, t_abstract / n * 1000, t_hpa / n * 1000,
+                  t_astar / t_hpa, mean_ratio, max(ratios, default=1), t_rebuild * 1000))
+
+
+# the drawing pathfinding.py used to do every frame, everything redrawn and the path traced once per cell
+def draw_frame_legacy(pygame, screen, graph, node_start, node_end, node_size, node_border):
+    map_width = graph.map_width
+    map_height = graph.map_height
+    c_red = (255, 0, 0)
+    c_green = (0, 255, 0)
+    c_blue = (0, 0, 255)
+    c_yellow = (255, 255, 0)
+    c_gray = (100, 100, 100)
+    c_darkblue = (0, 0, 150)
+
+    screen.fill((0, 0, 0))
+    for i in range(map_width):
+        for j in range(map_height):
+            start_x = i * node_size + node_size / 2
+            start_y = j * node_size + node_size / 2
+            for nb in graph.neighbours(j * map_width + i):
+                nb_x, nb_y = graph.coords(nb)
+                pygame.draw.line(screen, c_blue, (start_x, start_y), (nb_x * node_size + node_size / 2, nb_y * node_size + node_size / 2), 3)
+
+    for i in range(map_width):
+        for j in range(map_height):
+            rect = pygame.Rect(i * node_size + node_border, j * node_size + node_border, node_size - node_border, node_size - node_border)
+            if graph.obstacles[j * map_width + i] == 1:
+                c_colour = c_gray
+            elif graph.visited[j * map_width + i] == 1:
+                c_colour = c_darkblue
+            else:
+                c_colour = c_blue
+            if j * map_width + i == node_start:
+                c_colour = c_green
+            if j * map_width + i == node_end:
+                c_colour = c_red
+
+            total_distance = 0
+            trace_node = node_end
+            while graph.parent[trace_node] != -1:
+                x, y = graph.coords(trace_node)
+                parent_x, parent_y = graph.coords(graph.parent[trace_node])
+                total_distance += calc_distance(x, y, parent_x, parent_y)
+                pygame.draw.line(screen, c_yellow, (x * node_size + node_size / 2, y * node_size + node_size / 2),
+                                 (parent_x * node_size + node_size / 2, parent_y * node_size + node_size / 2), 3)
+                trace_node = graph.parent[trace_node]
+
+            pygame.draw.rect(screen, c_colour, rect)
+
+
+# one search in one go against the same search run a few milliseconds at a time, like one per frame
+# the worst slice is how long the UI would freeze for, instead of the whole search
+def bench_slice(args):
+    print("map      size        full (ms)   budget (ms)   slices   worst slice (ms)   sliced total (ms)   same path")
+    for kind in args.maps:
+        for size in args.sizes:
+            graph, start, goal = build_map(kind, size, args.seed)
+            pathfinder = Pathfinder(graph, "astar", backend="python")
+
+            t0 = time.perf_counter()
+            pathfinder.solve(start, goal)
+            t_full = time.perf_counter() - t0
+            full_path = graph.trace_path(start, goal)
+
+            task = pathfinder.start_search(start, goal)
+            slices = 0
+            worst = 0
+            done = False
+            while not done:
+                t0 = time.perf_counter()
+                done = task.run(max_time=args.budget / 1000)
+                worst = max(worst, time.perf_counter() - t0)
+                slices += 1
+            path, cost = task.result()
+
+            print("%-8s %-11s %-11.1f %-13.1f %-8d %-18.2f %-19.1f %s" % (kind, str(size) + "x" + str(size), t_full * 1000, args.budget,
+                  slices, worst * 1000, task.run_time * 1000, path == full_path))
+
+
+# path ids from goal back to start, the way pathfinding.py traces it once per solve
+def traced_path(graph, goal):
+    path = [goal]
+    while graph.parent[path[-1]] != -1:
+        path.append(graph.parent[path[-1]])
+    return path if len(path) > 1 else []
+
+
+# frame times of the old full redraw against the renderer that only draws changed cells
+# idle frames change nothing, edit frames toggle a cell and solve again like a click does
+def bench_render(args):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from renderer import GridRenderer
+    pygame.init()
+    font = pygame.font.Font('freesansbold.ttf', 10)
+
+    print("size        cells     cell px   legacy frame (ms)   first frame (ms)   idle frame (ms)   edit frame (ms)   rects drawn per edit")
+    for size in args.sizes:
+        cell_size = max(2, min(20, 1600 // size, 900 // size))
+        cell_border = cell_size * 5 // 20
+        screen = pygame.Surface((size * cell_size, size * cell_size))
+        graph, start, goal = build_grid(size, size, args.density, args.seed)
+        pathfinder = Pathfinder(graph, backend="python")
+        pathfinder.solve(start, goal)
+
+        legacy = "-"
+        if size <= args.legacy_max:
+            t0 = time.perf_counter()
+            draw_frame_legacy(pygame, screen, graph, start, goal, cell_size, cell_border)
+            legacy = "%.1f" % ((time.perf_counter() - t0) * 1000)
+
+        renderer = GridRenderer(screen, graph, cell_size, cell_border, font)
+        renderer.set_ends(start, goal)
+        renderer.set_path(traced_path(graph, goal))
+        t0 = time.perf_counter()
+        renderer.draw()
+        t_first = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for q in range(args.frames):
+            renderer.draw()
+        t_idle = (time.perf_counter() - t0) / args.frames
+
+        rng = random.Random(args.seed)
+        t_edit = 0
+        drawn = 0
+        for q in range(args.edits):
+            id = rng.randrange(graph.size)
+            if id == start or id == goal:
+                continue
+            graph.toggle_obstacle(id % size, id // size)
+            renderer.mark(id)
+            renderer.mark_cells(graph.touched)
+            pathfinder.solve(start, goal)
+            renderer.mark_cells(graph.touched)
+            renderer.set_path(traced_path(graph, goal))
+
+            t0 = time.perf_counter()
+            drawn += len(renderer.draw())
+            t_edit += time.perf_counter() - t0
+
+        print("%-11s %-9d %-9d %-19s %-18.1f %-17.3f %-17.1f %d" % (str(size) + "x" + str(size), graph.size, cell_size, legacy,
+              t_first * 1000, t_idle * 1000, t_edit / args.edits * 1000, drawn // args.edits))
+
+
+# random queries with and without a SearchProbe, then the probe report
+# the plain runs show the cost of having probes at all, the probed runs show what measuring costs
+def bench_probe(args):
+    graph, start, goal = build_map(args.map, args.size, args.seed)
+    queries = random_queries(graph, args.queries, args.seed)
+    probe = SearchProbe()
+    plain = Pathfinder(graph, args.algorithm, args.heuristic, backend="python")
+    probed = Pathfinder(graph, args.algorithm, args.heuristic, probe=probe)
+
+    t_plain = math.inf
+    t_probed = math.inf
+    for r in range(args.repeat):
+        probe.clear()
+        t0 = time.perf_counter()
+        for start, goal in queries:
+            plain.find_path(start, goal)
+        t_plain = min(t_plain, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for start, goal in queries:
+            probed.find_path(start, goal)
+        t_probed = min(t_probed, time.perf_counter() - t0)
+
+    print("%s on a %dx%d %s map, %d queries, %s heuristic" % (args.algorithm, args.size, args.size, args.map, len(queries), plain.heuristic))
+    print("without probe: %.3f s   with probe: %.3f s   (%.0f%% slower while measuring)" % (t_plain, t_probed, 100 * (t_probed / t_plain - 1)))
+    print()
+    for line in probe.report():
+        print(line)
+    if args.export != None:
+        probe.export(args.export)
+        print()
+        print("per-query stats written to " + args.export)
+
+
+# repeated route queries with the odd obstacle toggle in between, with and without a PathCache
+# a few pairs are asked for far more often than the rest, like the busy routes of a game server
+def bench_cache(args):
+    print("size        capacity   queries   edits   hit rate   invalidated   evicted   no cache (s)   cache (s)   speedup   same cost")
+    for size in args.sizes:
+        graph, start, goal = build_grid(size, size, args.density, args.seed)
+        pairs = random_queries(graph, args.pairs, args.seed)
+        rng = random.Random(args.seed)
+        # pair i comes up about 1 / (i + 1) as often as pair 0
+        weights = [1 / (i + 1) for i in range(len(pairs))]
+        workload = []
+        for q in range(args.queries):
+            edit = None
+            if rng.random() < args.edit_rate:
+                edit = (rng.randrange(size), rng.randrange(size))
+            workload.append((rng.choices(pairs, weights)[0], edit))
+
+        for capacity in args.capacities:
+            # both runs start from the same map and make the same edits
+            plain_graph = GridGraph(size, size, bytearray(graph.obstacles))
+            cached_graph = GridGraph(size, size, bytearray(graph.obstacles))
+            plain = Pathfinder(plain_graph, backend="python")
+            pathfinder = Pathfinder(cached_graph, backend="python")
+            cache = PathCache(cached_graph, capacity)
+
+            t_plain = 0.0
+            t_cached = 0.0
+            same = True
+            edits = 0
+            for (a, b), edit in workload:
+                if edit != None:
+                    plain_graph.toggle_obstacle(*edit)
+                    cached_graph.toggle_obstacle(*edit)
+                    edits += 1
+                t0 = time.perf_counter()
+                path, cost, stats = plain.find_path(a, b)
+                t_plain += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                cached_path, cached_cost, stats = cache.find_path(pathfinder, a, b)
+                t_cached += time.perf_counter() - t0
+                if abs(cost - cached_cost) > 1e-9 and cost != cached_cost:
+                    same = False
+
+            print("%-11s %-10d %-9d %-7d %-10.2f %-13d %-9d %-14.3f %-11.3f %-9.1f %s" % (str(size) + "x" + str(size), capacity, len(workload), edits,
+                  cache.hit_rate(), cache.stats["invalidated"], cache.stats["evicted"], t_plain, t_cached, t_plain / t_cached, same))
+
+
+# value at fraction q of the way through the sorted values, eg. 0.5 for the median
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+# the generated scenario sets, (name, graph, queries), always the same for the same seed
+# queries are ((start x, start y), (goal x, goal y), optimal length), optimal is the dijkstra cost
+def generated_sets(args):
+    sets = []
+    for kind in args.kinds:
+        if kind == "maze":
+            maps = [("maze-" + str(args.size), build_maze(args.size, args.size, args.seed)[0])]
+        else:
+            maps = [("random-" + str(args.size) + "-" + str(density), build_grid(args.size, args.size, density, args.seed)[0]) for density in args.densities]
+        for name, graph in maps:
+            sets.append((name, graph, shortest_queries(graph, random_queries(graph, args.queries, args.seed))))
+    return sets
+
+
+# (start, goal, dijkstra cost) for every pair with a path, the cost the other algorithms have to match
+def shortest_queries(graph, pairs):
+    dijkstra = Pathfinder(graph, "dijkstra", backend="python")
+    queries = []
+    for start, goal in pairs:
+        path, cost, stats = dijkstra.find_path(start, goal)
+        if cost != math.inf:
+            queries.append((start, goal, cost))
+    return queries
+
+
+# the sets in .scen files, one set per .scen, the .map files are read once each
+# the engine lets diagonal steps cut past corners and Moving AI paths do not, so the lengths in the file can be
+# longer than the real shortest path here, each query is checked against the engine's own dijkstra cost instead
+def scen_sets(paths):
+    sets = []
+    maps = {}
+    for path in paths:
+        scen = movingai.load_scen(path)
+        if len(scen) == 0:
+            continue
+        map_file = movingai.map_path(path, scen[0][1])
+        if map_file not in maps:
+            maps[map_file] = movingai.load_map(map_file)
+        queries = shortest_queries(maps[map_file], [(start, goal) for bucket, name, start, goal, optimal in scen])
+        sets.append((os.path.splitext(os.path.basename(path))[0], maps[map_file], queries))
+    return sets
+
+
+# every query of a set with one algorithm
+# latency is timed query by query, the set is run repeat times and each query keeps its fastest time,
+# so a burst of other work on the machine only spoils one of the runs
+# peak memory is measured on another run with tracemalloc on, since tracing slows everything down
+def run_set(graph, queries, algorithm, repeat, backend):
+    pathfinder = Pathfinder(graph, algorithm, backend=backend)
+    latencies = [math.inf] * len(queries)
+    expanded = []
+    costs = []
+    for r in range(repeat):
+        for i in range(len(queries)):
+            start, goal, optimal = queries[i]
+            t0 = time.perf_counter()
+            path, cost, stats = pathfinder.find_path(start, goal)
+            latencies[i] = min(latencies[i], time.perf_counter() - t0)
+            if r == 0:
+                expanded.append(stats["expanded"])
+                costs.append(cost)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for start, goal, optimal in queries:
+        pathfinder.find_path(start, goal)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    # paths longer or shorter than the dijkstra cost, either way the algorithm got something wrong
+    not_optimal = 0
+    for cost, query in zip(costs, queries):
+        if abs(cost - query[2]) > 1e-6:
+            not_optimal += 1
+    return {
+        "backend": pathfinder.backend,
+        "queries": len(queries),
+        "expanded total": sum(expanded),
+        "expanded mean": sum(expanded) / max(1, len(expanded)),
+        "p50 ms": 1000 * percentile(latencies, 0.5),
+        "p99 ms": 1000 * percentile(latencies, 0.99),
+        "total s": sum(latencies),
+        "peak query memory": peak,
+        "graph bytes": int(graph.bytes_per_cell() * graph.size),
+        "cost total": sum(costs),
+        "not optimal": not_optimal,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# compares a run against an older JSON file, a result is a regression if its expansions changed
+# or it got more than threshold slower, returns how many regressions there were
+def compare_results(results, old_path, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    old_results = {}
+    for result in old["results"]:
+        old_results[(result["set"], result["algorithm"])] = result
+
+    print()
+    print("compared with " + old_path + " (commit " + str(old.get("commit")) + ")")
+    print("set                        algorithm       p50 change   p99 change   expanded change   status")
+    regressions = 0
+    for result in results:
+        key = (result["set"], result["algorithm"])
+        if key not in old_results:
+            continue
+        before = old_results[key]
+        p50 = result["p50 ms"] / max(1e-9, before["p50 ms"]) - 1
+        p99 = result["p99 ms"] / max(1e-9, before["p99 ms"]) - 1
+        expanded = result["expanded total"] - before["expanded total"]
+        status = "ok"
+        if expanded != 0:
+            status = "REGRESSION, expansions changed"
+        elif p50 > threshold:
+            status = "REGRESSION, slower"
+        if status != "ok":
+            regressions += 1
+        print("%-26s %-15s %+-12.1f %+-12.1f %+-17d %s" % (key[0], key[1], 100 * p50, 100 * p99, expanded, status))
+    return regressions
+
+
+# every algorithm over the same reproducible scenario sets, results saved to JSON to compare commits
+def bench_suite(args):
+    sets = []
+    if not args.no_generated:
+        sets += generated_sets(args)
+    scen_paths = list(args.scen)
+    if args.scen_dir != None:
+        for name in sorted(os.listdir(args.scen_dir)):
+            if name.endswith(".scen"):
+                scen_paths.append(os.path.join(args.scen_dir, name))
+    sets += scen_sets(scen_paths)
+
+    # the generated sets can be kept as Moving AI files, eg. to run other solvers on the same queries
+    if args.write != None:
+        os.makedirs(args.write, exist_ok=True)
+        for name, graph, queries in sets:
+            movingai.save_map(graph, os.path.join(args.write, name + ".map"))
+            movingai.save_scen(os.path.join(args.write, name + ".scen"), name + ".map", graph, queries)
+
+    print("set                        algorithm       queries   expanded mean   p50 ms    p99 ms    peak memory (KB)   not optimal")
+    results = []
+    for name, graph, queries in sets:
+        for algorithm in args.algorithms:
+            result = run_set(graph, queries, algorithm, args.repeat, args.backend)
+            result["set"] = name
+            result["algorithm"] = algorithm
+            results.append(result)
+            print("%-26s %-15s %-9d %-15.1f %-9.3f %-9.3f %-18.1f %d" % (name, algorithm, result["queries"], result["expanded mean"],
+                  result["p50 ms"], result["p99 ms"], result["peak query memory"] / 1024, result["not optimal"]))
+
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                       "machine": platform.machine(), "results": results}, f, indent=1)
+        print("results written to " + args.output)
+
+    if args.compare != None and compare_results(results, args.compare, args.threshold) > 0:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the pathfinding demo")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("heap", help="sorted list open set vs binary heap open set")
+    p.add_argument("--sizes", type=int, nargs="+", default=[25, 50, 100, 200])
+    p.add_argument("--density", type=float, default=0.2)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_heap)
+
+    p = sub.add_parser("memory", help="per-cell Node objects vs flat arrays")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("reset", help="full array reset vs clearing only touched cells")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 2000])
+    p.add_argument("--distance", type=int, default=20)
+    p.add_argument("--queries", type=int, default=20)
+    p.set_defaults(func=bench_reset)
+
+    p = sub.add_parser("jps", help="A Star vs Jump Point Search on open, random and maze maps")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_jps)
+
+    p = sub.add_parser("bidir", help="one way vs bidirectional A Star and dijkstra on long queries")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_bidir)
+
+    p = sub.add_parser("alt", help="landmark (ALT) heuristic vs octile on random queries, with table build, save and load times")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--count", type=int, default=8, help="landmarks to pick")
+    p.add_argument("--active", type=int, default=4, help="landmarks each search uses")
+    p.add_argument("--method", default="auto", choices=flowfield.METHODS, help="how the landmark Dijkstras are run")
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_alt)
+
+    p = sub.add_parser("backend", help="plain Python A Star and dijkstra vs the compiled Numba kernel, expansions per second")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--queries", type=int, default=20)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_backend)
+
+    p = sub.add_parser("anyangle", help="Theta* and Lazy Theta* vs A Star with and without string pulling afterwards")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_anyangle)
+
+    p = sub.add_parser("heuristics", help="path cost and expansions for every heuristic and weight")
+    p.add_argument("--size", type=int, default=200)
+    p.add_argument("--maps", nargs="+", default=["random", "maze"])
+    p.add_argument("--heuristics", nargs="+", default=["octile", "euclidean", "chebyshev", "manhattan", "zero"])
+    p.add_argument("--weights", type=float, nargs="+", default=[1.0, 1.5, 3.0])
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_heuristics)
+
+    p = sub.add_parser("replan", help="D* Lite repairs after edits and start moves vs full A Star")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.add_argument("--density", type=float, default=0.2)
+    p.add_argument("--edits", type=int, default=40)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_replan)
+
+    p = sub.add_parser("batch", help="batch queries over a process pool with the map in shared memory")
+    p.add_argument("--size", type=int, default=256)
+    p.add_argument("--density", type=float, default=0.2)
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("terrain", help="load time of a terrain map from .png, .npy and a memory mapped .terrain file")
+    p.add_argument("--size", type=int, default=4096)
+    p.add_argument("--distance", type=int, default=50)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_terrain)
+
+    p = sub.add_parser("flow", help="one flow field per goal vs one A Star per agent")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--agents", type=int, default=100)
+    p.add_argument("--edits", type=int, default=50)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_flow)
+
+    p = sub.add_parser("hpa", help="flat A Star vs hierarchical A Star query latency on big maps")
+    p.add_argument("--sizes", type=int, nargs="+", default=[512, 1024])
+    p.add_argument("--maps", nargs="+", default=["open", "random", "maze"])
+    p.add_argument("--cluster-size", type=int, default=16)
+    p.add_argument("--queries", type=int, default=20)
+    p.add_argument("--edits", type=int, default=20)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_hpa)
+
+    p = sub.add_parser("render", help="frame time of the old full redraw vs drawing only changed cells")
+    p.add_argument("--sizes", type=int, nargs="+", default=[30, 100, 300, 600])
+    p.add_argument("--density", type=float, default=0.2)
+    p.add_argument("--frames", type=int, default=100)
+    p.add_argument("--edits", type=int, default=20)
+    p.add_argument("--legacy-max", type=int, default=100)
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_render)
+
+    p = sub.add_parser("slice", help="a whole search at once vs the same search in per-frame time slices")
+    p.add_argument("--sizes", type=int, nargs="+", default=[200, 400, 800])
+    p.add_argument("--maps", nargs="+", default=["random", "maze"])
+    p.add_argument("--budget", type=float, default=8.0, help="milliseconds per slice")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_slice)
+
+    p = sub.add_parser("cache", help="repeated route queries with and without a path cache, with obstacle edits in between")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 200])
+    p.add_argument("--density", type=float, default=0.2)
+    p.add_argument("--pairs", type=int, default=200)
+    p.add_argument("--queries", type=int, default=1000)
+    p.add_argument("--edit-rate", type=float, default=0.02, help="chance of an obstacle toggle before each query")
+    p.add_argument("--capacities", type=int, nargs="+", default=[16, 64, 256])
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("probe", help="per-query counters, timers and histograms from a SearchProbe")
+    p.add_argument("--algorithm", default="astar", choices=ALGORITHMS)
+    p.add_argument("--heuristic", default=None)
+    p.add_argument("--map", default="random", choices=["open", "random", "maze"])
+    p.add_argument("--size", type=int, default=200)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--export", help="save every query and the histograms to this JSON file")
+    p.set_defaults(func=bench_probe)
+
+    p = sub.add_parser("suite", help="all algorithms over generated and Moving AI scenario sets, results to JSON")
+    p.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=ALGORITHMS)
+    p.add_argument("--kinds", nargs="+", default=["random", "maze"], choices=["random", "maze"])
+    p.add_argument("--densities", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.4])
+    p.add_argument("--size", type=int, default=128)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--repeat", type=int, default=3, help="runs of every set, each query keeps its fastest time")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--no-generated", action="store_true", help="only run the .scen files")
+    p.add_argument("--scen", nargs="+", default=[], help="Moving AI .scen files, the .map files have to be next to them")
+    p.add_argument("--scen-dir", help="run every .scen file in this folder")
+    p.add_argument("--write", help="save the generated sets as .map and .scen files in this folder")
+    p.add_argument("--output", help="save the results to this JSON file")
+    p.add_argument("--compare", help="JSON file of an older run, exits with 1 if anything regressed")
+    p.add_argument("--threshold", type=float, default=0.2, help="how much slower the median can get before it counts, 0.2 is 20%%")
+    p.add_argument("--backend", default="auto", choices=BACKENDS, help="search backend for astar and dijkstra, see Pathfinder")
+    p.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#**********************************************************
+# Flow fields for many agents heading to the same goal
+# One reverse Dijkstra from the goal gives every cell its
+# cost to the goal and the direction of its next step
+#**********************************************************
+
+
+import math
+import heapq
+import time
+from array import array
+
+from pathfinder import OCTILE_OFFSETS
+
+# NumPy is optional, without it the fields are built with a plain Python Dijkstra
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# methods understood by FlowField, "auto" uses numpy when it is installed
+METHODS = ("auto", "numpy", "python")
+
+# numpy waves smaller than this are finished in plain Python, see build_numpy
+MIN_WAVE = 32
+
+
+# cost to goal and next step direction for every cell of a graph, for one goal
+# directions are indexes into OCTILE_OFFSETS, -1 for the goal, obstacles and cells that cannot reach it
+class FlowField:
+
+    def __init__(self, graph, goal, method="auto"):
+        if method not in METHODS:
+            raise ValueError("unknown method: " + str(method))
+        if method == "auto":
+            method = "python" if np is None else "numpy"
+        if method == "numpy" and np is None:
+            raise ValueError("the numpy method needs numpy installed")
+
+        self.graph = graph
+        self.goal = goal
+        self.method = method
+        self.stats = {"method": method, "time": 0.0}
+
+        t0 = time.perf_counter()
+        if method == "numpy":
+            self.build_numpy()
+        else:
+            self.build_python()
+        self.stats["time"] = time.perf_counter() - t0
+
+    # Dijkstra outwards from the goal, edges cost the same both ways so this is the cost to the goal
+    def build_python(self):
+        graph = self.graph
+        goal = self.goal
+
+        cost = array('d', [math.inf]) * graph.size
+        direction = array('b', [-1]) * graph.size
+        list_not_tested = []
+        if graph.obstacles[goal] == 0:
+            cost[goal] = 0
+            list_not_tested.append((0, goal))
+
+        self.relax_python(cost, direction, list_not_tested)
+        self.cost = cost
+        self.direction = direction
+
+    # pops cells in cost order and relaxes their neighbours until nothing improves
+    # also works when cells already have costs, then it carries on from the ones in the heap
+    # with max_open it stops early once the heap gets that big and leaves the rest in it
+    def relax_python(self, cost, direction, list_not_tested, max_open=None):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        costs = graph.costs
+        weighted = costs is not None
+
+        while len(list_not_tested) > 0:
+            if max_open != None and len(list_not_tested) >= max_open:
+                return
+            current_cost, current = heapq.heappop(list_not_tested)
+            if current_cost > cost[current]:
+                continue
+
+            current_x = current % map_width
+            current_y = current // map_width
+            for d in range(8):
+                dx, dy, step = OCTILE_OFFSETS[d]
+                nx = current_x + dx
+                ny = current_y + dy
+                if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                    continue
+                nb = ny * map_width + nx
+                if obstacles[nb]:
+                    continue
+                if weighted:
+                    step = step * (costs[current] + costs[nb]) * 0.5
+                if current_cost + step < cost[nb]:
+                    cost[nb] = current_cost + step
+                    # the neighbour steps back the opposite way, towards current
+                    direction[nb] = OPPOSITE[d]
+                    heapq.heappush(list_not_tested, (cost[nb], nb))
+
+    # vectorized wavefront, every wave relaxes all 8 neighbours of the cells improved by the last wave
+    # this is label correcting rather than Dijkstra, a cell can improve more than once, but it ends
+    # with the same costs, and every wave is a handful of numpy calls instead of a Python loop
+    # a wave costs about the same however few cells it has, so narrow fronts (around the goal,
+    # corridors, mazes) go through relax_python instead, both work on the same cost buffer
+    def build_numpy(self):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+        size = graph.size
+        goal = self.goal
+
+        cost_array = array('d', [math.inf]) * size
+        cost = np.frombuffer(cost_array, dtype=np.float64)
+        blocked = np.frombuffer(bytes(graph.obstacles), dtype=np.uint8).astype(bool)
+        # half the terrain cost of each cell, a step costs its length times the sum of both halves
+        half_terrain = None
+        if graph.costs is not None:
+            half_terrain = np.frombuffer(bytes(graph.costs), dtype=np.uint8) * 0.5
+        # directions are worked out from the costs at the end, this one is only written to
+        scratch_direction = array('b', [-1]) * size
+
+        frontier = np.zeros(0, dtype=np.int64)
+        if not blocked[goal]:
+            cost[goal] = 0
+            frontier = np.array([goal], dtype=np.int64)
+
+        waves = 0
+        while len(frontier) > 0:
+            if len(frontier) < MIN_WAVE:
+                # Dijkstra until the front is wide enough again, 4x so it does not flip every step
+                list_not_tested = [(cost_array[id], id) for id in frontier.tolist()]
+                heapq.heapify(list_not_tested)
+                self.relax_python(cost_array, scratch_direction, list_not_tested, MIN_WAVE * 4)
+                live = [id for c, id in list_not_tested if c == cost_array[id]]
+                frontier = unique_ids(np.array(live, dtype=np.int64))
+                continue
+
+            waves += 1
+            frontier_x = frontier % map_width
+            frontier_y = frontier // map_width
+            frontier_cost = cost[frontier]
+            if half_terrain is not None:
+                frontier_terrain = half_terrain[frontier]
+
+            candidates = []
+            candidate_costs = []
+            for dx, dy, step in OCTILE_OFFSETS:
+                nx = frontier_x + dx
+                ny = frontier_y + dy
+                inside = (nx >= 0) & (nx < map_width) & (ny >= 0) & (ny < map_height)
+                nb = (ny * map_width + nx)[inside]
+                if half_terrain is None:
+                    nb_cost = frontier_cost[inside] + step
+                else:
+                    nb_cost = frontier_cost[inside] + step * (frontier_terrain[inside] + half_terrain[nb])
+                better = (~blocked[nb]) & (nb_cost < cost[nb])
+                candidates.append(nb[better])
+                candidate_costs.append(nb_cost[better])
+
+            candidates = np.concatenate(candidates)
+            candidate_costs = np.concatenate(candidate_costs)
+            old_cost = cost[candidates]
+            np.minimum.at(cost, candidates, candidate_costs)
+            frontier = unique_ids(candidates[cost[candidates] < old_cost])
+
+        self.stats["waves"] = waves
+        self.cost = cost_array
+        self.direction = array('b', self.directions_numpy(cost, blocked, half_terrain).tobytes())
+
+    # for every cell, the neighbour with the lowest step + cost to goal
+    def directions_numpy(self, cost, blocked, half_terrain):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+
+        grid_cost = cost.reshape(map_height, map_width)
+        padded = np.full((map_height + 2, map_width + 2), np.inf)
+        padded[1:-1, 1:-1] = grid_cost
+        if half_terrain is not None:
+            grid_terrain = half_terrain.reshape(map_height, map_width)
+            padded_terrain = np.zeros((map_height + 2, map_width + 2))
+            padded_terrain[1:-1, 1:-1] = grid_terrain
+
+        best = np.full((map_height, map_width), np.inf)
+        direction = np.full((map_height, map_width), -1, dtype=np.int8)
+        for d in range(8):
+            dx, dy, step = OCTILE_OFFSETS[d]
+            if half_terrain is None:
+                through = padded[1 + dy:1 + dy + map_height, 1 + dx:1 + dx + map_width] + step
+            else:
+                through = padded[1 + dy:1 + dy + map_height, 1 + dx:1 + dx + map_width] + step * (grid_terrain + padded_terrain[1 + dy:1 + dy + map_height, 1 + dx:1 + dx + map_width])
+            better = through < best
+            best[better] = through[better]
+            direction[better] = d
+
+        # the goal, obstacles and unreachable cells have nowhere to go
+        direction[~np.isfinite(grid_cost)] = -1
+        direction = direction.reshape(-1)
+        direction[blocked] = -1
+        direction[self.goal] = -1
+        return direction
+
+    # cost to reach the goal from (x, y), math.inf if it cannot
+    def cost_at(self, x, y):
+        return self.cost[y * self.graph.map_width + x]
+
+    # (dx, dy) of the next step from (x, y), (0, 0) at the goal or if there is no way to it
+    def direction_at(self, x, y):
+        d = self.direction[y * self.graph.map_width + x]
+        if d == -1:
+            return (0, 0)
+        return OCTILE_OFFSETS[d][0], OCTILE_OFFSETS[d][1]
+
+    # the cell to move to from (x, y), or None at the goal or if there is no way to it
+    def next_cell(self, x, y):
+        d = self.direction[y * self.graph.map_width + x]
+        if d == -1:
+            return None
+        return x + OCTILE_OFFSETS[d][0], y + OCTILE_OFFSETS[d][1]
+
+    # follows the directions from (x, y) to the goal, [] if the goal cannot be reached
+    def path_from(self, x, y):
+        if self.cost_at(x, y) == math.inf:
+            return []
+        path = [(x, y)]
+        cell = self.next_cell(x, y)
+        while cell != None:
+            path.append(cell)
+            cell = self.next_cell(cell[0], cell[1])
+        return path
+
+    # call before (x, y) is changed in the graph, the field is patched in place if it can be
+    # returns False if the change moves the costs and the field has to be built again
+    def apply_change(self, x, y, obstacle):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+        id = graph.index(x, y)
+        cost = self.cost
+        direction = self.direction
+
+        if obstacle:
+            if cost[id] == math.inf:
+                return True
+            # only matters if some cell steps through (x, y) on its way to the goal
+            if id == self.goal:
+                return False
+            for d in range(8):
+                dx, dy, step = OCTILE_OFFSETS[d]
+                nx = x + dx
+                ny = y + dy
+                if nx >= 0 and nx < map_width and ny >= 0 and ny < map_height:
+                    if direction[ny * map_width + nx] == OPPOSITE[d]:
+                        return False
+            cost[id] = math.inf
+            direction[id] = -1
+            return True
+
+        # a freed cell takes its cost from the best neighbour
+        best = math.inf
+        best_d = -1
+        for d in range(8):
+            dx, dy, step = OCTILE_OFFSETS[d]
+            nx = x + dx
+            ny = y + dy
+            if nx >= 0 and nx < map_width and ny >= 0 and ny < map_height:
+                nb = ny * map_width + nx
+                if cost[nb] + graph.step_cost(id, nb, step) < best:
+                    best = cost[nb] + graph.step_cost(id, nb, step)
+                    best_d = d
+        if id == self.goal:
+            return False
+        # only matters if it makes a neighbour cheaper, every better path has to go through one
+        for d in range(8):
+            dx, dy, step = OCTILE_OFFSETS[d]
+            nx = x + dx
+            ny = y + dy
+            if nx >= 0 and nx < map_width and ny >= 0 and ny < map_height:
+                nb = ny * map_width + nx
+                if graph.obstacles[nb] == 0 and best + graph.step_cost(id, nb, step) < cost[nb]:
+                    return False
+        cost[id] = best
+        direction[id] = best_d
+        return True
+
+
+# sorted ids without repeats, np.unique does the same but is a lot slower on small int arrays
+def unique_ids(ids):
+    if len(ids) == 0:
+        return ids
+    ids = np.sort(ids)
+    keep = np.empty(len(ids), dtype=bool)
+    keep[0] = True
+    keep[1:] = ids[1:] != ids[:-1]
+    return ids[keep]
+
+
+# index of the offset pointing the other way, eg. N for S
+OPPOSITE = []
+for dx, dy, step in OCTILE_OFFSETS:
+    for d in range(8):
+        if OCTILE_OFFSETS[d][0] == -dx and OCTILE_OFFSETS[d][1] == -dy:
+            OPPOSITE.append(d)
+
+
+# flow fields kept per goal, oldest dropped once there are more than capacity
+# obstacle changes have to go through set_obstacle or toggle_obstacle so stale fields are patched or dropped
+class FlowFieldCache:
+
+    def __init__(self, graph, capacity=16, method="auto"):
+        self.graph = graph
+        self.capacity = capacity
+        self.method = method
+        self.fields = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, goal):
+        if goal in self.fields:
+            self.hits += 1
+            # move to the end, dicts keep insertion order
+            field = self.fields.pop(goal)
+            self.fields[goal] = field
+            return field
+
+        self.misses += 1
+        field = FlowField(self.graph, goal, self.method)
+        self.fields[goal] = field
+        while len(self.fields) > self.capacity:
+            del self.fields[next(iter(self.fields))]
+        return field
+
+    # patch or drop the fields for a change at (x, y) about to be made, returns how many were dropped
+    # use this when something else changes the graph, eg. a D* Lite planner on the same graph
+    def invalidate(self, x, y, obstacle):
+        if self.graph.is_obstacle(x, y) == obstacle:
+            return 0
+        stale = []
+        for goal in self.fields:
+            if not self.fields[goal].apply_change(x, y, obstacle):
+                stale.append(goal)
+        for goal in stale:
+            del self.fields[goal]
+        return len(stale)
+
+    def set_obstacle(self, x, y, obstacle=True):
+        dropped = self.invalidate(x, y, obstacle)
+        self.graph.set_obstacle(x, y, obstacle)
+        return dropped
+
+    def toggle_obstacle(self, x, y):
+        return self.set_obstacle(x, y, not self.graph.is_obstacle(x, y))
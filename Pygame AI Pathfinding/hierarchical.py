@@ -0,0 +1,423 @@
+#**********************************************************
+# Hierarchical pathfinding (HPA*) for big maps
+# The map is cut into clusters, searches run on a small graph
+# of cluster entrances and are turned into cells afterwards
+#**********************************************************
+
+
+import math
+import heapq
+import time
+from array import array
+
+from pathfinder import OCTILE_OFFSETS, SQRT2, octile_distance
+
+
+# border runs this long or longer get an entrance at both ends instead of one in the middle
+WIDE_ENTRANCE = 6
+
+
+# abstract graph over a GridGraph, cluster_size x cluster_size cells per cluster
+# nodes are cell ids next to a cluster border, edges are either a step across the border
+# or the cost of the shortest path between two nodes inside one cluster
+# obstacle changes have to go through set_obstacle or toggle_obstacle so the clusters are rebuilt
+# terrain costs are read while building, after changing them make a new HierarchicalPathfinder
+class HierarchicalPathfinder:
+
+    def __init__(self, graph, cluster_size=16):
+        if cluster_size < 2:
+            raise ValueError("cluster_size must be at least 2")
+        self.graph = graph
+        self.cluster_size = cluster_size
+        self.clusters_x = (graph.map_width + cluster_size - 1) // cluster_size
+        self.clusters_y = (graph.map_height + cluster_size - 1) // cluster_size
+
+        # steps across borders, keyed by the pair of clusters, and the edges they give each node
+        self.transitions = {}
+        self.inter_edges = {}
+        # nodes of each cluster and the shortest path cost between them inside the cluster
+        self.cluster_nodes = [[] for c in range(self.clusters_x * self.clusters_y)]
+        self.intra_edges = {}
+
+        self.stats = {"build time": 0.0, "nodes": 0, "edges": 0}
+        t0 = time.perf_counter()
+        for c in range(len(self.cluster_nodes)):
+            for other in self.forward_clusters(c):
+                self.set_transitions(c, other)
+        for c in range(len(self.cluster_nodes)):
+            self.build_intra_edges(c)
+        self.stats["build time"] = time.perf_counter() - t0
+        self.count_graph()
+
+    def cluster_of(self, id):
+        map_width = self.graph.map_width
+        return (id // map_width // self.cluster_size) * self.clusters_x + (id % map_width) // self.cluster_size
+
+    # x0, y0, x1, y1 of a cluster, x1 and y1 included
+    def bounds(self, c):
+        size = self.cluster_size
+        cx = c % self.clusters_x
+        cy = c // self.clusters_x
+        return (cx * size, cy * size, min(self.graph.map_width, (cx + 1) * size) - 1,
+                min(self.graph.map_height, (cy + 1) * size) - 1)
+
+    # the 8 clusters around c, the ones off the map left out
+    def around(self, c):
+        cx = c % self.clusters_x
+        cy = c // self.clusters_x
+        c_list = []
+        for dx, dy, step in OCTILE_OFFSETS:
+            if cx + dx >= 0 and cx + dx < self.clusters_x and cy + dy >= 0 and cy + dy < self.clusters_y:
+                c_list.append((cy + dy) * self.clusters_x + cx + dx)
+        return c_list
+
+    # neighbours that come after c, so every pair of touching clusters is visited once
+    def forward_clusters(self, c):
+        c_list = []
+        for other in self.around(c):
+            if other > c:
+                c_list.append(other)
+        return c_list
+
+    def walkable(self, x, y):
+        graph = self.graph
+        return x >= 0 and x < graph.map_width and y >= 0 and y < graph.map_height and graph.obstacles[y * graph.map_width + x] == 0
+
+    # (a, b, cost) for the steps between two touching clusters that the abstract graph keeps
+    # a straight border gives one or two entrances for every run of cells open on both sides,
+    # diagonal steps are only kept when no straight step could be used instead, eg. at corners
+    def find_transitions(self, c1, c2):
+        ax0, ay0, ax1, ay1 = self.bounds(c1)
+        bx0, by0, bx1, by1 = self.bounds(c2)
+        walkable = self.walkable
+        index = self.graph.index
+        t_list = []
+
+        # corner to corner, only a diagonal step can cross
+        if ay0 != by0 and ax0 != bx0:
+            ax = ax1 if bx0 > ax1 else ax0
+            ay = ay1 if by0 > ay1 else ay0
+            bx = ax + (1 if bx0 > ax1 else -1)
+            by = ay + (1 if by0 > ay1 else -1)
+            if walkable(ax, ay) and walkable(bx, by) and not walkable(bx, ay) and not walkable(ax, by):
+                t_list.append((index(ax, ay), index(bx, by), self.graph.step_cost(index(ax, ay), index(bx, by), SQRT2)))
+            return t_list
+
+        # walk along the border, cell_a and cell_b are the cells on either side at position i
+        if ay0 == by0:
+            # side by side, vertical border
+            ax = ax1 if bx0 > ax1 else ax0
+            bx = bx0 if bx0 > ax1 else bx1
+            start = ay0
+            end = ay1
+            cell_a = lambda i: (ax, i)
+            cell_b = lambda i: (bx, i)
+        else:
+            # one above the other, horizontal border
+            ay = ay1 if by0 > ay1 else ay0
+            by = by0 if by0 > ay1 else by1
+            start = ax0
+            end = ax1
+            cell_a = lambda i: (i, ay)
+            cell_b = lambda i: (i, by)
+
+        run_start = -1
+        for i in range(start, end + 2):
+            open_here = i <= end and walkable(*cell_a(i)) and walkable(*cell_b(i))
+            if open_here and run_start == -1:
+                run_start = i
+            elif not open_here and run_start != -1:
+                run_end = i - 1
+                if run_end - run_start + 1 >= WIDE_ENTRANCE:
+                    entrances = [run_start, run_end]
+                else:
+                    entrances = [(run_start + run_end) // 2]
+                for e in entrances:
+                    t_list.append((index(*cell_a(e)), index(*cell_b(e)), self.graph.step_cost(index(*cell_a(e)), index(*cell_b(e)), 1)))
+                run_start = -1
+
+        for i in range(start, end):
+            a0 = walkable(*cell_a(i))
+            a1 = walkable(*cell_a(i + 1))
+            b0 = walkable(*cell_b(i))
+            b1 = walkable(*cell_b(i + 1))
+            if a0 and b1 and not b0 and not a1:
+                t_list.append((index(*cell_a(i)), index(*cell_b(i + 1)), self.graph.step_cost(index(*cell_a(i)), index(*cell_b(i + 1)), SQRT2)))
+            if a1 and b0 and not a0 and not b1:
+                t_list.append((index(*cell_a(i + 1)), index(*cell_b(i)), self.graph.step_cost(index(*cell_a(i + 1)), index(*cell_b(i)), SQRT2)))
+        return t_list
+
+    # replace the transitions between two clusters, and the nodes and edges that come with them
+    def set_transitions(self, c1, c2):
+        key = (min(c1, c2), max(c1, c2))
+        for a, b, cost in self.transitions.pop(key, []):
+            self.inter_edges[a].remove((b, cost))
+            self.inter_edges[b].remove((a, cost))
+            for id in (a, b):
+                if len(self.inter_edges[id]) == 0:
+                    del self.inter_edges[id]
+                    self.cluster_nodes[self.cluster_of(id)].remove(id)
+
+        t_list = self.find_transitions(c1, c2)
+        if len(t_list) > 0:
+            self.transitions[key] = t_list
+        for a, b, cost in t_list:
+            for id, other in ((a, b), (b, a)):
+                if id not in self.inter_edges:
+                    self.inter_edges[id] = []
+                    self.cluster_nodes[self.cluster_of(id)].append(id)
+                self.inter_edges[id].append((other, cost))
+
+    # Dijkstra from source that never leaves cluster c, stops once every target is settled
+    # returns the cost and parent arrays, both indexed by position inside the cluster
+    def search_cluster(self, c, source, targets):
+        x0, y0, x1, y1 = self.bounds(c)
+        width = x1 - x0 + 1
+        height = y1 - y0 + 1
+        map_width = self.graph.map_width
+        obstacles = self.graph.obstacles
+        costs = self.graph.costs
+        weighted = costs is not None
+
+        cost = array('d', [math.inf]) * (width * height)
+        parent = array('i', [-1]) * (width * height)
+        done = bytearray(width * height)
+        remaining = set()
+        for id in targets:
+            remaining.add((id // map_width - y0) * width + id % map_width - x0)
+
+        local = (source // map_width - y0) * width + source % map_width - x0
+        cost[local] = 0
+        list_not_tested = [(0, local)]
+        while len(list_not_tested) > 0 and len(remaining) > 0:
+            current_cost, current = heapq.heappop(list_not_tested)
+            if done[current]:
+                continue
+            done[current] = 1
+            remaining.discard(current)
+
+            current_x = current % width
+            current_y = current // width
+            for dx, dy, step in OCTILE_OFFSETS:
+                nx = current_x + dx
+                ny = current_y + dy
+                if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                    continue
+                nb = ny * width + nx
+                if done[nb] or obstacles[(ny + y0) * map_width + nx + x0]:
+                    continue
+                if weighted:
+                    step = step * (costs[(current_y + y0) * map_width + current_x + x0] + costs[(ny + y0) * map_width + nx + x0]) * 0.5
+                if current_cost + step < cost[nb]:
+                    cost[nb] = current_cost + step
+                    parent[nb] = current
+                    heapq.heappush(list_not_tested, (cost[nb], nb))
+        return cost, parent
+
+    # cost of the shortest path inside cluster c from source to every target, unreachable ones left out
+    def costs_in_cluster(self, c, source, targets):
+        x0, y0, x1, y1 = self.bounds(c)
+        width = x1 - x0 + 1
+        map_width = self.graph.map_width
+        cost, parent = self.search_cluster(c, source, targets)
+        e_list = []
+        for id in targets:
+            id_cost = cost[(id // map_width - y0) * width + id % map_width - x0]
+            if id_cost != math.inf:
+                e_list.append((id, id_cost))
+        return e_list
+
+    # shortest path inside cluster c from one cell to another, as a list of cell ids
+    def path_in_cluster(self, c, source, target):
+        x0, y0, x1, y1 = self.bounds(c)
+        width = x1 - x0 + 1
+        map_width = self.graph.map_width
+        cost, parent = self.search_cluster(c, source, [target])
+
+        local = (target // map_width - y0) * width + target % map_width - x0
+        path = []
+        while local != -1:
+            path.append((local // width + y0) * map_width + local % width + x0)
+            local = parent[local]
+        path.reverse()
+        return path
+
+    # the paths between nodes of one cluster, costs are the same both ways so each pair is searched once
+    def build_intra_edges(self, c):
+        nodes = self.cluster_nodes[c]
+        for id in nodes:
+            self.intra_edges[id] = []
+        for i in range(len(nodes) - 1):
+            for id, cost in self.costs_in_cluster(c, nodes[i], nodes[i + 1:]):
+                self.intra_edges[nodes[i]].append((id, cost))
+                self.intra_edges[id].append((nodes[i], cost))
+
+    def count_graph(self):
+        self.stats["nodes"] = len(self.inter_edges)
+        edges = 0
+        for id in self.inter_edges:
+            edges += len(self.inter_edges[id]) + len(self.intra_edges[id])
+        self.stats["edges"] = edges // 2
+
+    # changing a cell can only change the borders of the clusters it or its neighbours are in
+    # those borders are found again, and clusters whose nodes changed get their paths searched again
+    # returns how many clusters were rebuilt
+    def set_obstacle(self, x, y, obstacle=True):
+        graph = self.graph
+        if graph.is_obstacle(x, y) == obstacle:
+            return 0
+        graph.set_obstacle(x, y, obstacle)
+        t0 = time.perf_counter()
+
+        changed = set()
+        for dx, dy, step in OCTILE_OFFSETS + ((0, 0, 0),):
+            if graph.in_bounds(x + dx, y + dy):
+                changed.add(self.cluster_of(graph.index(x + dx, y + dy)))
+
+        rebuild = set(changed)
+        for c in changed:
+            for other in self.around(c):
+                before = set(self.cluster_nodes[other])
+                self.set_transitions(c, other)
+                if set(self.cluster_nodes[other]) != before:
+                    rebuild.add(other)
+
+        # nodes that are gone lose their edges, the rest are searched again
+        for id in list(self.intra_edges):
+            if id not in self.inter_edges:
+                del self.intra_edges[id]
+        for c in rebuild:
+            self.build_intra_edges(c)
+
+        self.stats["rebuild time"] = time.perf_counter() - t0
+        self.count_graph()
+        return len(rebuild)
+
+    def toggle_obstacle(self, x, y):
+        return self.set_obstacle(x, y, not self.graph.is_obstacle(x, y))
+
+    # A Star on the abstract graph, start and goal are cell ids and are linked in just for this search
+    # returns (node ids from start to goal, cost, stats), ([], math.inf, stats) if there is no path
+    def abstract_path(self, start, goal):
+        graph = self.graph
+        map_width = graph.map_width
+        stats = {"expanded": 0, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+        if graph.obstacles[start] or graph.obstacles[goal]:
+            stats["time"] = time.perf_counter() - t0
+            return [], math.inf, stats
+
+        # start links to the nodes of its cluster, the nodes of the goal cluster link to the goal
+        start_cluster = self.cluster_of(start)
+        goal_cluster = self.cluster_of(goal)
+        start_edges = []
+        if start_cluster == goal_cluster:
+            start_edges = self.costs_in_cluster(start_cluster, start, [goal])
+        start_edges += self.costs_in_cluster(start_cluster, start, self.cluster_nodes[start_cluster])
+        if start in self.inter_edges:
+            start_edges += self.inter_edges[start]
+        goal_edges = {}
+        for id, cost in self.costs_in_cluster(goal_cluster, goal, self.cluster_nodes[goal_cluster]):
+            goal_edges[id] = cost
+
+        goal_x = goal % map_width
+        goal_y = goal // map_width
+        local_goal = {start: 0}
+        parent = {start: -1}
+        closed = set()
+        push_count = 0
+        list_not_tested = [(octile_distance(abs(start % map_width - goal_x), abs(start // map_width - goal_y)), push_count, start)]
+
+        while len(list_not_tested) > 0:
+            f, count, current = heapq.heappop(list_not_tested)
+            if current in closed:
+                continue
+            closed.add(current)
+            stats["expanded"] += 1
+            if current == goal:
+                break
+
+            if current == start:
+                edges = start_edges
+            else:
+                edges = self.inter_edges[current] + self.intra_edges[current]
+                if current in goal_edges:
+                    edges = edges + [(goal, goal_edges[current])]
+
+            for nb, step in edges:
+                if nb in closed:
+                    continue
+                possibly_lower_goal = local_goal[current] + step
+                if possibly_lower_goal < local_goal.get(nb, math.inf):
+                    local_goal[nb] = possibly_lower_goal
+                    parent[nb] = current
+                    push_count += 1
+                    h = octile_distance(abs(nb % map_width - goal_x), abs(nb // map_width - goal_y))
+                    heapq.heappush(list_not_tested, (possibly_lower_goal + h, push_count, nb))
+
+        stats["time"] = time.perf_counter() - t0
+        if goal not in closed:
+            return [], math.inf, stats
+
+        path = []
+        id = goal
+        while id != -1:
+            path.append(id)
+            id = parent[id]
+        path.reverse()
+        stats["cost"] = local_goal[goal]
+        return path, local_goal[goal], stats
+
+    # turns an abstract path into cells one leg at a time, so an agent can start on the first leg
+    # before the rest is worked out, yields lists of cell ids that follow on from each other
+    def refine(self, abstract_path):
+        for i in range(len(abstract_path) - 1):
+            a = abstract_path[i]
+            b = abstract_path[i + 1]
+            if a == b:
+                continue
+            if self.cluster_of(a) != self.cluster_of(b):
+                # a step across a border
+                yield [b]
+            else:
+                yield self.path_in_cluster(self.cluster_of(a), a, b)[1:]
+
+    # returns (path, cost, stats) like Pathfinder.find_path, path is every (x, y) from start to goal
+    # the path is usually within a few percent of the shortest, but not always the shortest
+    # short paths that have to cross a border away from an entrance can come out a lot longer
+    def find_path(self, start, goal):
+        graph = self.graph
+        start_id = graph.index(start[0], start[1])
+        goal_id = graph.index(goal[0], goal[1])
+
+        abstract, cost, stats = self.abstract_path(start_id, goal_id)
+        if len(abstract) == 0:
+            return [], math.inf, stats
+
+        t0 = time.perf_counter()
+        path = [start_id]
+        for leg in self.refine(abstract):
+            path.extend(leg)
+        stats["refine time"] = time.perf_counter() - t0
+        stats["abstract nodes"] = len(abstract)
+        return [graph.coords(id) for id in path], cost, stats
+
+    # write a path from find_path into the graph search arrays, so it can be drawn like any other search
+    # visited shows every node of the abstract graph, ie. the cluster entrances
+    def copy_to_graph(self, path):
+        graph = self.graph
+        graph.reset_nodes()
+        for id in self.inter_edges:
+            graph.visited[id] = 1
+            graph.touched.append(id)
+
+        cost = 0
+        for i in range(len(path)):
+            id = graph.index(path[i][0], path[i][1])
+            graph.touched.append(id)
+            if i > 0:
+                previous = graph.index(path[i - 1][0], path[i - 1][1])
+                step = octile_distance(abs(path[i][0] - path[i - 1][0]), abs(path[i][1] - path[i - 1][1]))
+                cost += graph.step_cost(previous, id, step)
+                graph.parent[id] = previous
+            graph.local_goal[id] = cost
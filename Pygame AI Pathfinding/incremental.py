@@ -0,0 +1,218 @@
+#**********************************************************
+# D* Lite incremental planner for the pathfinding engine
+# Keeps its search between queries, so after an obstacle is
+# toggled or the start moves only the affected part is redone
+#**********************************************************
+
+
+import math
+import heapq
+import time
+from array import array
+
+from pathfinder import OCTILE_OFFSETS, octile_distance
+
+
+# how far past the start key the search keeps going, see compute
+KEY_EPSILON = 1e-6
+
+
+# D* Lite searches backwards from the goal, g is the cost from a cell to the goal
+# rhs is the one step lookahead of g, a cell is consistent when g == rhs
+# only inconsistent cells are in the open set, and only those get expanded again
+class DStarLite:
+
+    def __init__(self, graph, start, goal):
+        self.graph = graph
+        self.start = start
+        self.set_goal(goal)
+
+    # the search tree hangs off the goal, so a new goal means starting again
+    def set_goal(self, goal):
+        graph = self.graph
+        self.goal = goal
+        self.last_start = self.start
+        self.km = 0
+        self.g = array('d', [math.inf]) * graph.size
+        self.rhs = array('d', [math.inf]) * graph.size
+
+        # open set is a heap of (k1, k2, push order, id), open_keys holds the live key of each id
+        # entries whose key does not match open_keys are stale and skipped
+        self.open_list = []
+        self.open_keys = {}
+        self.push_count = 0
+
+        self.expanded_list = []
+        self.rhs[goal] = 0
+        self.push(goal, self.calculate_key(goal))
+
+    def heuristic(self, a, b):
+        map_width = self.graph.map_width
+        return octile_distance(abs(a % map_width - b % map_width), abs(a // map_width - b // map_width))
+
+    def calculate_key(self, id):
+        best = min(self.g[id], self.rhs[id])
+        return (best + self.heuristic(self.start, id) + self.km, best)
+
+    def push(self, id, key):
+        self.open_keys[id] = key
+        self.push_count += 1
+        heapq.heappush(self.open_list, (key[0], key[1], self.push_count, id))
+
+    # smallest live key in the open set, stale entries are dropped on the way
+    def top_key(self):
+        open_list = self.open_list
+        while len(open_list) > 0:
+            k1, k2, count, id = open_list[0]
+            if self.open_keys.get(id) == (k1, k2):
+                return (k1, k2)
+            heapq.heappop(open_list)
+        return (math.inf, math.inf)
+
+    # (neighbour id, step cost) for every neighbour that can be walked to
+    def neighbours(self, id):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        x = id % map_width
+        y = id // map_width
+        nb_list = []
+        for dx, dy, step in OCTILE_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if nx >= 0 and nx < map_width and ny >= 0 and ny < map_height:
+                nb = ny * map_width + nx
+                if obstacles[nb] == 0:
+                    nb_list.append((nb, graph.step_cost(id, nb, step)))
+        return nb_list
+
+    # recompute rhs from the neighbours and put the cell in the open set if it is inconsistent
+    def update_vertex(self, id):
+        if id != self.goal:
+            g = self.g
+            best = math.inf
+            if self.graph.obstacles[id] == 0:
+                for nb, step in self.neighbours(id):
+                    if step + g[nb] < best:
+                        best = step + g[nb]
+            self.rhs[id] = best
+        self.update_open(id)
+
+    def update_open(self, id):
+        if id in self.open_keys:
+            del self.open_keys[id]
+        if self.g[id] != self.rhs[id]:
+            self.push(id, self.calculate_key(id))
+
+    # repairs the search until the start is consistent, returns stats for this call
+    def compute(self):
+        stats = {"expanded": 0, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        g = self.g
+        rhs = self.rhs
+        goal = self.goal
+        open_keys = self.open_keys
+        self.expanded_list = []
+
+        # keys are sums of sqrt(2) steps added up in different orders, so two keys for the same
+        # path can differ in the last bits, going on a little past a tie is safe, stopping short is not
+        while True:
+            top_key = self.top_key()
+            start_key = self.calculate_key(self.start)
+            if not (top_key[0] < start_key[0] + KEY_EPSILON or rhs[self.start] != g[self.start]):
+                break
+            if top_key[0] == math.inf:
+                break
+
+            k1, k2, count, id = heapq.heappop(self.open_list)
+            k_old = (k1, k2)
+            del open_keys[id]
+
+            k_new = self.calculate_key(id)
+            if k_old < k_new:
+                self.push(id, k_new)
+                continue
+
+            self.expanded_list.append(id)
+            if g[id] > rhs[id]:
+                # cost to goal went down, neighbours can only get cheaper through this cell
+                g[id] = rhs[id]
+                for nb, step in self.neighbours(id):
+                    if nb != goal and step + g[id] < rhs[nb]:
+                        rhs[nb] = step + g[id]
+                        self.update_open(nb)
+            else:
+                # cost to goal went up, neighbours that went through this cell need their rhs again
+                g_old = g[id]
+                g[id] = math.inf
+                self.update_vertex(id)
+                for nb, step in self.neighbours(id):
+                    if rhs[nb] == step + g_old:
+                        self.update_vertex(nb)
+
+        stats["expanded"] = len(self.expanded_list)
+        stats["cost"] = g[self.start]
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # new start, the old search is kept and km makes up for the heuristic changing
+    def move_start(self, start):
+        self.km += self.heuristic(self.last_start, start)
+        self.start = start
+        self.last_start = start
+
+    # changing a cell changes every edge around it, so it and its neighbours need updating
+    def set_obstacle(self, x, y, obstacle=True):
+        graph = self.graph
+        id = graph.index(x, y)
+        if graph.obstacles[id] == (1 if obstacle else 0):
+            return
+        graph.set_obstacle(x, y, obstacle)
+
+        self.update_vertex(id)
+        for nb in graph.neighbours(id):
+            self.update_vertex(nb)
+
+    def toggle_obstacle(self, x, y):
+        self.set_obstacle(x, y, not self.graph.is_obstacle(x, y))
+
+    # follow the cheapest neighbour from start to goal, returns [] if there is no path
+    def path(self):
+        g = self.g
+        id = self.start
+        if g[id] == math.inf:
+            return []
+
+        path = [id]
+        while id != self.goal and len(path) <= self.graph.size:
+            best = math.inf
+            best_nb = -1
+            for nb, step in self.neighbours(id):
+                if step + g[nb] < best:
+                    best = step + g[nb]
+                    best_nb = nb
+            if best_nb == -1:
+                return []
+            id = best_nb
+            path.append(id)
+        return path
+
+    # write the result into the graph search arrays, so it can be drawn like any other search
+    # visited shows the cells expanded by the last compute
+    def copy_to_graph(self):
+        graph = self.graph
+        graph.reset_nodes()
+        for id in self.expanded_list:
+            if graph.visited[id] == 0:
+                graph.visited[id] = 1
+                graph.touched.append(id)
+
+        path = self.path()
+        for i in range(len(path)):
+            id = path[i]
+            graph.touched.append(id)
+            graph.local_goal[id] = self.g[path[0]] - self.g[id]
+            if i > 0:
+                graph.parent[id] = path[i - 1]
@@ -0,0 +1,165 @@
+#**********************************************************
+# Search instrumentation for the pathfinding engine
+# Counters, timers and callbacks for every query a
+# Pathfinder runs, plus histograms over all of them
+#**********************************************************
+
+
+import math
+import json
+import time
+from collections import deque
+
+
+# per-query numbers shown by report and histogram, all are in the dicts kept in SearchProbe.queries
+FIELDS = ("expanded", "pops", "stale pops", "pushes", "max open", "reopened", "heuristic calls",
+          "heuristic ms", "heap ms", "expand ms", "total ms")
+
+
+# pass one to Pathfinder(..., probe=probe), every search it runs is counted and timed
+# a Pathfinder without a probe runs none of this code, so leaving it out costs nothing
+# the timers call perf_counter around every heuristic and heap call, so a probed search runs slower,
+# the split between the timers is still a fair picture of where the time goes
+# on_expand(id), on_push(id, key, open size) and on_pop(id, open size) are called if given
+class SearchProbe:
+
+    def __init__(self, on_expand=None, on_push=None, on_pop=None, keep=10000):
+        self.on_expand = on_expand
+        self.on_push = on_push
+        self.on_pop = on_pop
+        # the last keep queries, oldest dropped first
+        self.queries = deque(maxlen=keep)
+        self.current = None
+
+    # timed and counted versions of the heuristic and the heap functions, used by Pathfinder.search_functions
+    def wrap(self, heuristic, heappush, heappop):
+        perf_counter = time.perf_counter
+        on_push = self.on_push
+        on_pop = self.on_pop
+        query = self.current
+
+        def timed_heuristic(dx, dy):
+            t0 = perf_counter()
+            h = heuristic(dx, dy)
+            query["heuristic ms"] += perf_counter() - t0
+            query["heuristic calls"] += 1
+            return h
+
+        # entries are (key, push order, id)
+        def counted_push(heap, entry):
+            t0 = perf_counter()
+            heappush(heap, entry)
+            query["heap ms"] += perf_counter() - t0
+            query["pushes"] += 1
+            if len(heap) > query["max open"]:
+                query["max open"] = len(heap)
+            if on_push != None:
+                on_push(entry[2], entry[0], len(heap))
+
+        def counted_pop(heap):
+            t0 = perf_counter()
+            entry = heappop(heap)
+            query["heap ms"] += perf_counter() - t0
+            query["pops"] += 1
+            if on_pop != None:
+                on_pop(entry[2], len(heap))
+            return entry
+
+        return timed_heuristic, counted_push, counted_pop
+
+    # runs in place of a search generator, passes everything through and records the query once it is done
+    # a search that is cancelled part way is not recorded
+    def watch(self, steps, pathfinder, start, goal):
+        query = {"algorithm": pathfinder.algorithm, "heuristic": pathfinder.heuristic, "weight": pathfinder.weight,
+                 "map": str(pathfinder.graph.map_width) + "x" + str(pathfinder.graph.map_height),
+                 "start": start, "goal": goal, "cost": math.inf}
+        for field in FIELDS:
+            query[field] = 0
+        self.current = query
+        on_expand = self.on_expand
+        perf_counter = time.perf_counter
+
+        # time between yields is time spent searching, the time the caller holds on to a yield is left out
+        search_time = 0.0
+        try:
+            while True:
+                t0 = perf_counter()
+                try:
+                    id = next(steps)
+                except StopIteration as stop:
+                    search_time += perf_counter() - t0
+                    stats = stop.value
+                    break
+                search_time += perf_counter() - t0
+                if id != -1:
+                    query["expanded"] += 1
+                    if on_expand != None:
+                        on_expand(id)
+                yield id
+        finally:
+            steps.close()
+            self.current = None
+
+        query["cost"] = stats["cost"]
+        query["reopened"] = stats.get("reopened", 0)
+        query["stale pops"] = query["pops"] - query["expanded"]
+        # the timers add up in seconds, everything else of the search is expanding nodes and generating neighbours
+        query["heuristic ms"] *= 1000
+        query["heap ms"] *= 1000
+        query["total ms"] = 1000 * search_time
+        query["expand ms"] = max(0.0, query["total ms"] - query["heuristic ms"] - query["heap ms"])
+        self.queries.append(query)
+        stats["probe"] = query
+        return stats
+
+    def clear(self):
+        self.queries.clear()
+
+    # count, mean, p50, p99 and max of a field over the kept queries
+    def summary(self, field):
+        values = sorted(query[field] for query in self.queries)
+        if len(values) == 0:
+            return {"count": 0, "mean": 0, "p50": 0, "p99": 0, "max": 0}
+        return {"count": len(values), "mean": sum(values) / len(values),
+                "p50": values[min(len(values) - 1, int(round(0.5 * (len(values) - 1))))],
+                "p99": values[min(len(values) - 1, int(round(0.99 * (len(values) - 1))))],
+                "max": values[-1]}
+
+    # (low, high, count) for every power of 2 bucket a field falls into, values below 1 go in (0, 1)
+    def histogram(self, field):
+        counts = {}
+        for query in self.queries:
+            value = query[field]
+            bucket = -1 if value < 1 else int(math.log2(value))
+            counts[bucket] = counts.get(bucket, 0) + 1
+        buckets = []
+        for bucket in sorted(counts):
+            if bucket == -1:
+                buckets.append((0, 1, counts[bucket]))
+            else:
+                buckets.append((2 ** bucket, 2 ** (bucket + 1), counts[bucket]))
+        return buckets
+
+    # lines of text, a summary of every field and the histograms of the fields asked for
+    def report(self, histograms=("expanded", "total ms")):
+        lines = ["%-16s %-12s %-12s %-12s %-12s" % ("field", "mean", "p50", "p99", "max")]
+        for field in FIELDS:
+            s = self.summary(field)
+            lines.append("%-16s %-12.4g %-12.4g %-12.4g %-12.4g" % (field, s["mean"], s["p50"], s["p99"], s["max"]))
+        for field in histograms:
+            lines.append("")
+            lines.append(field + " histogram, " + str(len(self.queries)) + " queries")
+            buckets = self.histogram(field)
+            most = max([count for low, high, count in buckets] + [1])
+            for low, high, count in buckets:
+                lines.append("%10g - %-10g %-7d %s" % (low, high, count, "#" * max(1, 40 * count // most)))
+        return lines
+
+    # every kept query and the summaries as JSON, eg. to compare settings or map sizes later
+    def export(self, path):
+        data = {"queries": list(self.queries), "summary": {}, "histograms": {}}
+        for field in FIELDS:
+            data["summary"][field] = self.summary(field)
+            data["histograms"][field] = self.histogram(field)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1)
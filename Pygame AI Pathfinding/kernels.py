@@ -0,0 +1,286 @@
+#**********************************************************
+# Compiled search kernel for the pathfinding engine
+# The A Star expand and relax loop over the flat graph arrays,
+# compiled with Numba when it is installed
+#**********************************************************
+
+
+import math
+from array import array
+
+# NumPy and Numba are optional, without them Pathfinder runs the plain Python search
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# True when the kernel can be used, Pathfinder(backend="auto") picks it then
+AVAILABLE = np is not None and numba is not None
+
+# the heuristic functions of pathfinder.py by number, the kernel works them out inline
+HEURISTIC_CODES = {"octile": 0, "euclidean": 1, "manhattan": 2, "chebyshev": 3, "zero": 4, "squared": 5}
+
+# open set entries the heap starts with, it doubles when it gets full
+HEAP_START = 1024
+
+SQRT2 = math.sqrt(2)
+
+# set once warm_up has run in this process
+warm = False
+
+
+# one A Star search on a GridGraph, run a chunk of expansions at a time so it can still be sliced over frames
+# it writes to the same visited, local_goal, parent and touched as the Python search, through numpy views,
+# and expands the same cells in the same order, so everything it leaves in the graph is identical
+# the open set is a binary heap over three arrays, ordered by key and then push order like the heapq tuples
+class KernelSearch:
+
+    def __init__(self, graph, start, goal, neighbour_offsets, heuristic, weight):
+        self.graph = graph
+        self.goal = goal
+        self.obstacles = np.frombuffer(graph.obstacles, dtype=np.uint8)
+        self.weighted = graph.costs is not None
+        if self.weighted:
+            self.costs = np.frombuffer(graph.costs, dtype=np.uint8)
+        else:
+            self.costs = np.zeros(1, dtype=np.uint8)
+        self.visited = np.frombuffer(graph.visited, dtype=np.uint8)
+        self.local_goal = np.frombuffer(graph.local_goal, dtype=np.float64)
+        self.parent = np.frombuffer(graph.parent, dtype=np.int32)
+        self.offset_x = np.array([dx for dx, dy, step in neighbour_offsets], dtype=np.int64)
+        self.offset_y = np.array([dy for dx, dy, step in neighbour_offsets], dtype=np.int64)
+        self.offset_step = np.array([step for dx, dy, step in neighbour_offsets], dtype=np.float64)
+        self.heuristic = HEURISTIC_CODES[heuristic]
+        self.weight = float(weight)
+
+        # cells touched so far, copied to graph.touched after every chunk
+        self.touched = np.empty(graph.size, dtype=np.int32)
+        self.keys = np.empty(HEAP_START, dtype=np.float64)
+        self.orders = np.empty(HEAP_START, dtype=np.int64)
+        self.ids = np.empty(HEAP_START, dtype=np.int32)
+        self.expanded_ids = np.empty(0, dtype=np.int32)
+
+        # heap size, push count, current, expanded, reopened, touched count, copied to graph.touched
+        self.state = np.zeros(7, dtype=np.int64)
+        map_width = graph.map_width
+        self.local_goal[start] = 0
+        self.touched[0] = start
+        self.state[5] = 1
+        self.keys[0] = self.weight * heuristic_value(self.heuristic, abs(start % map_width - goal % map_width), abs(start // map_width - goal // map_width))
+        self.orders[0] = 0
+        self.ids[0] = start
+        self.state[0] = 1
+        self.state[2] = start
+        self.done = start == goal
+
+    # expand up to count cells, returns the ids expanded, done is set once the search is over
+    def run(self, count):
+        if len(self.expanded_ids) < count:
+            self.expanded_ids = np.empty(count, dtype=np.int32)
+        graph = self.graph
+        state = self.state
+        expanded = 0
+        while expanded < count and not self.done:
+            # room for the 8 neighbours of the next cell, the kernel stops before it would run out
+            if len(self.keys) - state[0] < 8:
+                self.grow()
+            expanded += astar_run(state, self.keys, self.orders, self.ids, self.obstacles, self.costs, self.weighted,
+                                  self.visited, self.local_goal, self.parent, self.touched,
+                                  self.offset_x, self.offset_y, self.offset_step, graph.map_width, graph.map_height,
+                                  self.goal, self.heuristic, self.weight, count - expanded, self.expanded_ids[expanded:])
+            self.done = state[0] == 0 or state[2] == self.goal
+        graph.touched.frombytes(self.touched[state[6]:state[5]].tobytes())
+        state[6] = state[5]
+        return self.expanded_ids[:expanded].tolist()
+
+    def grow(self):
+        self.keys = np.concatenate((self.keys, np.empty(len(self.keys), dtype=np.float64)))
+        self.orders = np.concatenate((self.orders, np.empty(len(self.orders), dtype=np.int64)))
+        self.ids = np.concatenate((self.ids, np.empty(len(self.ids), dtype=np.int32)))
+
+    def pushed(self):
+        return int(self.state[1])
+
+    def reopened(self):
+        return int(self.state[4])
+
+
+# the first call of a compiled function loads it from the cache, or compiles it the very first time
+# Pathfinder calls this when it is made, so that wait is not part of the first search
+def warm_up():
+    global warm
+    if warm:
+        return
+    warm = True
+    from pathfinder import GridGraph, OCTILE_OFFSETS
+    search = KernelSearch(GridGraph(3, 3), 0, 8, OCTILE_OFFSETS, "octile", 1.0)
+    search.run(16)
+
+
+# GridGraph.reset_nodes with numpy, every touched cell is cleared in one go instead of one at a time
+def reset_nodes(graph):
+    count = len(graph.touched)
+    if count > 0:
+        touched = np.frombuffer(graph.touched, dtype=np.int32)
+        np.frombuffer(graph.visited, dtype=np.uint8)[touched] = 0
+        np.frombuffer(graph.local_goal, dtype=np.float64)[touched] = math.inf
+        np.frombuffer(graph.parent, dtype=np.int32)[touched] = -1
+        if graph.reverse_goal != None:
+            np.frombuffer(graph.reverse_goal, dtype=np.float64)[touched] = math.inf
+            np.frombuffer(graph.reverse_parent, dtype=np.int32)[touched] = -1
+    graph.touched = array('i')
+    return count
+
+
+# without Numba nothing below is compiled or used
+# compiled code is cached next to this file, so only the first run after a change waits for the compiler
+def jit(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True)(function)
+
+
+# for the small helpers, they are compiled into the kernel instead of being called, which is about 30% faster
+def jit_inline(function):
+    if numba is None:
+        return function
+    return numba.njit(cache=True, inline="always")(function)
+
+
+# same sums as the functions in pathfinder.py, so the keys come out exactly the same
+@jit_inline
+def heuristic_value(code, dx, dy):
+    if code == 0:
+        if dx < dy:
+            return dx * SQRT2 + (dy - dx)
+        return dy * SQRT2 + (dx - dy)
+    if code == 1:
+        return math.sqrt(dx * dx + dy * dy)
+    if code == 2:
+        return float(dx + dy)
+    if code == 3:
+        return float(max(dx, dy))
+    if code == 4:
+        return 0.0
+    return float(dx * dx + dy * dy)
+
+
+@jit_inline
+def heap_less(keys, orders, i, j):
+    return keys[i] < keys[j] or (keys[i] == keys[j] and orders[i] < orders[j])
+
+
+@jit_inline
+def heap_swap(keys, orders, ids, i, j):
+    keys[i], keys[j] = keys[j], keys[i]
+    orders[i], orders[j] = orders[j], orders[i]
+    ids[i], ids[j] = ids[j], ids[i]
+
+
+@jit_inline
+def heap_push(keys, orders, ids, size, key, order, id):
+    keys[size] = key
+    orders[size] = order
+    ids[size] = id
+    i = size
+    while i > 0:
+        up = (i - 1) // 2
+        if not heap_less(keys, orders, i, up):
+            break
+        heap_swap(keys, orders, ids, i, up)
+        i = up
+    return size + 1
+
+
+# drops the smallest entry, returns the new size
+@jit_inline
+def heap_pop(keys, orders, ids, size):
+    size -= 1
+    if size == 0:
+        return 0
+    keys[0] = keys[size]
+    orders[0] = orders[size]
+    ids[0] = ids[size]
+    i = 0
+    while True:
+        child = 2 * i + 1
+        if child >= size:
+            break
+        if child + 1 < size and heap_less(keys, orders, child + 1, child):
+            child += 1
+        if not heap_less(keys, orders, child, i):
+            break
+        heap_swap(keys, orders, ids, i, child)
+        i = child
+    return size
+
+
+# Pathfinder.astar_steps line for line, for at most count expansions, returns how many it did
+# stops early when the heap could not take the neighbours of one more cell
+@jit
+def astar_run(state, keys, orders, ids, obstacles, costs, weighted, visited, local_goal, parent, touched,
+              offset_x, offset_y, offset_step, map_width, map_height, goal, heuristic, weight, count, expanded_ids):
+    size = state[0]
+    push_count = state[1]
+    current = state[2]
+    reopened = state[4]
+    touched_count = state[5]
+    goal_x = goal % map_width
+    goal_y = goal // map_width
+    capacity = len(keys)
+    expanded = 0
+
+    while size > 0 and current != goal and expanded < count and capacity - size >= 8:
+        while size > 0 and visited[ids[0]]:
+            size = heap_pop(keys, orders, ids, size)
+        if size == 0:
+            break
+
+        current = ids[0]
+        size = heap_pop(keys, orders, ids, size)
+        visited[current] = 1
+        expanded_ids[expanded] = current
+        expanded += 1
+
+        current_x = current % map_width
+        current_y = current // map_width
+        current_goal = local_goal[current]
+        for k in range(8):
+            nx = current_x + offset_x[k]
+            ny = current_y + offset_y[k]
+            if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                continue
+            nb = ny * map_width + nx
+            if obstacles[nb]:
+                continue
+            step = offset_step[k]
+            if weighted:
+                step = step * (np.int64(costs[current]) + np.int64(costs[nb])) * 0.5
+
+            possibly_lower_goal = current_goal + step
+            nb_goal = local_goal[nb]
+            if possibly_lower_goal < nb_goal:
+                if nb_goal == math.inf:
+                    touched[touched_count] = nb
+                    touched_count += 1
+                parent[nb] = current
+                local_goal[nb] = possibly_lower_goal
+                if not visited[nb]:
+                    global_goal = possibly_lower_goal + weight * heuristic_value(heuristic, abs(nx - goal_x), abs(ny - goal_y))
+                    push_count += 1
+                    size = heap_push(keys, orders, ids, size, global_goal, push_count, nb)
+                else:
+                    reopened += 1
+
+    state[0] = size
+    state[1] = push_count
+    state[2] = current
+    state[3] += expanded
+    state[4] = reopened
+    state[5] = touched_count
+    return expanded
@@ -0,0 +1,224 @@
+#**********************************************************
+# Landmark (ALT) heuristic for the pathfinding engine
+# Shortest distances from a few landmark cells to every cell
+# give a lower bound that is much closer than octile on mazes
+#**********************************************************
+
+
+import math
+import mmap
+import zlib
+import time
+import struct
+from array import array
+
+from flowfield import FlowField
+
+# NumPy is optional, without it the distances and landmark picking run in plain Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# .landmarks files start with this, then the width, height, number of landmarks and the checksum of the map
+# then the landmark ids, 4 bytes each, then the distance table of every landmark, 4 byte floats
+MAGIC = b"LANDMRK1"
+HEADER = struct.Struct("<8sIIII")
+
+# distances are kept as 4 byte floats rounded down, the real distance is at most this much bigger
+ROUND_UP = 1 + 2.0 ** -23
+
+
+# distance from every landmark to every cell, by triangle inequality for any landmark L
+#   distance(a, b) >= distance(L, b) - distance(L, a) and distance(a, b) >= distance(L, a) - distance(L, b)
+# so the largest of those over the landmarks is a heuristic that never overestimates
+# distances are octile steps with the terrain costs, the same as the searches with cost_model="octile"
+# landmarks are picked farthest first, each is the cell farthest from the ones picked already
+# the tables stay right while cells only get blocked, paths only get longer then, so Pathfinder keeps using them
+# once a cell is opened or a cost changes they could overestimate, and searches go back to the plain heuristic
+# until build is called again, see current
+# active is how many landmarks each search uses, the ones giving the best bound between its start and goal
+class Landmarks:
+
+    def __init__(self, graph, count=8, active=4, method="auto", build=True):
+        if build and count < 1:
+            raise ValueError("count must be at least 1")
+        self.graph = graph
+        self.count = count
+        self.active = active
+        self.method = method
+        self.ids = []
+        self.tables = []
+        self.version = graph.version
+        self.checksum = map_checksum(graph)
+        self.data = None
+        self.stats = {"time": 0.0, "dijkstra": 0}
+        if build:
+            self.build()
+
+    # picks the landmarks and runs a Dijkstra from each, one more to find the first landmark
+    def build(self):
+        graph = self.graph
+        t0 = time.perf_counter()
+        self.ids = []
+        self.tables = []
+        self.version = graph.version
+        self.checksum = map_checksum(graph)
+        self.data = None
+        self.stats["dijkstra"] = 0
+
+        free = bytes(graph.obstacles).find(0)
+        if free == -1:
+            self.stats["time"] = time.perf_counter() - t0
+            return
+        # the cell farthest from any free cell is at the edge of the map, a good first landmark
+        nearest = self.distances(free)
+        while len(self.ids) < self.count:
+            landmark = farthest(nearest)
+            if landmark == -1 or landmark in self.ids:
+                break
+            cost = self.distances(landmark)
+            self.ids.append(landmark)
+            self.tables.append(round_down(cost))
+            if len(self.ids) == 1:
+                nearest = cost
+            elif np is not None:
+                np.minimum(np.frombuffer(nearest, dtype=np.float64), np.frombuffer(cost, dtype=np.float64),
+                           out=np.frombuffer(nearest, dtype=np.float64))
+            else:
+                for id in range(graph.size):
+                    if cost[id] < nearest[id]:
+                        nearest[id] = cost[id]
+        self.stats["time"] = time.perf_counter() - t0
+
+    # cost from cell id to every cell, edges cost the same both ways so a flow field to id gives it
+    def distances(self, id):
+        self.stats["dijkstra"] += 1
+        return FlowField(self.graph, id, self.method).cost
+
+    # False once a change since the build could make the tables overestimate
+    # blocked cells are fine and are checked off, so the next call does not look at them again
+    def current(self):
+        graph = self.graph
+        if self.version == graph.version:
+            return True
+        changes = graph.changes_since(self.version)
+        if changes == None:
+            return False
+        for id in changes:
+            if graph.obstacles[id] == 0:
+                return False
+        self.version = graph.version
+        return True
+
+    # a function (id, x, y) -> lower bound of the cost from that cell to target, or None if the tables are stale
+    # it is never below heuristic, the plain octile heuristic is the floor
+    # landmarks that cannot reach source or target are left out, source can be an obstacle if a search starts on one
+    def estimator(self, source, target, heuristic):
+        if not self.current():
+            return None
+        map_width = self.graph.map_width
+        target_x = target % map_width
+        target_y = target // map_width
+
+        # best landmarks for this source and target first
+        ranked = []
+        for table in self.tables:
+            to_target = table[target]
+            to_source = table[source]
+            if to_target == math.inf or to_source == math.inf:
+                continue
+            bound = max(to_target - to_source * ROUND_UP, to_source - to_target * ROUND_UP)
+            ranked.append((bound, len(ranked), table, to_target, to_target * ROUND_UP))
+        ranked.sort(reverse=True)
+        active = [(table, low, high) for bound, i, table, low, high in ranked[:self.active]]
+
+        def estimate(id, x, y):
+            h = heuristic(abs(x - target_x), abs(y - target_y))
+            for table, low, high in active:
+                d = table[id]
+                if d - high > h:
+                    h = d - high
+                if low - d * ROUND_UP > h:
+                    h = low - d * ROUND_UP
+            return h
+
+        return estimate
+
+    # bytes per cell used by the tables
+    def bytes_per_cell(self):
+        return 4 * len(self.tables)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, self.graph.map_width, self.graph.map_height, len(self.ids), self.checksum))
+            f.write(array('I', self.ids))
+            for table in self.tables:
+                f.write(table)
+
+
+# Landmarks from a file written by Landmarks.save, for the map it was built on
+# the file is memory mapped and the tables are views into it, so loading takes no time whatever the size
+# and only the pages the searches read come from disk
+def load(path, graph, active=4):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < HEADER.size:
+        raise ValueError(path + " is not a .landmarks file")
+    magic, map_width, map_height, count, checksum = HEADER.unpack_from(data)
+    size = map_width * map_height
+    if magic != MAGIC or len(data) != HEADER.size + 4 * count + 4 * count * size:
+        raise ValueError(path + " is not a .landmarks file")
+    if map_width != graph.map_width or map_height != graph.map_height or checksum != map_checksum(graph):
+        raise ValueError(path + " was built for a different map")
+
+    landmarks = Landmarks(graph, count, active, build=False)
+    view = memoryview(data)
+    landmarks.ids = list(view[HEADER.size:HEADER.size + 4 * count].cast('I'))
+    offset = HEADER.size + 4 * count
+    for i in range(count):
+        landmarks.tables.append(view[offset + 4 * size * i:offset + 4 * size * (i + 1)].cast('f'))
+    landmarks.data = data
+    return landmarks
+
+
+# crc of the obstacles and costs, to tell if a file belongs to a map
+def map_checksum(graph):
+    checksum = zlib.crc32(graph.obstacles)
+    if graph.costs is not None:
+        checksum = zlib.crc32(graph.costs, checksum)
+    return checksum
+
+
+# id of the reachable cell with the biggest cost, -1 if there is none
+def farthest(cost):
+    if np is not None:
+        values = np.frombuffer(cost, dtype=np.float64)
+        values = np.where(np.isfinite(values), values, -1.0)
+        id = int(np.argmax(values))
+        return id if values[id] > 0 else -1
+    best = -1
+    best_cost = 0
+    for id in range(len(cost)):
+        if cost[id] > best_cost and cost[id] != math.inf:
+            best = id
+            best_cost = cost[id]
+    return best
+
+
+# 4 byte floats that are never above the costs, so the tables never make a bound too big
+# a plain conversion rounds to the nearest float and can go up
+def round_down(cost):
+    if np is not None:
+        exact = np.frombuffer(cost, dtype=np.float64)
+        table = exact.astype(np.float32)
+        over = table > exact
+        table[over] = np.nextafter(table[over], np.float32(0))
+        return array('f', table.tobytes())
+    table = array('f', cost)
+    for id in range(len(table)):
+        if table[id] > cost[id]:
+            bits = struct.unpack("<I", struct.pack("<f", table[id]))[0]
+            table[id] = struct.unpack("<f", struct.pack("<I", bits - 1))[0]
+    return table
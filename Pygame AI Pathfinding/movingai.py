@@ -0,0 +1,92 @@
+#**********************************************************
+# Moving AI benchmark files for the pathfinding engine
+# Reads and writes the .map grids and .scen query lists
+# from movingai.com/benchmarks, so results can be compared
+#**********************************************************
+
+
+import os
+
+from pathfinder import GridGraph
+
+
+# map characters, . G and S can be walked on, @ O T and W cannot
+# S is swamp and W is water, this engine has no land/water rules so they are just free and blocked
+OBSTACLE_TABLE = bytearray(b"\x01") * 256
+for c in b".GS":
+    OBSTACLE_TABLE[c] = 0
+OBSTACLE_TABLE = bytes(OBSTACLE_TABLE)
+
+
+# a GridGraph from a .map file, the rows are turned into obstacles in one translate, not per cell
+def load_map(path):
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+
+    header = {}
+    row = 0
+    while row < len(lines) and lines[row].strip() != b"map":
+        words = lines[row].split()
+        if len(words) == 2:
+            header[words[0].decode()] = words[1].decode()
+        row += 1
+    if row == len(lines) or "width" not in header or "height" not in header:
+        raise ValueError(path + " is not a .map file")
+    if header.get("type", "octile") != "octile":
+        raise ValueError("only octile .map files are supported, got " + header["type"])
+
+    map_width = int(header["width"])
+    map_height = int(header["height"])
+    rows = lines[row + 1:row + 1 + map_height]
+    if len(rows) != map_height:
+        raise ValueError(path + " has " + str(len(rows)) + " rows, expected " + str(map_height))
+    for r in rows:
+        if len(r) != map_width:
+            raise ValueError(path + " has a row of " + str(len(r)) + " cells, expected " + str(map_width))
+    return GridGraph(map_width, map_height, bytearray(b"".join(rows).translate(OBSTACLE_TABLE)))
+
+
+# terrain costs are left out, the format only has free and blocked cells
+def save_map(graph, path):
+    with open(path, "wb") as f:
+        f.write(b"type octile\nheight %d\nwidth %d\nmap\n" % (graph.map_height, graph.map_width))
+        cells = bytes(graph.obstacles).translate(b"." + b"@" * 255)
+        for y in range(graph.map_height):
+            f.write(cells[y * graph.map_width:(y + 1) * graph.map_width] + b"\n")
+
+
+# queries from a .scen file, a list of (bucket, map file, (start x, start y), (goal x, goal y), optimal length)
+# the map file is the name written in the .scen, usually relative to the folder of the .scen
+def load_scen(path):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if len(lines) == 0 or not lines[0].startswith("version"):
+        raise ValueError(path + " is not a .scen file")
+
+    queries = []
+    for line in lines[1:]:
+        words = line.split("\t")
+        if len(words) < 9:
+            words = line.split()
+        if len(words) < 9:
+            continue
+        queries.append((int(words[0]), words[1], (int(words[4]), int(words[5])), (int(words[6]), int(words[7])), float(words[8])))
+    return queries
+
+
+# queries is a list of ((start x, start y), (goal x, goal y), optimal length), buckets are 10 queries each
+def save_scen(path, map_file, graph, queries):
+    with open(path, "w") as f:
+        f.write("version 1\n")
+        for i in range(len(queries)):
+            start, goal, optimal = queries[i]
+            f.write("%d\t%s\t%d\t%d\t%d\t%d\t%d\t%d\t%.8f\n" % (i // 10, map_file, graph.map_width, graph.map_height, start[0], start[1], goal[0], goal[1], optimal))
+
+
+# the .map file of a .scen query, looked for next to the .scen first
+def map_path(scen_path, map_file):
+    folder = os.path.dirname(scen_path)
+    for path in (os.path.join(folder, map_file), os.path.join(folder, os.path.basename(map_file))):
+        if os.path.exists(path):
+            return path
+    raise ValueError("cannot find " + map_file + " for " + scen_path)
@@ -0,0 +1,132 @@
+#**********************************************************
+# Path cache for repeated queries on the same map
+# Paths are kept per start, goal and search settings, and
+# only the ones an obstacle or cost change can affect are dropped
+#**********************************************************
+
+
+import math
+from array import array
+
+from pathfinder import octile_distance, expand_path
+
+
+# paths kept per (start, goal, algorithm, heuristic, weight, cost model, landmarks or not), oldest dropped once there are more than capacity
+# entries are checked against graph.version on every lookup, changes made through set_obstacle, toggle_obstacle
+# or set_cost are looked at cell by cell, a path survives a change unless:
+#   it goes through the changed cell, or
+#   the cell is free now and a path through it could be cheaper, going by the octile distance,
+#   which is never more than the real cost since every cell costs at least 1
+# if more cells changed than the graph remembers, everything is dropped
+class PathCache:
+
+    def __init__(self, graph, capacity=256):
+        self.graph = graph
+        self.capacity = capacity
+        self.version = graph.version
+        # key -> (every cell id of the path, cost), and cell id -> keys of the paths through it
+        self.paths = {}
+        self.through = {}
+        self.hits = 0
+        self.misses = 0
+        self.stats = {"invalidated": 0, "evicted": 0, "cleared": 0}
+
+    def key(self, pathfinder, start, goal):
+        return (start, goal, pathfinder.algorithm, pathfinder.heuristic, pathfinder.weight, pathfinder.cost_model, pathfinder.landmarks != None)
+
+    # (path ids, cost) or None, path ids are every cell from start to goal, start and goal are ids
+    def get(self, pathfinder, start, goal):
+        self.catch_up()
+        key = self.key(pathfinder, start, goal)
+        if key not in self.paths:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # move to the end, dicts keep insertion order
+        entry = self.paths.pop(key)
+        self.paths[key] = entry
+        return list(entry[0]), entry[1]
+
+    # path is the ids from trace_path, jps gaps are filled in here, [] and math.inf for no path
+    def put(self, pathfinder, start, goal, path, cost):
+        self.catch_up()
+        key = self.key(pathfinder, start, goal)
+        if key in self.paths:
+            self.remove(key)
+        graph = self.graph
+        cells = array('i')
+        if len(path) > 0:
+            for x, y in expand_path(graph, path):
+                cells.append(y * graph.map_width + x)
+        self.paths[key] = (cells, cost)
+        for id in set(cells):
+            if id not in self.through:
+                self.through[id] = set()
+            self.through[id].add(key)
+        while len(self.paths) > self.capacity:
+            self.remove(next(iter(self.paths)))
+            self.stats["evicted"] += 1
+
+    # returns (path, cost, stats) like Pathfinder.find_path, stats["cached"] says if it came from the cache
+    def find_path(self, pathfinder, start, goal):
+        graph = self.graph
+        start_id = graph.index(start[0], start[1])
+        goal_id = graph.index(goal[0], goal[1])
+        entry = self.get(pathfinder, start_id, goal_id)
+        if entry != None:
+            return [graph.coords(id) for id in entry[0]], entry[1], {"cached": True, "expanded": 0, "cost": entry[1]}
+
+        stats = pathfinder.solve(start_id, goal_id)
+        stats["cached"] = False
+        path = graph.trace_path(start_id, goal_id)
+        cost = graph.local_goal[goal_id] if len(path) > 0 else math.inf
+        self.put(pathfinder, start_id, goal_id, path, cost)
+        if len(path) == 0:
+            return [], math.inf, stats
+        return expand_path(graph, path), cost, stats
+
+    def remove(self, key):
+        cells, cost = self.paths.pop(key)
+        for id in set(cells):
+            keys = self.through[id]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.through[id]
+
+    def clear(self):
+        self.stats["cleared"] += len(self.paths)
+        self.paths = {}
+        self.through = {}
+
+    # drop the paths the cells changed since the last lookup could affect
+    def catch_up(self):
+        graph = self.graph
+        if self.version == graph.version:
+            return
+        changes = graph.changes_since(self.version)
+        self.version = graph.version
+        if changes == None:
+            self.clear()
+            return
+
+        map_width = graph.map_width
+        for id in set(changes):
+            stale = set(self.through.get(id, ()))
+            if graph.obstacles[id] == 0:
+                x = id % map_width
+                y = id // map_width
+                for key in self.paths:
+                    if key in stale:
+                        continue
+                    start, goal = key[0], key[1]
+                    # at least this far from start to the cell and on to goal
+                    bound = octile_distance(abs(start % map_width - x), abs(start // map_width - y)) + \
+                        octile_distance(abs(x - goal % map_width), abs(y - goal // map_width))
+                    if bound < self.paths[key][1]:
+                        stale.add(key)
+            for key in stale:
+                self.remove(key)
+            self.stats["invalidated"] += len(stale)
+
+    def hit_rate(self):
+        return self.hits / max(1, self.hits + self.misses)
@@ -0,0 +1,983 @@
+#**********************************************************
+# Headless pathfinding engine used by pathfinding.py
+# Can be imported and run without Pygame or a display
+#**********************************************************
+
+
+import math
+import heapq
+import time
+from array import array
+from collections import deque
+
+import kernels
+
+
+# algorithms understood by Pathfinder
+ALGORITHMS = ("astar", "dijkstra", "jps", "bidirectional")
+
+SQRT2 = math.sqrt(2)
+
+# (dx, dy, squared step length) for the 8 neighbours of a cell
+# order is N, S, E, W, NW, SW, NE, SE, same as the old neighbours_list
+NEIGHBOUR_OFFSETS = ((0, -1, 1), (0, 1, 1), (-1, 0, 1), (1, 0, 1),
+                     (-1, -1, 2), (-1, 1, 2), (1, -1, 2), (1, 1, 2))
+
+# same neighbours, but straight steps cost 1 and diagonal steps cost sqrt(2)
+OCTILE_OFFSETS = ((0, -1, 1), (0, 1, 1), (-1, 0, 1), (1, 0, 1),
+                  (-1, -1, SQRT2), (-1, 1, SQRT2), (1, -1, SQRT2), (1, 1, SQRT2))
+
+# edge costs, "octile" is the real length of a step
+# "squared" is the squared distance the demo first used, kept to compare against
+COST_MODELS = {"octile": OCTILE_OFFSETS, "squared": NEIGHBOUR_OFFSETS}
+
+# cells cleared between yields when a reset is run a slice at a time
+RESET_CHUNK = 4096
+
+# how the A Star and dijkstra loop is run, "numba" is the compiled kernel in kernels.py
+# "auto" uses it when Numba is installed and nothing needs the Python loop, see Pathfinder
+BACKENDS = ("auto", "python", "numba")
+
+# cells the compiled kernel expands between yields
+KERNEL_CHUNK = 4096
+
+# how many of the latest map changes a GridGraph remembers, see changes_since
+CHANGE_LOG = 4096
+
+
+# 8-connected grid, any size
+# every cell is just an id = y*map_width + x into flat arrays, there are no per-cell objects
+class GridGraph:
+
+    # obstacles can be an existing buffer of map_width*map_height bytes, eg. shared memory
+    # it is used as it is, not copied, so several graphs can share one map
+    # costs is an optional buffer of the same size, the terrain cost of every cell from 1 to 255
+    # a step between two cells costs its length times the average terrain cost of the two, see step_cost
+    # without costs every cell costs 1, the same as before there were terrain costs
+    def __init__(self, map_width, map_height, obstacles=None, costs=None):
+        self.map_width = map_width
+        self.map_height = map_height
+        self.size = map_width * map_height
+
+        # the map itself, 1 byte per cell
+        if obstacles is None:
+            obstacles = bytearray(self.size)
+        elif len(obstacles) != self.size:
+            raise ValueError("obstacles must have map_width*map_height bytes")
+        self.obstacles = obstacles
+        if costs is not None and len(costs) != self.size:
+            raise ValueError("costs must have map_width*map_height bytes")
+        self.costs = costs
+
+        # goes up by one for every cell set_obstacle, toggle_obstacle or set_cost changes
+        # changes holds the ids of the latest changed cells, so caches can catch up with just those cells
+        # writing to obstacles or costs directly is not counted
+        self.version = 0
+        self.changes = deque(maxlen=CHANGE_LOG)
+
+        # result of the last search, read by the renderer
+        self.visited = bytearray(self.size)
+        self.local_goal = array('d', [math.inf]) * self.size
+        self.parent = array('i', [-1]) * self.size
+
+        # ids of every cell the last search wrote to, so a reset only has to clear those
+        self.touched = array('i')
+
+        # the backwards half of a bidirectional search, only made the first time one runs
+        self.reverse_goal = None
+        self.reverse_parent = None
+
+    def add_reverse_arrays(self):
+        if self.reverse_goal == None:
+            self.reverse_goal = array('d', [math.inf]) * self.size
+            self.reverse_parent = array('i', [-1]) * self.size
+
+    def index(self, x, y):
+        return y * self.map_width + x
+
+    def coords(self, id):
+        return id % self.map_width, id // self.map_width
+
+    def in_bounds(self, x, y):
+        return x >= 0 and x < self.map_width and y >= 0 and y < self.map_height
+
+    def is_obstacle(self, x, y):
+        return self.obstacles[y * self.map_width + x] == 1
+
+    def set_obstacle(self, x, y, obstacle=True):
+        id = y * self.map_width + x
+        if self.obstacles[id] != (1 if obstacle else 0):
+            self.obstacles[id] = 1 if obstacle else 0
+            self.changed(id)
+
+    def toggle_obstacle(self, x, y):
+        id = y * self.map_width + x
+        self.obstacles[id] = 1 - self.obstacles[id]
+        self.changed(id)
+
+    def changed(self, id):
+        self.version += 1
+        self.changes.append(id)
+
+    # ids of the cells changed since version, oldest first, None if that is too long ago to remember
+    def changes_since(self, version):
+        count = self.version - version
+        if count > len(self.changes):
+            return None
+        return list(self.changes)[len(self.changes) - count:]
+
+    def cost_at(self, x, y):
+        if self.costs is None:
+            return 1
+        return self.costs[y * self.map_width + x]
+
+    # terrain cost of a cell, the first call on a map without costs gives it a cost buffer of all 1s
+    # costs below 1 would make the heuristics overestimate, so they are not allowed
+    def set_cost(self, x, y, cost):
+        if cost < 1 or cost > 255:
+            raise ValueError("cost must be from 1 to 255")
+        if self.costs is None:
+            self.costs = bytearray(b"\x01") * self.size
+        id = y * self.map_width + x
+        if self.costs[id] != cost:
+            self.costs[id] = cost
+            self.changed(id)
+
+    # cost of the step between neighbours a and b, step is its length
+    # the same both ways, so searches from the goal (D* Lite, flow fields) get the same costs
+    def step_cost(self, a, b, step):
+        if self.costs is None:
+            return step
+        return step * (self.costs[a] + self.costs[b]) * 0.5
+
+    # neighbour ids of a cell, worked out from the offsets instead of stored lists
+    def neighbours(self, id):
+        x = id % self.map_width
+        y = id // self.map_width
+        nb_list = []
+        for dx, dy, step in NEIGHBOUR_OFFSETS:
+            nx = x + dx
+            ny = y + dy
+            if nx >= 0 and nx < self.map_width and ny >= 0 and ny < self.map_height:
+                nb_list.append(ny * self.map_width + nx)
+        return nb_list
+
+    # reset search results before each search
+    # only the cells the last search touched are cleared, returns how many were reset
+    def reset_nodes(self):
+        visited = self.visited
+        local_goal = self.local_goal
+        parent = self.parent
+        for id in self.touched:
+            visited[id] = 0
+            local_goal[id] = math.inf
+            parent[id] = -1
+        if self.reverse_goal != None:
+            self.reset_reverse(self.touched)
+
+        reset_count = len(self.touched)
+        self.touched = array('i')
+        return reset_count
+
+    # same as reset_nodes, but yields -1 after every chunk of cells so a big reset can be spread out
+    # if it is stopped part way, the cells not cleared yet stay in touched for the next reset
+    def reset_steps(self, chunk=RESET_CHUNK):
+        visited = self.visited
+        local_goal = self.local_goal
+        parent = self.parent
+        touched = self.touched
+        self.touched = array('i')
+        done = 0
+        try:
+            while done < len(touched):
+                for id in touched[done:done + chunk]:
+                    visited[id] = 0
+                    local_goal[id] = math.inf
+                    parent[id] = -1
+                if self.reverse_goal != None:
+                    self.reset_reverse(touched[done:done + chunk])
+                done += chunk
+                yield -1
+        finally:
+            if done < len(touched):
+                self.touched = touched[done:] + self.touched
+        return len(touched)
+
+    def reset_reverse(self, ids):
+        reverse_goal = self.reverse_goal
+        reverse_parent = self.reverse_parent
+        for id in ids:
+            reverse_goal[id] = math.inf
+            reverse_parent[id] = -1
+
+    # walk parent pointers back from goal, returns ids from start to goal, [] if goal was not reached
+    def trace_path(self, start, goal):
+        if self.obstacles[goal] or (goal != start and self.parent[goal] == -1):
+            return []
+
+        path = []
+        id = goal
+        while id != -1:
+            path.append(id)
+            id = self.parent[id]
+        path.reverse()
+        return path
+
+    # bytes used per cell by the map and the search arrays
+    def bytes_per_cell(self):
+        # the touched list only grows with the search, not with the map, so it is left out
+        total = len(self.obstacles) + len(self.visited)
+        if self.costs is not None:
+            total += len(self.costs)
+        total += self.local_goal.itemsize * len(self.local_goal)
+        total += self.parent.itemsize * len(self.parent)
+        if self.reverse_goal != None:
+            total += self.reverse_goal.itemsize * len(self.reverse_goal)
+            total += self.reverse_parent.itemsize * len(self.reverse_parent)
+        return total / self.size
+
+
+# calculate actual distance between two cells
+def calc_distance(ax, ay, bx, by):
+    return math.sqrt((ax - bx) * (ax - bx) + (ay - by) * (ay - by))
+
+
+# heuristics take the absolute x and y distance to the goal
+# shortest 8-connected distance with no obstacles, exact on an empty map with "octile" costs
+def octile_distance(dx, dy):
+    if dx < dy:
+        return dx * SQRT2 + (dy - dx)
+    return dy * SQRT2 + (dx - dy)
+
+
+# straight line distance, never overestimates but is looser than octile
+def euclidean_distance(dx, dy):
+    return math.sqrt(dx * dx + dy * dy)
+
+
+# 4-connected distance, overestimates diagonal moves so paths may not be the shortest
+def manhattan_distance(dx, dy):
+    return dx + dy
+
+
+# number of king moves, never overestimates, counts a diagonal step as 1
+def chebyshev_distance(dx, dy):
+    return max(dx, dy)
+
+
+# no heuristic at all, A Star becomes Dijkstra
+def zero_distance(dx, dy):
+    return 0
+
+
+# SQUARED distance, overestimates badly, goes with the "squared" cost model
+def squared_distance(dx, dy):
+    return dx * dx + dy * dy
+
+
+HEURISTICS = {"octile": octile_distance, "euclidean": euclidean_distance, "manhattan": manhattan_distance,
+              "chebyshev": chebyshev_distance, "zero": zero_distance, "squared": squared_distance}
+
+
+# -1, 0 or 1
+def sign(n):
+    return (n > 0) - (n < 0)
+
+
+# runs searches on a GridGraph, the graph keeps the result of the last search
+class Pathfinder:
+
+    # heuristic is a name from HEURISTICS, it defaults to the one matching the cost model
+    # dijkstra always uses "zero"
+    # weight > 1 is weighted A Star, global_goal = local_goal + weight * heuristic
+    # it expands fewer nodes, but the path can be up to weight times longer than the shortest
+    # probe is an optional SearchProbe from instrument.py, without one nothing extra is counted or timed
+    # landmarks is an optional Landmarks from landmarks.py built on this graph, its bound is used on top of the heuristic
+    # backend "numba" runs astar and dijkstra in the compiled kernel, same results as "python", only faster
+    # "auto" picks it when Numba is installed, unless there is a probe or landmarks, they need the Python loop
+    def __init__(self, graph, algorithm="astar", heuristic=None, weight=1.0, cost_model="octile", probe=None, landmarks=None, backend="auto"):
+        if algorithm not in ALGORITHMS:
+            raise ValueError("unknown algorithm: " + str(algorithm))
+        if cost_model not in COST_MODELS:
+            raise ValueError("unknown cost model: " + str(cost_model))
+        if algorithm == "jps" and cost_model != "octile":
+            raise ValueError("jps needs the octile cost model")
+        if algorithm == "jps" and graph.costs is not None:
+            raise ValueError("jps needs a map without terrain costs")
+        if heuristic == None:
+            heuristic = "squared" if cost_model == "squared" else "octile"
+        if algorithm == "dijkstra":
+            heuristic = "zero"
+        if heuristic not in HEURISTICS:
+            raise ValueError("unknown heuristic: " + str(heuristic))
+        if weight < 1:
+            raise ValueError("weight must be at least 1")
+        if landmarks != None and landmarks.graph is not graph:
+            raise ValueError("landmarks were built for a different graph")
+        if landmarks != None and cost_model != "octile":
+            raise ValueError("landmarks need the octile cost model")
+        if backend not in BACKENDS:
+            raise ValueError("unknown backend: " + str(backend))
+        compiled = algorithm in ("astar", "dijkstra") and probe == None and landmarks == None
+        if backend == "auto":
+            backend = "numba" if kernels.AVAILABLE and compiled else "python"
+        if backend == "numba" and not kernels.AVAILABLE:
+            raise ValueError("the numba backend needs numpy and numba installed")
+        if backend == "numba" and not compiled:
+            raise ValueError("the numba backend only runs astar and dijkstra, without a probe or landmarks")
+        self.graph = graph
+        self.algorithm = algorithm
+        self.heuristic = heuristic
+        self.weight = weight
+        self.cost_model = cost_model
+        self.probe = probe
+        self.landmarks = landmarks
+        self.backend = backend
+        if backend == "numba":
+            kernels.warm_up()
+
+    # solve with the chosen algorithm, start and goal are cell ids
+    # leaves visited, local_goal and parent set on the graph
+    def solve(self, start, goal):
+        return run_to_end(self.steps(start, goal))
+
+    # the same search as a generator, it yields the id of every node it expands and returns the stats
+    # so a search can be spread over several frames, see SearchTask
+    # it yields -1 while it is still clearing the last search
+    def steps(self, start, goal):
+        if self.algorithm == "jps":
+            steps = self.jps_steps(start, goal)
+        elif self.algorithm == "bidirectional":
+            steps = self.bidirectional_steps(start, goal)
+        elif self.backend == "numba":
+            steps = self.kernel_steps(start, goal)
+        else:
+            steps = self.astar_steps(start, goal)
+        if self.probe != None:
+            return self.probe.watch(steps, self, start, goal)
+        return steps
+
+    # the heuristic and heap functions a search calls, the probe swaps in timed and counted versions
+    # so a search without a probe runs exactly the same code as before there were probes
+    def search_functions(self):
+        heuristic = HEURISTICS[self.heuristic]
+        if self.probe != None:
+            return self.probe.wrap(heuristic, heapq.heappush, heapq.heappop)
+        return heuristic, heapq.heappush, heapq.heappop
+
+    # landmark bound from a cell to target as a function (id, x, y), None without landmarks
+    # or when the map changed in a way the tables do not cover, the plain heuristic is used then
+    def estimator(self, source, target, heuristic):
+        if self.landmarks == None or self.algorithm == "dijkstra":
+            return None
+        return self.landmarks.estimator(source, target, heuristic)
+
+    def solve_astar(self, start, goal):
+        return run_to_end(self.astar_steps(start, goal))
+
+    def solve_jps(self, start, goal):
+        return run_to_end(self.jps_steps(start, goal))
+
+    def solve_bidirectional(self, start, goal):
+        return run_to_end(self.bidirectional_steps(start, goal))
+
+    # returns a SearchTask, nothing is searched until its run is called
+    def start_search(self, start, goal):
+        return SearchTask(self, start, goal)
+
+    # A Star solver, also used for dijkstra
+    def astar_steps(self, start, goal):
+        graph = self.graph
+        stats = {"expanded": 0, "pushed": 1, "reopened": 0, "reset": 0, "touched": 0, "landmarks": False, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        stats["reset"] = yield from graph.reset_steps()
+
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        costs = graph.costs
+        weighted = costs is not None
+        visited = graph.visited
+        local_goal = graph.local_goal
+        parent = graph.parent
+        touched = graph.touched
+        heuristic, heappush, heappop = self.search_functions()
+        estimate = self.estimator(start, goal, heuristic)
+        weight = self.weight
+        neighbour_offsets = COST_MODELS[self.cost_model]
+        goal_x = goal % map_width
+        goal_y = goal // map_width
+
+        local_goal[start] = 0
+        touched.append(start)
+        if estimate == None:
+            start_goal = weight * heuristic(abs(start % map_width - goal_x), abs(start // map_width - goal_y))
+        else:
+            start_goal = weight * estimate(start, start % map_width, start // map_width)
+
+        # open set is a binary heap of (global_goal, push order, id)
+        # push order breaks ties first-in first-out, same as the old stable sort
+        # a cell can be in the heap more than once, stale entries are skipped when popped
+        push_count = 0
+        list_not_tested = [(start_goal, push_count, start)]
+        current = start
+        expanded = 0
+        reopened = 0
+
+        # while not found end node yet
+        while(len(list_not_tested) > 0 and current != goal):
+
+            # if already visited, then just pop
+            while(len(list_not_tested) > 0 and visited[list_not_tested[0][2]]):
+                heappop(list_not_tested)
+
+            # if empty list, then break
+            if len(list_not_tested) == 0:
+                break
+
+            # set current to front
+            current = heappop(list_not_tested)[2]
+            visited[current] = 1
+            expanded += 1
+
+            current_x = current % map_width
+            current_y = current // map_width
+            current_goal = local_goal[current]
+            if weighted:
+                current_terrain = costs[current]
+
+            for dx, dy, step in neighbour_offsets:
+                nx = current_x + dx
+                ny = current_y + dy
+                if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                    continue
+                nb = ny * map_width + nx
+                if obstacles[nb]:
+                    continue
+                if weighted:
+                    step = step * (current_terrain + costs[nb]) * 0.5
+
+                # calculate possible lower goal distance
+                possibly_lower_goal = current_goal + step
+
+                # if possibly lower goal, means best path found *so far*, set as parent
+                # visited cells are updated too in case the heuristic is not consistent, but never re-added
+                nb_goal = local_goal[nb]
+                if possibly_lower_goal < nb_goal:
+                    if nb_goal == math.inf:
+                        touched.append(nb)
+                    parent[nb] = current
+                    local_goal[nb] = possibly_lower_goal
+
+                    if not visited[nb]:
+                        if estimate == None:
+                            global_goal = possibly_lower_goal + weight * heuristic(abs(nx - goal_x), abs(ny - goal_y))
+                        else:
+                            global_goal = possibly_lower_goal + weight * estimate(nb, nx, ny)
+                        push_count += 1
+                        heappush(list_not_tested, (global_goal, push_count, nb))
+                    else:
+                        # only happens when the heuristic is not consistent
+                        reopened += 1
+
+            yield current
+
+        stats["expanded"] = expanded
+        stats["pushed"] += push_count
+        stats["reopened"] = reopened
+        stats["touched"] = len(touched)
+        stats["landmarks"] = estimate != None
+        stats["cost"] = local_goal[goal]
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # astar_steps run by the compiled kernel, KERNEL_CHUNK expansions at a time
+    # the ids expanded in a chunk are yielded once it is done, so slicing still works, just in bigger steps
+    def kernel_steps(self, start, goal):
+        graph = self.graph
+        stats = {"expanded": 0, "pushed": 1, "reopened": 0, "reset": 0, "touched": 0, "landmarks": False, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        # the reset is quick enough with numpy to not need slicing
+        stats["reset"] = kernels.reset_nodes(graph)
+        yield -1
+
+        search = kernels.KernelSearch(graph, start, goal, COST_MODELS[self.cost_model], self.heuristic, self.weight)
+        expanded = 0
+        while True:
+            for id in search.run(KERNEL_CHUNK):
+                expanded += 1
+                yield id
+            if search.done:
+                break
+
+        stats["expanded"] = expanded
+        stats["pushed"] += search.pushed()
+        stats["reopened"] = search.reopened()
+        stats["touched"] = len(graph.touched)
+        stats["cost"] = graph.local_goal[goal]
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # A Star from both ends at once, they meet somewhere in the middle
+    # each side uses half the difference of the two heuristics, (h to goal - h to start) / 2, so both
+    # sides search the same reduced costs and the search can stop as soon as the smallest keys of the
+    # two open sets add up to the best path found so far, with the "zero" heuristic it is bidirectional dijkstra
+    # visited is 1 for cells closed going forwards, 2 going backwards, 3 for both
+    def bidirectional_steps(self, start, goal):
+        graph = self.graph
+        stats = {"expanded": 0, "pushed": 2, "reopened": 0, "reset": 0, "touched": 0, "forward": 0, "backward": 0, "landmarks": False, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        stats["reset"] = yield from graph.reset_steps()
+        graph.add_reverse_arrays()
+
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        costs = graph.costs
+        weighted = costs is not None
+        visited = graph.visited
+        local_goal = graph.local_goal
+        parent = graph.parent
+        reverse_goal = graph.reverse_goal
+        reverse_parent = graph.reverse_parent
+        touched = graph.touched
+        heuristic, heappush, heappop = self.search_functions()
+        weight = self.weight
+        neighbour_offsets = COST_MODELS[self.cost_model]
+        start_x = start % map_width
+        start_y = start // map_width
+        goal_x = goal % map_width
+        goal_y = goal // map_width
+
+        to_goal = self.estimator(start, goal, heuristic)
+        to_start = self.estimator(goal, start, heuristic)
+
+        if to_goal == None:
+            def potential(x, y, id):
+                return weight * (heuristic(abs(x - goal_x), abs(y - goal_y)) - heuristic(abs(x - start_x), abs(y - start_y))) / 2
+        else:
+            def potential(x, y, id):
+                return weight * (to_goal(id, x, y) - to_start(id, x, y)) / 2
+
+        # same as A Star, the goal can never be stepped onto if it is an obstacle
+        if obstacles[goal]:
+            stats["time"] = time.perf_counter() - t0
+            return stats
+
+        local_goal[start] = 0
+        touched.append(start)
+        if goal != start:
+            touched.append(goal)
+        reverse_goal[goal] = 0
+
+        # best path found so far, and the cell where the two halves meet
+        best_cost = math.inf
+        meet = -1
+        if start == goal:
+            best_cost = 0
+            meet = start
+
+        push_count = 0
+        forward_list = [(potential(start_x, start_y, start), push_count, start)]
+        backward_list = [(-potential(goal_x, goal_y, goal), push_count, goal)]
+        forward = 0
+        backward = 0
+        reopened = 0
+
+        while True:
+            while len(forward_list) > 0 and visited[forward_list[0][2]] & 1:
+                heappop(forward_list)
+            while len(backward_list) > 0 and visited[backward_list[0][2]] & 2:
+                heappop(backward_list)
+            if len(forward_list) == 0 or len(backward_list) == 0:
+                break
+            # nothing left in either open set can be part of a shorter path
+            if forward_list[0][0] + backward_list[0][0] >= best_cost:
+                break
+
+            # grow the side with the smaller open set
+            if len(forward_list) <= len(backward_list):
+                current = heappop(forward_list)[2]
+                visited[current] |= 1
+                forward += 1
+                yield current
+
+                current_x = current % map_width
+                current_y = current // map_width
+                current_goal = local_goal[current]
+                for dx, dy, step in neighbour_offsets:
+                    nx = current_x + dx
+                    ny = current_y + dy
+                    if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                        continue
+                    nb = ny * map_width + nx
+                    if obstacles[nb]:
+                        continue
+                    if weighted:
+                        step = step * (costs[current] + costs[nb]) * 0.5
+                    possibly_lower_goal = current_goal + step
+                    nb_goal = local_goal[nb]
+                    if possibly_lower_goal < nb_goal:
+                        if nb_goal == math.inf and reverse_goal[nb] == math.inf:
+                            touched.append(nb)
+                        parent[nb] = current
+                        local_goal[nb] = possibly_lower_goal
+                        if possibly_lower_goal + reverse_goal[nb] < best_cost:
+                            best_cost = possibly_lower_goal + reverse_goal[nb]
+                            meet = nb
+                        if not visited[nb] & 1:
+                            push_count += 1
+                            heappush(forward_list, (possibly_lower_goal + potential(nx, ny, nb), push_count, nb))
+                        else:
+                            reopened += 1
+            else:
+                current = heappop(backward_list)[2]
+                visited[current] |= 2
+                backward += 1
+                yield current
+
+                # edges are walked backwards, a cell can be stepped from if it is free or it is the start
+                current_x = current % map_width
+                current_y = current // map_width
+                current_goal = reverse_goal[current]
+                for dx, dy, step in neighbour_offsets:
+                    nx = current_x + dx
+                    ny = current_y + dy
+                    if nx < 0 or nx >= map_width or ny < 0 or ny >= map_height:
+                        continue
+                    nb = ny * map_width + nx
+                    if obstacles[nb] and nb != start:
+                        continue
+                    if weighted:
+                        step = step * (costs[current] + costs[nb]) * 0.5
+                    possibly_lower_goal = current_goal + step
+                    nb_goal = reverse_goal[nb]
+                    if possibly_lower_goal < nb_goal:
+                        if nb_goal == math.inf and local_goal[nb] == math.inf:
+                            touched.append(nb)
+                        reverse_parent[nb] = current
+                        reverse_goal[nb] = possibly_lower_goal
+                        if possibly_lower_goal + local_goal[nb] < best_cost:
+                            best_cost = possibly_lower_goal + local_goal[nb]
+                            meet = nb
+                        if not visited[nb] & 2:
+                            push_count += 1
+                            heappush(backward_list, (possibly_lower_goal - potential(nx, ny, nb), push_count, nb))
+                        else:
+                            reopened += 1
+
+        # join the halves, the backward half is turned around so parent leads from goal to start
+        if meet != -1:
+            id = meet
+            while id != goal:
+                next_id = reverse_parent[id]
+                parent[next_id] = id
+                local_goal[next_id] = best_cost - reverse_goal[next_id]
+                id = next_id
+
+        stats["expanded"] = forward + backward
+        stats["forward"] = forward
+        stats["backward"] = backward
+        stats["pushed"] += push_count
+        stats["reopened"] = reopened
+        stats["touched"] = len(touched)
+        stats["landmarks"] = to_goal != None
+        stats["cost"] = best_cost
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # Jump Point Search, A Star over jump points only
+    # symmetric paths through open space are skipped, so far fewer cells go through the open set
+    # parent links jump points that can be far apart, always in a straight or diagonal line
+    # diagonal moves may cut corners, same as the normal neighbours
+    def jps_steps(self, start, goal):
+        graph = self.graph
+        stats = {"expanded": 0, "pushed": 1, "reset": 0, "touched": 0, "jumped": 0, "landmarks": False, "cost": math.inf, "time": 0.0}
+        t0 = time.perf_counter()
+
+        stats["reset"] = yield from graph.reset_steps()
+
+        map_width = graph.map_width
+        map_height = graph.map_height
+        obstacles = graph.obstacles
+        visited = graph.visited
+        local_goal = graph.local_goal
+        parent = graph.parent
+        touched = graph.touched
+        goal_x = goal % map_width
+        goal_y = goal // map_width
+        jumped = [0]
+
+        def walkable(x, y):
+            return x >= 0 and x < map_width and y >= 0 and y < map_height and obstacles[y * map_width + x] == 0
+
+        # move in a straight line until the goal, a forced neighbour or a wall, returns the jump point or -1
+        def jump_straight(x, y, dx, dy):
+            while True:
+                if not walkable(x, y):
+                    return -1
+                jumped[0] += 1
+                if x == goal_x and y == goal_y:
+                    return y * map_width + x
+                if dx != 0:
+                    if (walkable(x + dx, y + 1) and not walkable(x, y + 1)) or (walkable(x + dx, y - 1) and not walkable(x, y - 1)):
+                        return y * map_width + x
+                else:
+                    if (walkable(x + 1, y + dy) and not walkable(x + 1, y)) or (walkable(x - 1, y + dy) and not walkable(x - 1, y)):
+                        return y * map_width + x
+                x += dx
+                y += dy
+
+        # move diagonally, stopping where either straight direction finds a jump point
+        def jump(x, y, dx, dy):
+            if dx == 0 or dy == 0:
+                return jump_straight(x, y, dx, dy)
+            while True:
+                if not walkable(x, y):
+                    return -1
+                jumped[0] += 1
+                if x == goal_x and y == goal_y:
+                    return y * map_width + x
+                if (walkable(x - dx, y + dy) and not walkable(x - dx, y)) or (walkable(x + dx, y - dy) and not walkable(x, y - dy)):
+                    return y * map_width + x
+                if jump_straight(x + dx, y, dx, 0) != -1 or jump_straight(x, y + dy, 0, dy) != -1:
+                    return y * map_width + x
+                x += dx
+                y += dy
+
+        # directions worth searching from a jump point, natural plus forced neighbours
+        def directions(x, y, id):
+            if parent[id] == -1:
+                dir_list = []
+                for dx, dy, step in NEIGHBOUR_OFFSETS:
+                    if walkable(x + dx, y + dy):
+                        dir_list.append((dx, dy))
+                return dir_list
+
+            dx = sign(x - parent[id] % map_width)
+            dy = sign(y - parent[id] // map_width)
+            dir_list = []
+            if dx != 0 and dy != 0:
+                if walkable(x, y + dy):
+                    dir_list.append((0, dy))
+                if walkable(x + dx, y):
+                    dir_list.append((dx, 0))
+                if walkable(x + dx, y + dy):
+                    dir_list.append((dx, dy))
+                if not walkable(x - dx, y) and walkable(x - dx, y + dy):
+                    dir_list.append((-dx, dy))
+                if not walkable(x, y - dy) and walkable(x + dx, y - dy):
+                    dir_list.append((dx, -dy))
+            elif dx == 0:
+                if walkable(x, y + dy):
+                    dir_list.append((0, dy))
+                if not walkable(x + 1, y) and walkable(x + 1, y + dy):
+                    dir_list.append((1, dy))
+                if not walkable(x - 1, y) and walkable(x - 1, y + dy):
+                    dir_list.append((-1, dy))
+            else:
+                if walkable(x + dx, y):
+                    dir_list.append((dx, 0))
+                if not walkable(x, y + 1) and walkable(x + dx, y + 1):
+                    dir_list.append((dx, 1))
+                if not walkable(x, y - 1) and walkable(x + dx, y - 1):
+                    dir_list.append((dx, -1))
+            return dir_list
+
+        local_goal[start] = 0
+        touched.append(start)
+        heuristic, heappush, heappop = self.search_functions()
+        estimate = self.estimator(start, goal, heuristic)
+        weight = self.weight
+        if estimate == None:
+            start_goal = weight * heuristic(abs(start % map_width - goal_x), abs(start // map_width - goal_y))
+        else:
+            start_goal = weight * estimate(start, start % map_width, start // map_width)
+
+        push_count = 0
+        list_not_tested = [(start_goal, push_count, start)]
+        current = start
+        expanded = 0
+
+        while(len(list_not_tested) > 0 and current != goal):
+
+            while(len(list_not_tested) > 0 and visited[list_not_tested[0][2]]):
+                heappop(list_not_tested)
+
+            if len(list_not_tested) == 0:
+                break
+
+            current = heappop(list_not_tested)[2]
+            visited[current] = 1
+            expanded += 1
+            yield current
+            if current == goal:
+                break
+
+            current_x = current % map_width
+            current_y = current // map_width
+            current_goal = local_goal[current]
+
+            for dx, dy in directions(current_x, current_y, current):
+                jp = jump(current_x + dx, current_y + dy, dx, dy)
+                if jp == -1 or visited[jp]:
+                    continue
+
+                jp_x = jp % map_width
+                jp_y = jp // map_width
+                possibly_lower_goal = current_goal + octile_distance(abs(jp_x - current_x), abs(jp_y - current_y))
+
+                jp_goal = local_goal[jp]
+                if possibly_lower_goal < jp_goal:
+                    if jp_goal == math.inf:
+                        touched.append(jp)
+                    parent[jp] = current
+                    local_goal[jp] = possibly_lower_goal
+                    if estimate == None:
+                        global_goal = possibly_lower_goal + weight * heuristic(abs(jp_x - goal_x), abs(jp_y - goal_y))
+                    else:
+                        global_goal = possibly_lower_goal + weight * estimate(jp, jp_x, jp_y)
+                    push_count += 1
+                    heappush(list_not_tested, (global_goal, push_count, jp))
+
+        stats["expanded"] = expanded
+        stats["pushed"] += push_count
+        stats["touched"] = len(touched)
+        stats["landmarks"] = estimate != None
+        stats["jumped"] = jumped[0]
+        stats["cost"] = local_goal[goal]
+        stats["time"] = time.perf_counter() - t0
+        return stats
+
+    # returns (path, cost, stats), path is a list of (x, y) from start to goal
+    # path is empty and cost is math.inf if the goal cannot be reached
+    def find_path(self, start, goal):
+        graph = self.graph
+        start_id = graph.index(start[0], start[1])
+        goal_id = graph.index(goal[0], goal[1])
+
+        stats = self.solve(start_id, goal_id)
+
+        path = graph.trace_path(start_id, goal_id)
+        if len(path) == 0:
+            return [], math.inf, stats
+        return expand_path(graph, path), graph.local_goal[goal_id], stats
+
+
+# runs a search generator until it finishes and returns what it returns
+def run_to_end(steps):
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+# a search that can be run a bit at a time, eg. a few milliseconds per frame
+# only one search at a time should run on a graph, starting another means cancelling this one
+class SearchTask:
+
+    def __init__(self, pathfinder, start, goal):
+        self.pathfinder = pathfinder
+        self.graph = pathfinder.graph
+        self.start = start
+        self.goal = goal
+        self.steps = pathfinder.steps(start, goal)
+        self.done = False
+        self.cancelled = False
+        self.stats = None
+        self.expanded = 0
+        self.run_time = 0.0
+
+    # carry on until max_expansions more nodes are expanded or max_time seconds have passed
+    # with neither it runs to the end, returns True once the search is finished
+    def run(self, max_expansions=None, max_time=None):
+        if self.done:
+            return True
+        t0 = time.perf_counter()
+        steps = self.steps
+        count = 0
+        try:
+            while True:
+                if next(steps) != -1:
+                    count += 1
+                if max_expansions != None and count >= max_expansions:
+                    break
+                if max_time != None and time.perf_counter() - t0 >= max_time:
+                    break
+        except StopIteration as stop:
+            self.done = True
+            self.stats = stop.value
+        self.expanded += count
+        self.run_time += time.perf_counter() - t0
+        if self.done:
+            # only the time spent running, not the time waiting between runs
+            self.stats["time"] = self.run_time
+        return self.done
+
+    # stop for good, the graph keeps what was searched so far until the next search resets it
+    def cancel(self):
+        if not self.done:
+            self.steps.close()
+            self.done = True
+            self.cancelled = True
+
+    # (path, cost) once finished, like find_path but with ids, ([], math.inf) if there is no path
+    def result(self):
+        if not self.done or self.cancelled:
+            return [], math.inf
+        path = self.graph.trace_path(self.start, self.goal)
+        if len(path) == 0:
+            return [], math.inf
+        return path, self.graph.local_goal[self.goal]
+
+    # best guess while the search is still going, the path to the expanded node closest to the goal
+    # lets an agent start moving before the search is done, the path may turn out to be a dead end
+    def partial_path(self):
+        graph = self.graph
+        map_width = graph.map_width
+        goal_x = self.goal % map_width
+        goal_y = self.goal // map_width
+        best = self.start
+        best_distance = math.inf
+        for id in graph.touched:
+            if graph.visited[id]:
+                distance = octile_distance(abs(id % map_width - goal_x), abs(id // map_width - goal_y))
+                if distance < best_distance:
+                    best_distance = distance
+                    best = id
+        return graph.trace_path(self.start, best)
+
+
+# turns a list of ids into a list of (x, y) with every cell on the way
+# jps leaves straight or diagonal gaps between consecutive ids, Theta* (anyangle.py) lines at any angle
+def expand_path(graph, path):
+    cells = [graph.coords(path[0])]
+    for id in path[1:]:
+        x, y = cells[-1]
+        end_x, end_y = graph.coords(id)
+        cells.extend(line_cells(x, y, end_x, end_y)[1:])
+    return cells
+
+
+# the cells a line from the centre of one cell to the centre of another goes through, both ends included
+# Bresenham, one cell per step along the longer axis, the other coordinate rounded with halves going up
+# straight and diagonal lines give the same cells as stepping one neighbour at a time
+def line_cells(x0, y0, x1, y1):
+    dx = abs(x1 - x0)
+    dy = abs(y1 - y0)
+    step_x = sign(x1 - x0)
+    step_y = sign(y1 - y0)
+    if dx == 0 and dy == 0:
+        return [(x0, y0)]
+    if dx >= dy:
+        return [(x0 + step_x * i, y0 + step_y * ((2 * i * dy + dx) // (2 * dx))) for i in range(dx + 1)]
+    return [(x0 + step_x * ((2 * i * dx + dy) // (2 * dy)), y0 + step_y * i) for i in range(dy + 1)]
+
+
+# convenience wrapper, grid is a GridGraph, start and goal are (x, y)
+def find_path(grid, start, goal, algorithm="astar", heuristic=None, weight=1.0, cost_model="octile", backend="auto"):
+    return Pathfinder(grid, algorithm, heuristic, weight, cost_model, backend=backend).find_path(start, goal)
@@ -9,212 +9,261 @@
 import pygame
 import random
 import math
-
-
-# global variables
+import sys
+
+from pathfinder import GridGraph, Pathfinder, ALGORITHMS, calc_distance
+from renderer import GridRenderer
+from incremental import DStarLite
+from flowfield import FlowFieldCache
+from hierarchical import HierarchicalPathfinder
+from terrain import load_terrain
+from instrument import SearchProbe
+from pathcache import PathCache
+from landmarks import Landmarks
+from anyangle import AnyAnglePathfinder, LineOfSight
+
+
+# global variables, map size can be changed from the command line
+# node_size and node_border are the largest, cells get smaller on big maps so the window still fits
 map_width = 30
 map_height = 25
 node_size = 20
 node_border = 5
+max_window = (1600, 900)
 
-# class Node used for graphs
-class Node:
-
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.id = y*map_width + x
-        self.obstacle = False
-        self.visited = False
-        self.global_goal = math.inf
-        self.local_goal = math.inf
-        self.neighbours_list = []
-        self.parent_node = None
-
-    # less than, for sorting <
-    def __lt__(self, other):
-        return self.global_goal < other.global_goal
+# seconds of searching per frame, the rest of the frame is left for input and drawing
+search_budget = 0.008
 
 
-def main():
+# graph is a map loaded with terrain.py, without one the map starts empty
+def main(map_width=map_width, map_height=map_height, graph=None):
+    if graph != None:
+        map_width = graph.map_width
+        map_height = graph.map_height
 
     # variables to help with UI
-    dijkstra = False
+    algorithms = list(ALGORITHMS) + ["dstar", "hpa", "theta"]
+    if graph != None and graph.costs is not None:
+        # jump point search and any-angle paths only work when every cell costs the same
+        algorithms.remove("jps")
+        algorithms.remove("theta")
+    algorithm = "astar"     # Q cycles through astar, dijkstra, jps, bidirectional, dstar, hpa and theta
+    planner = None          # D* Lite keeps its search between clicks, only while algorithm is "dstar"
+    hierarchy = None        # clusters and entrances for HPA*, only while algorithm is "hpa"
+    sight = None            # line of sight grid for Lazy Theta*, kept up to date with the obstacle changes
+    heuristics = ["octile", "euclidean", "chebyshev", "manhattan", "zero", "landmarks"]
+    heuristic = "octile"    # H cycles through the heuristics
+    landmark_table = None   # distance tables for the "landmarks" heuristic, built again once a cell is opened
+    weights = [1, 1.5, 2, 5]
+    weight = 1              # W cycles through the weights, more than 1 trades path length for speed
     display_nodes = True
     display_numbers = False
+    display_flow = False    # F shows the flow field, the next step towards node_end from every cell
+    probe = None            # I turns on a SearchProbe, searches run slower but show where their time went
     total_distance = 0
+    # cost of the last path with terrain, kept here since a cached path leaves nothing in local_goal
+    total_cost = 0
+    search_stats = None
+    task = None             # search in progress, runs search_budget seconds every frame until done
+    task_marked = 0         # how many of its touched cells have been marked for drawing
+    old_touched = None      # cells the last search touched, drawn again once the new search has cleared them
 
     # init for pygame'
     pygame.init()
 
-    # create screen
-    screen = pygame.display.set_mode((800, 600))
+    # create screen, big enough for the map plus the UI text underneath
+    cell_size = max(2, min(node_size, max_window[0] // map_width, max_window[1] // map_height))
+    cell_border = cell_size * node_border // node_size
+    screen = pygame.display.set_mode((max(800, map_width * cell_size), map_height * cell_size + 100))
 
     # title and icon
     pygame.display.set_caption("Pathfinding using Pygame")
     font = pygame.font.Font('freesansbold.ttf', 10)
 
-    # init nodes
-    node_list = []
+    # init nodes, the graph does all the searching
+    # nodes are just ids = y*map_width + x into the graph arrays
+    if graph == None:
+        graph = GridGraph(map_width, map_height)
 
-    # note that j and i are reversed here instead of the usual loop due to the way python instantiates nodelist
-    for j in range(map_height):
-        for i in range(map_width):
-            node = Node(i,j)
-            node_list.append(node)  # i and j flipped in this case to maintain j*map_width + i sequence
+    # paths already found, a click that changes nothing the path depends on is answered from here
+    path_cache = PathCache(graph)
 
-    # show numbers
-    def show_num(x,y, num):
-        score = font.render(str(num), True, (255, 255, 255))
-        screen.blit(score, (x, y) )
+    # one flow field per goal, kept until an obstacle change moves its costs
+    flow_cache = FlowFieldCache(graph)
+
+    # draws the map, only cells that changed are drawn again each frame
+    renderer = GridRenderer(screen, graph, cell_size, cell_border, font)
 
     # display basic UI info
     def show_UI(x,y):
-        if dijkstra:
+        if algorithm == "dijkstra":
             word = "Currently using Dijkstra's Algorithm"
+        elif algorithm == "jps":
+            word = "Currently using Jump Point Search"
+        elif algorithm == "bidirectional":
+            word = "Currently using Bidirectional A Star"
+        elif algorithm == "dstar":
+            word = "Currently using D* Lite (replans incrementally)"
+        elif algorithm == "hpa":
+            word = "Currently using HPA* (" + str(hierarchy.cluster_size) + "x" + str(hierarchy.cluster_size) + " clusters, entrances shown as visited)"
+        elif algorithm == "theta":
+            word = "Currently using Lazy Theta* (any-angle, weight: " + str(weight) + ")"
         else:
             word = "Currently using A Star Algorithm"
+        if algorithm != "dijkstra" and algorithm != "hpa" and algorithm != "theta":
+            word += "   (heuristic: " + heuristic + ", weight: " + str(weight) + ")"
+        if display_flow:
+            word += "   flow field built in " + str(round(flow_cache.get(node_end).stats["time"] * 1000, 1)) + " ms"
 
         words = font.render(str(word), True, (255, 255, 255))
         screen.blit(words, (x, y) )
 
         distance_text = "Distance to target: " + str(round(total_distance, 2))
+        distance_text += "   path cache: " + str(path_cache.hits) + " hits, " + str(path_cache.misses) + " misses (" + str(round(100 * path_cache.hit_rate())) + "%)"
+        if graph.costs is not None and total_distance > 0:
+            distance_text += "   cost with terrain: " + str(round(total_cost, 2))
         dtext = font.render(str(distance_text), True, (255, 255, 255))
         screen.blit(dtext, (x, y + 20) )
 
-    # reset node before each search
-    def reset_nodes():
-        for n in node_list:
-            n.visited = False
-            n.global_goal = math.inf
-            n.local_goal = math.inf
-            n.parent_node = None
-
-    # calculate actual distance
-    def calc_distance(a, b):
-        dist_sqrt = (a.x - b.x) * (a.x - b.x) + (a.y - b.y) * (a.y - b.y)
-        return math.sqrt(dist_sqrt)
-        
-        
-    # A Star solver
+        # how much work the last search did, reset only clears what the search before it touched
+        if task != None:
+            stats_text = "Searching...   nodes expanded so far: " + str(task.expanded)
+            stext = font.render(stats_text, True, (255, 255, 255))
+            screen.blit(stext, (x, y + 40) )
+        elif search_stats != None and search_stats.get("cached"):
+            stext = font.render("Path from the cache, nothing searched", True, (255, 255, 255))
+            screen.blit(stext, (x, y + 40) )
+        elif search_stats != None:
+            stats_text = "Nodes expanded: " + str(search_stats["expanded"])
+            if "reset" in search_stats:
+                stats_text += "   reset: " + str(search_stats["reset"]) + "   touched: " + str(search_stats["touched"])
+            if "probe" in search_stats:
+                query = search_stats["probe"]
+                stats_text += "   max open: " + str(query["max open"]) + "   stale pops: " + str(query["stale pops"])
+                for field in ("heuristic ms", "heap ms", "expand ms"):
+                    stats_text += "   " + field + ": " + str(round(query[field], 2))
+            stext = font.render(stats_text, True, (255, 255, 255))
+            screen.blit(stext, (x, y + 40) )
+
+    # start a new search, a search still running is dropped
+    # A Star, Dijkstra and Jump Point Search are run a slice at a time by run_task, the others finish here
     def solve_astar():
-
-        reset_nodes()
+        nonlocal task, task_marked, total_distance, total_cost, old_touched, landmark_table
+
+        if task != None:
+            task.cancel()
+            task = None
+        # cells the last search showed as visited, and the path that went with it
+        if old_touched != None:
+            renderer.mark_cells(old_touched)
+        old_touched = graph.touched
+        renderer.set_path([])
         total_distance = 0
-
-        # SQUARED distance! not actual distance
-        def distance(a, b):
-            dist_sqrt = (a.x - b.x) * (a.x - b.x) + (a.y - b.y) * (a.y - b.y)
-            #return math.sqrt(dist_sqrt)
-            return dist_sqrt
-
-        # heuristic returns 1 if dijkstra (no heuristic)
-        def heuristic(a, b):
-            if dijkstra:
-                return 1
-            return distance(a, b)   # otherwise returns squared distance (overestimates)
-
-        # set starting conditions
-        node_current = node_start
-        node_current.local_goal = 0
-        node_current.global_goal = heuristic(node_start, node_end)
-
-        list_not_tested = []
-        list_not_tested.append(node_start)
-
-        #print("start a star")
-
-        # while not found end node yet
-        while(len(list_not_tested) > 0 and node_current != node_end):
-
-            # sort by global goal
-            list_not_tested.sort()
-
-            # if already visited, then just pop
-            while(len(list_not_tested) > 0 and list_not_tested[0].visited):
-                list_not_tested.pop(0)
-
-            # if empty list, then break
-            if len(list_not_tested) == 0:
-                break
-
-            # set node current to front
-            node_current = list_not_tested[0]
-            node_current.visited = True
-
-            for nb in node_current.neighbours_list:
-                # if not visited yet and not obstacle, add to list
-                if nb.visited == False and nb.obstacle == False:
-                    list_not_tested.append(nb)
-
-                # calculate possible lower goal distance
-                possibly_lower_goal = node_current.local_goal + distance(node_current, nb)
-
-                # if possibly lower goal, means best path found *so far*, set as parent
-                if possibly_lower_goal < nb.local_goal:
-                    nb.parent_node = node_current
-                    nb.local_goal = possibly_lower_goal
-                    nb.global_goal = nb.local_goal + heuristic(nb, node_end)
-
-
-        #print("end")
-
-
-    # set neighbours
-    for i in range(map_width):
-        for j in range(map_height):
-            current_pos = j * map_width + i
-            
-            if j > 0:
-                north = (j - 1) * map_width + i
-                node_list[current_pos].neighbours_list.append(node_list[north])
-                
-            if j < map_height - 1:
-                south = (j + 1) * map_width + i
-                node_list[current_pos].neighbours_list.append(node_list[south])
-                
-            if i > 0:
-                east = j * map_width + i - 1
-                node_list[current_pos].neighbours_list.append(node_list[east])
-                
-            if i < map_width - 1:
-                west = j * map_width + i + 1
-                node_list[current_pos].neighbours_list.append(node_list[west])
-                
-            # diagonal connections
-            if j > 0 and i > 0:
-                nw = (j - 1) * map_width + i - 1
-                node_list[current_pos].neighbours_list.append(node_list[nw])
-            if j < map_height - 1 and i > 0:
-                sw = (j + 1) * map_width + i - 1
-                node_list[current_pos].neighbours_list.append(node_list[sw])
-            if j > 0 and i < map_width - 1:
-                ne = (j - 1) * map_width + i + 1
-                node_list[current_pos].neighbours_list.append(node_list[ne])
-            if j < map_height - 1 and i < map_width - 1:
-                se = (j + 1) * map_width + i + 1
-                node_list[current_pos].neighbours_list.append(node_list[se])
-
-    node_start = node_list[int(map_height/2) * map_width + 1]
-    node_end = node_list[int(map_height/2) * map_width + map_width - 2]
-
-    # colours for drawing
-    c_red = (255, 0, 0)
-    c_green = (0, 255, 0)
-    c_blue = (0, 0, 255)
-    c_yellow = (255, 255, 0)
-    c_gray = (100, 100, 100)
-    c_darkblue = (0, 0, 150)
-
-    # game loop
+        total_cost = 0
+
+        if algorithm in ALGORITHMS:
+            if heuristic == "landmarks":
+                if landmark_table == None or not landmark_table.current():
+                    landmark_table = Landmarks(graph)
+                pathfinder = Pathfinder(graph, algorithm, "octile", weight, probe=probe, landmarks=landmark_table)
+            else:
+                pathfinder = Pathfinder(graph, algorithm, heuristic, weight, probe=probe)
+            cached = path_cache.get(pathfinder, node_start, node_end)
+            if cached != None:
+                show_cached(cached[0], cached[1])
+                return
+            task = pathfinder.start_search(node_start, node_end)
+            task_marked = 0
+            return
+        finish_search(run_search())
+
+    # a path from the cache, the cells the last search showed as visited are cleared
+    def show_cached(path, cost):
+        nonlocal total_distance, total_cost, search_stats, old_touched
+        graph.reset_nodes()
+        renderer.mark_cells(old_touched)
+        old_touched = None
+        total_distance = 0
+        for i in range(1, len(path)):
+            x, y = graph.coords(path[i])
+            parent_x, parent_y = graph.coords(path[i - 1])
+            total_distance += calc_distance(x, y, parent_x, parent_y)
+        renderer.set_path(path)
+        total_cost = cost
+        search_stats = {"cached": True}
+
+    # one slice of the running search, the cells it touched are drawn as it goes
+    def run_task():
+        nonlocal task, task_marked, old_touched
+        task.run(max_time=search_budget)
+        # clearing the last search comes before the first expansion
+        if old_touched != None and task.expanded > 0:
+            renderer.mark_cells(old_touched)
+            old_touched = None
+        renderer.mark_cells(graph.touched[task_marked:])
+        task_marked = len(graph.touched)
+        if task.done:
+            stats = task.stats
+            path_cache.put(task.pathfinder, task.start, task.goal, *task.result())
+            task = None
+            finish_search(stats)
+
+    # trace the path back from node_end once per solve
+    def finish_search(stats):
+        nonlocal total_distance, total_cost, search_stats, old_touched
+        if old_touched != None:
+            renderer.mark_cells(old_touched)
+            old_touched = None
+        renderer.mark_cells(graph.touched)
+        path = [node_end]
+        total_distance = 0
+        trace_node = node_end
+        while graph.parent[trace_node] != -1:
+            x, y = graph.coords(trace_node)
+            parent_x, parent_y = graph.coords(graph.parent[trace_node])
+            total_distance += calc_distance(x, y, parent_x, parent_y)
+            trace_node = graph.parent[trace_node]
+            path.append(trace_node)
+        renderer.set_path(path if len(path) > 1 else [])
+        total_cost = graph.local_goal[node_end]
+        search_stats = stats
+
+    # runs D* Lite, HPA* or Lazy Theta*, the result is left in the graph arrays
+    def run_search():
+        nonlocal planner, hierarchy, sight
+        if algorithm == "dstar":
+            if planner == None or planner.goal != node_end:
+                planner = DStarLite(graph, node_start, node_end)
+            elif planner.start != node_start:
+                planner.move_start(node_start)
+            stats = planner.compute()
+            planner.copy_to_graph()
+            return stats
+        if algorithm == "hpa":
+            if hierarchy == None:
+                hierarchy = HierarchicalPathfinder(graph, 8)
+            path, cost, stats = hierarchy.find_path(graph.coords(node_start), graph.coords(node_end))
+            hierarchy.copy_to_graph(path)
+            return stats
+        if algorithm == "theta":
+            if sight == None:
+                sight = LineOfSight(graph)
+            return AnyAnglePathfinder(graph, True, weight, sight).solve(node_start, node_end)
+
+
+    node_start = int(map_height/2) * map_width + 1
+    node_end = int(map_height/2) * map_width + map_width - 2
+
+    # game loop, 60 frames a second at most
+    clock = pygame.time.Clock()
     running = True
     while running:
 
         # see mouse select which node
         selected_node_x, selected_node_y = pygame.mouse.get_pos()
 
-        selected_node_x = int(selected_node_x/node_size)
-        selected_node_y = int(selected_node_y/node_size)
+        selected_node_x = int(selected_node_x/cell_size)
+        selected_node_y = int(selected_node_y/cell_size)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -231,13 +280,20 @@ def main():
                             #if shift_is_held, set start position
                             keys = pygame.key.get_pressed()
                             if keys[pygame.K_LSHIFT]:
-                                node_start = node_list[npos]
+                                node_start = npos
                             # if ctrl held, set end position
                             elif keys[pygame.K_LCTRL]:
-                                node_end = node_list[npos]
+                                node_end = npos
                             else: # toggle obstacle
-                                if node_list[npos].id != node_end.id:
-                                    node_list[npos].obstacle = not node_list[npos].obstacle
+                                if npos != node_end:
+                                    flow_cache.invalidate(selected_node_x, selected_node_y, not graph.is_obstacle(selected_node_x, selected_node_y))
+                                    if planner != None:
+                                        planner.toggle_obstacle(selected_node_x, selected_node_y)
+                                    elif hierarchy != None:
+                                        hierarchy.toggle_obstacle(selected_node_x, selected_node_y)
+                                    else:
+                                        graph.toggle_obstacle(selected_node_x, selected_node_y)
+                                    renderer.mark(npos)
                     
                     # everytime there is a mouse press, auto solve
                     solve_astar()
@@ -245,87 +301,49 @@ def main():
             if event.type == pygame.KEYDOWN:
                 keys = pygame.key.get_pressed()
                 if keys[pygame.K_q]:
-                    dijkstra = not dijkstra
+                    algorithm = algorithms[(algorithms.index(algorithm) + 1) % len(algorithms)]
+                    planner = None
+                    hierarchy = None
+                    solve_astar()
+                if keys[pygame.K_h]:
+                    heuristic = heuristics[(heuristics.index(heuristic) + 1) % len(heuristics)]
+                    solve_astar()
+                if keys[pygame.K_w]:
+                    weight = weights[(weights.index(weight) + 1) % len(weights)]
                     solve_astar()
                 if keys[pygame.K_a]:
                     display_nodes = not display_nodes
                 if keys[pygame.K_z]:
                     display_numbers = not display_numbers
+                if keys[pygame.K_f]:
+                    display_flow = not display_flow
+                if keys[pygame.K_i]:
+                    probe = SearchProbe() if probe == None else None
+                    solve_astar()
 
-        # drawing
-        # RGB, red green blue
-        screen.fill( ( 0, 0, 0) )
-
-        # draw lines connecting nodes
-        # have to be two separate loops so wont overlap with nodes
-        if display_nodes:
-            for i in range(map_width):
-                for j in range(map_height):
-                    c_colour = c_blue
-
-                    x = node_list[j * map_width + i].x
-                    y = node_list[j * map_width + i].y
-
-                    start_x = i * node_size + node_size / 2
-                    start_y = j * node_size + node_size / 2
-
-                    for nb in node_list[j * map_width + i].neighbours_list:
-                        end_x = nb.x * node_size + node_size / 2
-                        end_y = nb.y * node_size + node_size / 2
-                        pygame.draw.line(screen, c_colour, (start_x, start_y), (end_x, end_y), 3)
-
-
-        # draw nodes
-        for i in range(map_width):
-            for j in range(map_height):
-                
-                # change colour depending on what kind of node it is
-                c_colour = c_blue
-
-                if node_list[j * map_width + i].obstacle == True:
-                    c_colour = c_gray
-                    pygame.draw.rect(screen, c_colour, pygame.Rect(i*node_size + node_border, j*node_size + node_border, node_size-node_border, node_size-node_border))
-                elif node_list[j * map_width + i].visited == True:
-                    c_colour = c_darkblue
-                else:
-                    c_colour = c_blue
-
-                if node_list[j * map_width + i] == node_start:
-                    c_colour = c_green
-                    pygame.draw.rect(screen, c_colour, pygame.Rect(i*node_size + node_border, j*node_size + node_border, node_size-node_border, node_size-node_border))
-
-                if node_list[j * map_width + i] == node_end:
-                    c_colour = c_red
-                    pygame.draw.rect(screen, c_colour, pygame.Rect(i*node_size + node_border, j*node_size + node_border, node_size-node_border, node_size-node_border))
-
-                # if there is a node_end, draw path back to starting node, if there is one
-                if node_end != None:
-                    total_distance = 0
-                    trace_node = node_end
-                    while trace_node.parent_node != None:
-                        x = trace_node.x
-                        y = trace_node.y
-
-                        total_distance += calc_distance(trace_node, trace_node.parent_node)
-
-                        start_x = x * node_size + node_size / 2
-                        start_y = y * node_size + node_size / 2
-
-                        end_x = trace_node.parent_node.x * node_size + node_size / 2
-                        end_y = trace_node.parent_node.y * node_size + node_size / 2
-
-                        pygame.draw.line(screen, c_yellow, (start_x, start_y), (end_x, end_y), 3)
-                        trace_node = trace_node.parent_node
-
+        if task != None:
+            run_task()
 
-                if display_nodes:
-                    pygame.draw.rect(screen, c_colour, pygame.Rect(i*node_size + node_border, j*node_size + node_border, node_size-node_border, node_size-node_border))
+        # drawing, only what changed since the last frame
+        renderer.set_display(display_nodes, display_numbers)
+        renderer.set_ends(node_start, node_end)
+        renderer.set_flow(flow_cache.get(node_end) if display_flow else None)
+        rects = renderer.draw()
 
-                if display_numbers:
-                    show_num(i*node_size + node_border, j*node_size + node_border, node_list[j * map_width + i].id)
+        # UI text underneath the map
+        ui_rect = pygame.Rect(0, map_height * cell_size, screen.get_width(), 100)
+        screen.fill((0, 0, 0), ui_rect)
+        show_UI(20, map_height * cell_size + 50)
+        rects.append(ui_rect)
+        pygame.display.update(rects)
+        clock.tick(60)
 
-        show_UI(20,550)
-        pygame.display.update()
-        
 if __name__ == '__main__':
-    main()
+    # optional map size from the command line, eg. python pathfinding.py 60 40
+    # or a map file, eg. python pathfinding.py terrain.png, see terrain.py
+    if len(sys.argv) == 3:
+        main(int(sys.argv[1]), int(sys.argv[2]))
+    elif len(sys.argv) == 2:
+        main(graph=load_terrain(sys.argv[1]))
+    else:
+        main()
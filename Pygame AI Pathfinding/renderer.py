@@ -0,0 +1,249 @@
+#**********************************************************
+# Grid renderer for pathfinding.py
+# The connection lines are drawn once onto a background surface,
+# after that only cells that changed are drawn again
+#**********************************************************
+
+
+import math
+import pygame
+
+from pathfinder import line_cells
+
+
+# colours for drawing
+c_red = (255, 0, 0)
+c_green = (0, 255, 0)
+c_blue = (0, 0, 255)
+c_yellow = (255, 255, 0)
+c_gray = (100, 100, 100)
+c_darkblue = (0, 0, 150)
+c_white = (255, 255, 255)
+c_brown = (140, 90, 40)
+
+# more dirty cells than this fraction of the map and the whole map is drawn again instead
+FULL_REDRAW = 0.25
+
+
+# draws a GridGraph onto the top left of screen, keeps track of which cells need drawing again
+# call mark, set_ends, set_path and set_flow when something changes, then draw once per frame
+class GridRenderer:
+
+    def __init__(self, screen, graph, node_size, node_border, font):
+        self.screen = screen
+        self.graph = graph
+        self.node_size = node_size
+        self.node_border = node_border
+        self.font = font
+
+        self.display_nodes = True
+        self.display_numbers = False
+        self.flow = None
+        self.start = -1
+        self.end = -1
+        self.path = []
+
+        self.background = None
+        self.full = True
+        # cells that may have changed, and cells under the path that have to be drawn whatever they look like
+        self.dirty = set()
+        self.forced = set()
+        # what each cell looked like when it was last drawn, see look
+        self.drawn = bytearray(graph.size)
+
+    # static layer, black with the lines connecting every cell to its neighbours
+    # the lines of a whole row, column or diagonal are drawn as one line instead of one per cell
+    def build_background(self):
+        graph = self.graph
+        map_width = graph.map_width
+        map_height = graph.map_height
+        size = self.node_size
+        half = size / 2
+
+        background = pygame.Surface((map_width * size, map_height * size))
+        background.fill((0, 0, 0))
+        if self.display_nodes:
+            def line(x0, y0, x1, y1):
+                pygame.draw.line(background, c_blue, (x0 * size + half, y0 * size + half), (x1 * size + half, y1 * size + half), 3)
+
+            for y in range(map_height):
+                line(0, y, map_width - 1, y)
+            for x in range(map_width):
+                line(x, 0, x, map_height - 1)
+            # down-right diagonals, x - y is the same along each one
+            for k in range(-(map_height - 1), map_width):
+                x0 = max(k, 0)
+                length = min(map_width - x0, map_height - (x0 - k))
+                if length > 1:
+                    line(x0, x0 - k, x0 + length - 1, x0 - k + length - 1)
+            # down-left diagonals, x + y is the same along each one
+            for k in range(map_width + map_height - 1):
+                x0 = min(k, map_width - 1)
+                length = min(x0 + 1, map_height - (k - x0))
+                if length > 1:
+                    line(x0, k - x0, x0 - length + 1, k - x0 + length - 1)
+        self.background = background
+
+    def mark(self, id):
+        self.dirty.add(id)
+
+    def mark_cells(self, ids):
+        self.dirty.update(ids)
+
+    # id and the 8 cells around it, path lines are 3 pixels wide and spill into them
+    def mark_around(self, id):
+        self.forced.add(id)
+        self.forced.update(self.graph.neighbours(id))
+
+    def set_display(self, display_nodes, display_numbers):
+        if display_nodes != self.display_nodes:
+            self.display_nodes = display_nodes
+            self.background = None
+            self.full = True
+        if display_numbers != self.display_numbers:
+            self.display_numbers = display_numbers
+            self.full = True
+
+    def set_ends(self, start, end):
+        if start != self.start:
+            self.dirty.add(self.start)
+            self.dirty.add(start)
+            self.start = start
+        if end != self.end:
+            self.dirty.add(self.end)
+            self.dirty.add(end)
+            self.end = end
+        self.dirty.discard(-1)
+
+    # a different field changes arrows all over the map
+    def set_flow(self, field):
+        if field is not self.flow:
+            self.flow = field
+            self.full = True
+
+    # path is a list of ids, consecutive ids can be far apart, in a straight line at any angle
+    def set_path(self, path):
+        for p in (self.path, path):
+            for id in self.path_cells(p):
+                self.mark_around(id)
+        self.path = path
+
+    # every cell the lines between the path ids go through
+    def path_cells(self, path):
+        graph = self.graph
+        cells = list(path[:1])
+        for i in range(1, len(path)):
+            x, y = graph.coords(path[i - 1])
+            end_x, end_y = graph.coords(path[i])
+            for cell_x, cell_y in line_cells(x, y, end_x, end_y)[1:]:
+                cells.append(graph.index(cell_x, cell_y))
+        return cells
+
+    # 1 obstacle, 2 free, 3 visited, 4 start, 5 end, a cell only needs drawing again if this changes
+    def look(self, id):
+        if id == self.end:
+            return 5
+        if id == self.start:
+            return 4
+        if self.graph.obstacles[id] == 1:
+            return 1
+        return 3 if self.graph.visited[id] != 0 else 2
+
+    def draw_cell(self, id):
+        graph = self.graph
+        screen = self.screen
+        size = self.node_size
+        border = self.node_border
+        i, j = graph.coords(id)
+
+        # change colour depending on what kind of node it is
+        c_colour = None
+        if graph.obstacles[id] == 1:
+            c_colour = c_gray
+        elif self.display_nodes:
+            c_colour = c_darkblue if graph.visited[id] != 0 else c_blue
+            if graph.costs is not None and graph.costs[id] > 1:
+                c_colour = terrain_colour(graph.costs[id], graph.visited[id] != 0)
+        if id == self.start:
+            c_colour = c_green
+        if id == self.end:
+            c_colour = c_red
+        if c_colour != None:
+            pygame.draw.rect(screen, c_colour, pygame.Rect(i * size + border, j * size + border, size - border, size - border))
+
+        # flow field arrow, a line towards the next cell with a dot at the tail
+        if self.flow != None:
+            dx, dy = self.flow.direction_at(i, j)
+            if dx != 0 or dy != 0:
+                start_x = i * size + size / 2
+                start_y = j * size + size / 2
+                pygame.draw.line(screen, c_white, (start_x, start_y), (start_x + dx * size * 0.4, start_y + dy * size * 0.4), 1)
+                pygame.draw.circle(screen, c_white, (int(start_x), int(start_y)), 2)
+
+        if self.display_numbers:
+            screen.blit(self.font.render(str(id), True, c_white), (i * size + border, j * size + border))
+
+    # lines from node to node along the path
+    def draw_path(self):
+        graph = self.graph
+        half = self.node_size / 2
+        for i in range(1, len(self.path)):
+            x, y = graph.coords(self.path[i - 1])
+            end_x, end_y = graph.coords(self.path[i])
+            pygame.draw.line(self.screen, c_yellow, (x * self.node_size + half, y * self.node_size + half),
+                             (end_x * self.node_size + half, end_y * self.node_size + half), 3)
+
+    # draw what changed since the last call, returns the screen rects that were drawn to
+    def draw(self):
+        graph = self.graph
+        screen = self.screen
+        size = self.node_size
+        if self.background == None:
+            self.build_background()
+        drawn = self.drawn
+        look = self.look
+
+        # a search marks every cell it touched, most of them look the same as before
+        redraw = self.forced
+        for id in self.dirty:
+            if drawn[id] != look(id):
+                redraw.add(id)
+        self.dirty = set()
+        self.forced = set()
+        if len(redraw) > graph.size * FULL_REDRAW:
+            self.full = True
+
+        if self.full:
+            screen.blit(self.background, (0, 0))
+            for id in range(graph.size):
+                self.draw_cell(id)
+                drawn[id] = look(id)
+            self.draw_path()
+            self.full = False
+            return [pygame.Rect(0, 0, graph.map_width * size, graph.map_height * size)]
+
+        if len(redraw) == 0:
+            return []
+
+        rects = []
+        for id in redraw:
+            drawn[id] = look(id)
+            i, j = graph.coords(id)
+            rect = pygame.Rect(i * size, j * size, size, size)
+            # anything drawn for a cell stays inside its square, so neighbours are left alone
+            screen.set_clip(rect)
+            screen.blit(self.background, rect, rect)
+            self.draw_cell(id)
+            rects.append(rect)
+        screen.set_clip(None)
+
+        # lines through cells that were just cleared have to go back on top
+        self.draw_path()
+        return rects
+
+
+# blue for cost 1 going to brown for cost 16 and more, darker if visited like the plain cells
+def terrain_colour(cost, visited):
+    t = min(1.0, math.log2(cost) / 4)
+    shade = 150 / 255 if visited else 1.0
+    return tuple(int((a + (b - a) * t) * shade) for a, b in zip(c_blue, c_brown))
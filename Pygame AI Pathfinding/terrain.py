@@ -0,0 +1,111 @@
+#**********************************************************
+# Terrain maps for the pathfinding engine
+# Loads obstacles and per-cell costs in bulk from images,
+# NumPy files or memory mapped .terrain files, no per-cell objects
+#**********************************************************
+
+
+import os
+import mmap
+import struct
+
+from pathfinder import GridGraph
+import movingai
+
+# NumPy and Pygame are optional, they are only needed for .npy files and images
+# Pygame is imported when an image is loaded, so the engine can still run without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# .terrain files start with this, then the width and height, then the obstacles and then the costs, 1 byte per cell each
+MAGIC = b"TERRAIN1"
+HEADER = struct.Struct("<8sII")
+
+# extensions Pygame can load
+IMAGE_EXTENSIONS = (".png", ".bmp", ".tga", ".jpg", ".jpeg", ".gif")
+
+# cost values 0 to 255, 0 is an obstacle, the rest are the terrain cost
+# obstacles get cost 1 so every cost in the map is at least 1
+OBSTACLE_TABLE = bytes([1] + [0] * 255)
+COST_TABLE = bytes([1] + list(range(1, 256)))
+
+# grey levels, black is an obstacle, white costs 1 and darker greys cost more, up to 255
+IMAGE_COST_TABLE = bytes([1] + [256 - v for v in range(1, 256)])
+
+
+# a GridGraph from one byte per cell, table turns the bytes into costs
+# translate runs over the whole buffer in C, so this is fast even for tens of millions of cells
+def graph_from_values(values, map_width, map_height, table=COST_TABLE):
+    if len(values) != map_width * map_height:
+        raise ValueError("expected " + str(map_width * map_height) + " values, got " + str(len(values)))
+    obstacles = bytearray(values.translate(OBSTACLE_TABLE))
+    costs = bytearray(values.translate(table))
+    return GridGraph(map_width, map_height, obstacles, costs)
+
+
+# greyscale image, for colour images the red channel is used
+def load_image(path):
+    import pygame
+    surface = pygame.image.load(path)
+    map_width, map_height = surface.get_size()
+    values = pygame.image.tobytes(surface, "RGB")[0::3]
+    return graph_from_values(values, map_width, map_height, IMAGE_COST_TABLE)
+
+
+# 2D array of costs, 0 for obstacles, height rows of width values
+def load_npy(path):
+    if np is None:
+        raise ValueError("loading .npy files needs numpy installed")
+    values = np.load(path, mmap_mode="r")
+    if values.ndim != 2:
+        raise ValueError(".npy maps must be 2D, got " + str(values.ndim) + "D")
+    if values.dtype != np.uint8:
+        if values.size > 0 and (values.min() < 0 or values.max() > 255):
+            raise ValueError(".npy map costs must be from 0 to 255")
+        values = values.astype(np.uint8)
+    map_height, map_width = values.shape
+    return graph_from_values(np.ascontiguousarray(values).tobytes(), map_width, map_height)
+
+
+# .terrain file written by save_terrain, the file is memory mapped instead of read
+# so opening takes the same time for any size, and only the pages a search touches are read from disk
+# changes to the graph stay in memory and never go back to the file
+def open_terrain(path):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if len(data) < HEADER.size:
+        raise ValueError(path + " is not a .terrain file")
+    magic, map_width, map_height = HEADER.unpack_from(data)
+    size = map_width * map_height
+    if magic != MAGIC or len(data) != HEADER.size + 2 * size:
+        raise ValueError(path + " is not a .terrain file")
+    view = memoryview(data)
+    return GridGraph(map_width, map_height, view[HEADER.size:HEADER.size + size], view[HEADER.size + size:])
+
+
+def save_terrain(graph, path):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, graph.map_width, graph.map_height))
+        f.write(graph.obstacles)
+        if graph.costs is None:
+            f.write(bytearray(b"\x01") * graph.size)
+        else:
+            f.write(graph.costs)
+
+
+# picks the loader from the extension, .terrain files are memory mapped
+# .map files are Moving AI maps, they have obstacles but no costs
+def load_terrain(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".terrain":
+        return open_terrain(path)
+    if extension == ".map":
+        return movingai.load_map(path)
+    if extension == ".npy":
+        return load_npy(path)
+    if extension in IMAGE_EXTENSIONS:
+        return load_image(path)
+    raise ValueError("unknown map file type: " + extension)